@@ -15,6 +15,12 @@ DEVICE_TOKEN = os.getenv("DEVICE_TOKEN", "av40HTAb0O5VGQ0D")
 
 PUBLISH_HZ   = float(os.getenv("PUBLISH_HZ", "100"))
 
+# Wire format: "json" (one object per sample) | "binary" (batched telemetry frames)
+WIRE_FORMAT  = os.getenv("MQTT_WIRE_FORMAT", "json").strip().lower()
+FRAME_SAMPLES = int(os.getenv("FRAME_SAMPLES", "50"))        # samples per binary frame
+FRAME_MAX_AGE = float(os.getenv("FRAME_MAX_AGE_S", "0.1"))   # flush partial frames after this
+FRAME_FLOAT32 = os.getenv("FRAME_FLOAT32", "0") == "1"       # f4 instead of f8 values
+
 # What to publish for "force": "mn" | "volts" | "counts"
 FORCE_UNIT   = os.getenv("FORCE_PUBLISH_UNIT", "mn").strip().lower()
 
@@ -146,7 +152,12 @@ def main():
     sent = 0
     t0 = time.time()
 
-    print(f"[RUN] Publishing displacement + force ({FORCE_UNIT}) at ≤{PUBLISH_HZ:g} Hz → {TOPIC}", flush=True)
+    batcher = None
+    if WIRE_FORMAT == "binary":
+        from telemetry_frame import FrameBatcher
+        batcher = FrameBatcher(DEVICE_ID, size=FRAME_SAMPLES, max_age=FRAME_MAX_AGE, float32=FRAME_FLOAT32)
+
+    print(f"[RUN] Publishing displacement + force ({FORCE_UNIT}) at ≤{PUBLISH_HZ:g} Hz → {TOPIC} [{WIRE_FORMAT}]", flush=True)
 
     while True:
         # Drain bursts
@@ -164,6 +175,19 @@ def main():
                 latest_force = (ts, val, c_dbg, v_dbg, mn_dbg)
 
         now = time.time()
+        if batcher is not None:
+            # Binary mode: no token/debug fields; frames carry dt offsets from a base time.
+            if (latest_disp is not None) and (latest_force is not None) and (now - last_pub) >= min_period:
+                batcher.add(now, latest_disp[1], latest_force[1])
+                last_pub = now
+                sent += 1
+            if batcher.due(now):
+                client.publish(TOPIC, batcher.flush(), qos=1)
+                if batcher.seq % 20 == 0:
+                    print(f"[PUB] {sent} samples in {batcher.seq} frames ~{sent / (now - t0):.1f} Hz", flush=True)
+            time.sleep(0.002)
+            continue
+
         if (latest_disp is not None) and (latest_force is not None) and (now - last_pub) >= min_period:
             payload = {
                 "timestamp":    datetime.now(timezone.utc).isoformat(),
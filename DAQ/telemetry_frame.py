@@ -0,0 +1,128 @@
+# telemetry_frame.py
+# ---------- Binary telemetry frame encoder (publisher side) ----------
+# Mirrors backend/new_architecture/app/telemetry_frame.py (version 1):
+#   header  "<4sBBHIId" magic, version, flags, id_len, seq, count, base_time
+#   device_id (utf-8, zero-padded to 8 bytes)
+#   displacement[count] f8|f4, force[count] f8|f4, dt[count] f4, bits[count] u1
+# bits: 0=phase, 1=motor_working, 2=state present, 3=state value
+
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+FRAME_MAGIC = b"BYTF"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<4sBBHIId")
+
+FLAG_FLOAT32 = 0x01
+FLAG_FORCE_NEWTON = 0x02
+
+
+def encode_frame(device_id, seq, base_time, dt, disp, force,
+                 phase=None, motor=None, state=None,
+                 float32=False, force_newton=False):
+    n = len(dt)
+    vdt = "<f4" if float32 else "<f8"
+    bits = np.zeros(n, dtype=np.uint8)
+    if phase is not None:
+        bits |= (np.asarray(phase) == 1).astype(np.uint8)
+    if motor is not None:
+        bits |= (np.asarray(motor) == 1).astype(np.uint8) << 1
+    if state is not None:
+        st = np.asarray(state)
+        bits |= (st >= 0).astype(np.uint8) << 2
+        bits |= (st == 1).astype(np.uint8) << 3
+    dev = device_id.encode("utf-8")
+    flags = (FLAG_FLOAT32 if float32 else 0) | (FLAG_FORCE_NEWTON if force_newton else 0)
+    head = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, len(dev),
+                             seq & 0xFFFFFFFF, n, float(base_time))
+    return b"".join((
+        head,
+        dev.ljust((len(dev) + 7) & ~7, b"\0"),
+        np.asarray(disp, dtype=vdt).tobytes(),
+        np.asarray(force, dtype=vdt).tobytes(),
+        np.asarray(dt, dtype="<f4").tobytes(),
+        bits.tobytes(),
+    ))
+
+
+def point_epoch(timestamp):
+    """Epoch seconds of a sample timestamp: a number, or ISO-8601 text (naive = UTC)."""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _bit(value, absent):
+    """0/1 as the JSON parser reads it; anything else is `absent`."""
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return absent
+    return parsed if parsed in (0, 1) else absent
+
+
+def encode_points(device_id, seq, points, float32=False, force_newton=False):
+    """One frame from JSON-style sample dicts ("timestamp", "displacement", "force",
+    optional "phase" / "motor_working" / "state").
+
+    base_time is the first sample's timestamp and dt each sample's offset from
+    it, so per-sample timing and phase / motor flags survive the binary format.
+    """
+    times = [point_epoch(point["timestamp"]) for point in points]
+    base_time = times[0]
+    return encode_frame(
+        device_id, seq, base_time,
+        [t - base_time for t in times],
+        [point["displacement"] for point in points],
+        [point["force"] for point in points],
+        phase=[_bit(point.get("phase"), 0) for point in points],
+        motor=[_bit(point.get("motor_working"), 0) for point in points],
+        state=[_bit(point.get("state"), -1) for point in points],
+        float32=float32, force_newton=force_newton,
+    )
+
+
+class FrameBatcher:
+    """Accumulates samples and emits one frame per `size` samples or `max_age` seconds."""
+
+    def __init__(self, device_id, size=50, max_age=0.1, float32=False, force_newton=False):
+        self.device_id = device_id
+        self.size = size
+        self.max_age = max_age
+        self.float32 = float32
+        self.force_newton = force_newton
+        self.seq = 0
+        self._reset()
+
+    def _reset(self):
+        self.base = None
+        self.t, self.disp, self.force = [], [], []
+        self.phase, self.motor, self.state = [], [], []
+
+    def add(self, t, disp, force, phase=0, motor=0, state=-1):
+        if self.base is None:
+            self.base = t
+        self.t.append(t - self.base)
+        self.disp.append(disp)
+        self.force.append(force)
+        self.phase.append(phase)
+        self.motor.append(motor)
+        self.state.append(state)
+
+    def due(self, now):
+        return bool(self.t) and (len(self.t) >= self.size or now - self.base >= self.max_age)
+
+    def flush(self):
+        if not self.t:
+            return None
+        frame = encode_frame(self.device_id, self.seq, self.base, self.t, self.disp, self.force,
+                             self.phase, self.motor, self.state,
+                             float32=self.float32, force_newton=self.force_newton)
+        self.seq += 1
+        self._reset()
+        return frame
@@ -0,0 +1,65 @@
+"""Add curve_stats table with per-curve aggregates for folder listings
+
+Curves saved as device_data rows are backfilled here with one grouped
+INSERT ... SELECT. curve_chunks blobs have to be decoded, so curves stored
+only as chunks are filled at application startup
+(app.curve_stats.backfill_missing_curve_stats), or by hand with:
+
+    python -m app.curve_stats
+
+Revision ID: a7d3e9f1b428
+Revises: f2b8c4d6a317
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a7d3e9f1b428"
+down_revision: Union[str, None] = "f2b8c4d6a317"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "curve_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("folder_id", sa.Integer(), nullable=False),
+        sa.Column("curve_index", sa.Integer(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("phase0_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("phase1_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("min_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("max_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("min_force", sa.Float(), nullable=True),
+        sa.Column("max_force", sa.Float(), nullable=True),
+        sa.Column("min_displacement", sa.Float(), nullable=True),
+        sa.Column("max_displacement", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["folder_id"], ["folders.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("folder_id", "curve_index", name="uq_curve_stats_folder_curve"),
+    )
+    # Same aggregates as app.curve_stats.device_data_stats_query.
+    op.execute(
+        """
+        INSERT INTO curve_stats (
+            folder_id, curve_index, row_count, phase0_count, phase1_count,
+            min_timestamp, max_timestamp, min_force, max_force, min_displacement, max_displacement
+        )
+        SELECT folder_id, curve_index, COUNT(*),
+               COUNT(*) - SUM(CASE WHEN phase = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN phase = 1 THEN 1 ELSE 0 END),
+               MIN(timestamp), MAX(timestamp), MIN(force), MAX(force),
+               MIN(displacement), MAX(displacement)
+        FROM device_data
+        WHERE folder_id IS NOT NULL
+        GROUP BY folder_id, curve_index
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("curve_stats")
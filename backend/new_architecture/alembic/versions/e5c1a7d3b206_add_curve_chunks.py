@@ -0,0 +1,48 @@
+"""Add curve_chunks table for compressed columnar sample storage
+
+Revision ID: e5c1a7d3b206
+Revises: d9a3b4c5e012
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e5c1a7d3b206"
+down_revision: Union[str, None] = "d9a3b4c5e012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "curve_chunks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("device_id", sa.String(), nullable=False),
+        sa.Column("folder_id", sa.Integer(), nullable=True),
+        sa.Column("curve_index", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("phase", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("chunk_seq", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("time_offsets", sa.LargeBinary(), nullable=False),
+        sa.Column("displacement", sa.LargeBinary(), nullable=False),
+        sa.Column("force", sa.LargeBinary(), nullable=False),
+        sa.Column("motor_working", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["device_id"], ["iot_devices.id"]),
+        sa.ForeignKeyConstraint(["folder_id"], ["folders.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_curve_chunks_folder_curve",
+        "curve_chunks",
+        ["folder_id", "curve_index", "phase", "chunk_seq"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_curve_chunks_folder_curve", table_name="curve_chunks")
+    op.drop_table("curve_chunks")
@@ -0,0 +1,36 @@
+"""Add composite (folder_id, curve_index, phase, timestamp) index to device_data
+
+Revision ID: f2b8c4d6a317
+Revises: e5c1a7d3b206
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+from alembic import op
+
+
+revision: str = "f2b8c4d6a317"
+down_revision: Union[str, None] = "e5c1a7d3b206"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves the folder export ORDER BY and the per-folder / per-curve counts
+    # from the index alone. On Postgres displacement and force are INCLUDE
+    # columns so the export is an index-only scan; SQLite ignores the option.
+    op.create_index(
+        "ix_device_data_folder_curve_phase_ts",
+        "device_data",
+        ["folder_id", "curve_index", "phase", "timestamp"],
+        unique=False,
+        postgresql_include=["displacement", "force"],
+    )
+    # folder_id is the composite index's leading column, so the single-column
+    # index only adds insert cost.
+    op.drop_index("ix_device_data_folder_id", table_name="device_data")
+
+
+def downgrade() -> None:
+    op.create_index("ix_device_data_folder_id", "device_data", ["folder_id"], unique=False)
+    op.drop_index("ix_device_data_folder_curve_phase_ts", table_name="device_data")
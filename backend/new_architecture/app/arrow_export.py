@@ -0,0 +1,201 @@
+"""Columnar folder export as Apache Arrow record batches: Parquet files and Arrow IPC streams.
+
+A folder (or one curve of it) is streamed from device_data in index order
+through a server-side cursor; every fetch partition becomes one RecordBatch
+with the columns
+
+    curve_index    int32
+    phase          int8     0 = indent, 1 = retract
+    timestamp      timestamp[us, UTC]
+    displacement   float64  µm
+    force          float64  µN, as stored (the HDF5 export negates it; this does not)
+    motor_working  int8
+
+followed by one batch per curve_chunks blob. Values that are missing or not
+numeric in legacy rows are null. Batches are built and written in a worker
+thread; memory is bounded by EXPORT_FETCH_ROWS, not the folder size.
+
+    pandas.read_parquet("folder.parquet")
+    pyarrow.ipc.open_stream(response_bytes).read_all()
+"""
+
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+from sqlalchemy import String, type_coerce
+from sqlalchemy.future import select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    print("Warning: pyarrow not available, Arrow / Parquet export will be disabled")
+    ARROW_AVAILABLE = False
+
+from app.config import settings
+from app.curve_chunks import curve_chunks_query, decode_chunk
+from app.db import AsyncSessionLocal
+from app.hdf5_writer import to_float_array
+from app.models import CurveChunk, DeviceData
+from app.telemetry import timestamps_to_epoch
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+PARQUET_COMPRESSION = "zstd"
+
+
+def export_schema() -> "pa.Schema":
+    return pa.schema([
+        ("curve_index", pa.int32()),
+        ("phase", pa.int8()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("displacement", pa.float64()),
+        ("force", pa.float64()),
+        ("motor_working", pa.int8()),
+    ])
+
+
+def folder_columns_query(folder_id: int, curve_index: Optional[int] = None):
+    """Exported device_data columns of a folder (or one curve) in index order: curve, phase, time.
+
+    timestamp skips SQLAlchemy's per-row DateTime processing: SQLite returns
+    its stored ISO text, parsed for the whole partition at once (drivers with
+    native timestamps, like asyncpg, still return datetimes).
+    """
+    query = (
+        select(
+            DeviceData.curve_index, DeviceData.phase, type_coerce(DeviceData.timestamp, String).label("timestamp"),
+            DeviceData.displacement, DeviceData.force, DeviceData.motor_working,
+        )
+        .where(DeviceData.folder_id == folder_id)
+    )
+    if curve_index is not None:
+        query = query.where(DeviceData.curve_index == curve_index)
+    return query.order_by(DeviceData.curve_index, DeviceData.phase, DeviceData.timestamp)
+
+
+def _float_column(values) -> "pa.Array":
+    array = to_float_array(values)
+    return pa.array(array, type=pa.float64(), mask=np.isnan(array))
+
+
+def _timestamp_column(values) -> "pa.Array":
+    if not any(isinstance(value, str) for value in values):
+        return pa.array(values, type=pa.timestamp("us", tz="UTC"))
+    # Naive ISO text from SQLite, stored as UTC.
+    epoch = timestamps_to_epoch(list(values), np.nan)
+    missing = np.isnan(epoch)
+    micros = np.round(np.where(missing, 0.0, epoch) * 1e6).astype(np.int64)
+    return pa.array(micros, type=pa.timestamp("us", tz="UTC"), mask=missing)
+
+
+def rows_to_batch(partition: List) -> "pa.RecordBatch":
+    """RecordBatch from (curve_index, phase, timestamp, displacement, force, motor_working) rows."""
+    curve_index, phase, timestamp, displacement, force, motor_working = zip(*partition)
+    return pa.RecordBatch.from_arrays([
+        pa.array(curve_index, type=pa.int32()),
+        pa.array(phase, type=pa.int8()),
+        _timestamp_column(timestamp),
+        _float_column(displacement),
+        _float_column(force),
+        pa.array(motor_working, type=pa.int8()),
+    ], schema=export_schema())
+
+
+def chunk_to_batch(chunk) -> "pa.RecordBatch":
+    """RecordBatch of one curve_chunks row's decoded samples."""
+    samples = decode_chunk(chunk)
+    rows = len(samples["timestamp"])
+    micros = np.round(samples["timestamp"] * 1e6).astype(np.int64)
+    return pa.RecordBatch.from_arrays([
+        pa.array(np.full(rows, chunk.curve_index, dtype=np.int32)),
+        pa.array(np.full(rows, 1 if chunk.phase == 1 else 0, dtype=np.int8)),
+        pa.array(micros, type=pa.timestamp("us", tz="UTC")),
+        _float_column(samples["displacement"]),
+        _float_column(samples["force"]),
+        pa.array(samples["motor_working"], type=pa.int8()),
+    ], schema=export_schema())
+
+
+async def iter_folder_batches(folder_id: int, curve_index: Optional[int] = None) -> AsyncIterator["pa.RecordBatch"]:
+    """Record batches of a folder: device_data partitions, then curve_chunks blobs.
+
+    The caller checks folder ownership; an empty folder yields nothing.
+    """
+    async with AsyncSessionLocal() as session:
+        # Core-level stream: skips ORM row processing for these plain column rows.
+        connection = await session.connection()
+        result = await connection.stream(
+            folder_columns_query(folder_id, curve_index).execution_options(yield_per=settings.EXPORT_FETCH_ROWS)
+        )
+        async for partition in result.partitions():
+            yield await asyncio.to_thread(rows_to_batch, partition)
+
+        chunk_query = curve_chunks_query(folder_id=folder_id)
+        if curve_index is not None:
+            chunk_query = chunk_query.where(CurveChunk.curve_index == curve_index)
+        chunks = await connection.stream(chunk_query)
+        async for chunk in chunks:
+            yield await asyncio.to_thread(chunk_to_batch, chunk)
+
+
+async def write_folder_parquet(file_path: str, folder_id: int, curve_index: Optional[int] = None) -> int:
+    """Write a folder (or one curve) to a Parquet file, one row group per batch; returns the row count."""
+    writer = await asyncio.to_thread(pq.ParquetWriter, file_path, export_schema(), compression=PARQUET_COMPRESSION)
+    rows = 0
+    try:
+        async for batch in iter_folder_batches(folder_id, curve_index):
+            await asyncio.to_thread(writer.write_batch, batch)
+            rows += batch.num_rows
+    finally:
+        await asyncio.to_thread(writer.close)
+    return rows
+
+
+class _ChunkSink:
+    """Write-only file object that collects what the IPC writer produces until taken."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def stream_folder_arrow(folder_id: int, curve_index: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Arrow IPC stream of a folder: the schema message, one message per batch, end-of-stream marker."""
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, export_schema())
+    yield sink.take()
+    async for batch in iter_folder_batches(folder_id, curve_index):
+        await asyncio.to_thread(writer.write_batch, batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+__all__ = [
+    "ARROW_AVAILABLE",
+    "ARROW_STREAM_MEDIA_TYPE",
+    "PARQUET_MEDIA_TYPE",
+    "export_schema",
+    "folder_columns_query",
+    "iter_folder_batches",
+    "write_folder_parquet",
+    "stream_folder_arrow",
+]
@@ -0,0 +1,98 @@
+"""Bulk writers for device_data rows, selected from the database URL.
+
+Rows are tuples in DEVICE_DATA_COLUMNS order, built straight from the
+columnar batch. Postgres streams them with binary COPY through the asyncpg
+connection underneath the SQLAlchemy session; SQLite runs chunked DBAPI
+executemany calls (one compiled INSERT, no bind-variable limit); any other
+backend uses SQLAlchemy's executemany with row dicts.
+"""
+
+from typing import List, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DeviceData
+
+# device_data columns written by the ingest path, in row tuple order
+DEVICE_DATA_COLUMNS = (
+    "device_id", "timestamp", "displacement", "force",
+    "folder_id", "curve_index", "phase", "motor_working",
+)
+
+# Rows per executemany call on SQLite; keeps each await short for the event loop.
+SQLITE_CHUNK_ROWS = 5000
+
+
+class ExecutemanyWriter:
+    """Portable fallback: SQLAlchemy Core insert with a list of parameter dicts."""
+
+    name = "executemany"
+
+    async def write(self, db: AsyncSession, rows: Sequence[tuple]):
+        await db.execute(insert(DeviceData), [dict(zip(DEVICE_DATA_COLUMNS, row)) for row in rows])
+
+
+class SQLiteChunkedWriter:
+    """Plain-SQL INSERT executed with the driver's executemany in fixed-size chunks."""
+
+    name = "sqlite_executemany"
+
+    def __init__(self, chunk_rows: int = SQLITE_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self.sql = (
+            f"INSERT INTO {DeviceData.__tablename__} ({', '.join(DEVICE_DATA_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in DEVICE_DATA_COLUMNS)})"
+        )
+
+    async def write(self, db: AsyncSession, rows: Sequence[tuple]):
+        conn = await db.connection()
+        for start in range(0, len(rows), self.chunk_rows):
+            # Store timestamps in SQLAlchemy's SQLite DateTime format so ORM reads and
+            # string comparisons match rows written through the ORM.
+            chunk = [
+                (row[0], row[1].isoformat(" ", "microseconds"), *row[2:])
+                for row in rows[start:start + self.chunk_rows]
+            ]
+            await conn.exec_driver_sql(self.sql, chunk)
+
+
+class PostgresCopyWriter:
+    """Binary COPY device_data FROM STDIN via asyncpg's copy_records_to_table.
+
+    The COPY runs inside the session's transaction, so it commits or rolls
+    back together with the statements around it (curve_stats upsert).
+    """
+
+    name = "postgres_copy"
+
+    async def write(self, db: AsyncSession, rows: Sequence[tuple]):
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        if not raw.driver_connection.is_in_transaction():
+            # SQLAlchemy's asyncpg adapter sends BEGIN lazily with the first statement
+            # it executes; a COPY issued first on the driver connection would autocommit.
+            await conn.exec_driver_sql("SELECT 1")
+        await raw.driver_connection.copy_records_to_table(
+            DeviceData.__tablename__,
+            records=rows,
+            columns=list(DEVICE_DATA_COLUMNS),
+        )
+
+
+def select_bulk_writer(database_url: str):
+    """Pick the fastest writer the configured driver supports."""
+    if database_url.startswith("postgresql+asyncpg://"):
+        return PostgresCopyWriter()
+    if database_url.startswith("sqlite+aiosqlite://"):
+        return SQLiteChunkedWriter()
+    return ExecutemanyWriter()
+
+
+__all__: List[str] = [
+    "DEVICE_DATA_COLUMNS",
+    "ExecutemanyWriter",
+    "SQLiteChunkedWriter",
+    "PostgresCopyWriter",
+    "select_bulk_writer",
+]
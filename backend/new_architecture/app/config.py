@@ -8,12 +8,106 @@ class Settings(BaseSettings):
 
     # Database configuration
     DATABASE_URL: str = "sqlite:///./test.db"
+    # Log every SQL statement (very noisy on the ingest path)
+    DB_ECHO: bool = False
+
+    # SQLite connect-time pragmas (empty string / 0 leaves the SQLite default)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Negative values are KiB (-65536 = 64 MiB page cache per connection)
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
 
     PRINTER_WS_URL: str = "ws://10.99.134.8:8003/ws"
     PRINTER_API_URL: str = "http://10.99.134.8:8003"
 
     DEBUG: bool = True
 
+    # Per-device telemetry ring buffers (rows per device, shared by broadcaster and saver)
+    DEVICE_RING_CAPACITY: int = 65536
+    # How long ingest waits for a lagging DB saver before spilling unsaved rows
+    SAVE_OVERFLOW_BLOCK_SECONDS: float = 0.25
+    # Unsaved rows held per device after that spill; the oldest beyond this are dropped (and counted)
+    SAVE_SPILL_MAX_ROWS: int = 1 << 20
+
+    # Per-socket outbound WebSocket queues (frames) and slow-consumer coalescing
+    WS_SEND_QUEUE_FRAMES: int = 8
+    # "latest" keeps the newest rows, "decimate" keeps evenly spaced rows of the backlog
+    WS_COALESCE_MODE: str = "latest"
+    WS_COALESCE_MAX_ROWS: int = 2000
+
+    # "inline": MQTT ingest, decoding and DB writes run inside the API process.
+    # "worker": they run in `python -m app.ingest_worker`; API processes (any
+    # number of uvicorn workers) receive live batches over a local socket.
+    INGEST_MODE: str = "inline"
+    INGEST_LINK_HOST: str = "127.0.0.1"
+    INGEST_LINK_PORT: int = 8765
+    # Prometheus port of the ingest worker process (0 disables)
+    INGEST_METRICS_PORT: int = 9101
+
+    # Raw MQTT payloads held in memory before the paho thread spills to disk
+    INGRESS_HIGH_WATER: int = 20000
+    INGRESS_SPILL_DIR: str = "./ingress_spill"
+    INGRESS_SPILL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    # Payloads are dropped (and counted) once this much is waiting on disk
+    INGRESS_SPILL_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # MQTT broker and subscriber sharding
+    MQTT_BROKER_HOST: str = "localhost"
+    MQTT_BROKER_PORT: int = 1883
+    # Number of subscriber clients, each with its own paho thread, ingress buffer and decoder task.
+    # Decoder tasks share the event loop, so decode throughput comes from DECODE_POOL_WORKERS or
+    # more server processes, not from extra shards (benchmarks/bench_subscriber_shards.py).
+    MQTT_SUBSCRIBER_SHARDS: int = 1
+    # "shared": MQTT v5 $share/<group>/... subscriptions, broker balances messages across shards.
+    #         One device's messages may be split across shards, so per-device ordering in the
+    #         ring and DB is lost and frame sequence gaps are not tracked.
+    # "hash": each listed device is subscribed as device_data/<id> by shard crc32(id) % N only,
+    #         keeping per-device ordering; shard 0 also takes MON and the bare device_data topic.
+    #         Devices that are not listed are not received.
+    MQTT_SHARD_STRATEGY: str = "shared"
+    MQTT_SHARED_GROUP: str = "ingest"
+    # Comma-separated device ids for the "hash" strategy (required with it)
+    MQTT_SHARD_DEVICE_IDS: str = ""
+
+    # JSON decode process pool (0 = decode inline on the event loop)
+    DECODE_POOL_WORKERS: int = 0
+    # Batches with fewer estimated points than this stay on the inline path
+    DECODE_POOL_MIN_POINTS: int = 5000
+
+    # Device existence/ownership cache used on the ingest path
+    DEVICE_REGISTRY_TTL_SECONDS: float = 300.0
+    # Unknown device ids are remembered as missing for this long
+    DEVICE_REGISTRY_NEGATIVE_TTL_SECONDS: float = 30.0
+
+    # Saved-sample layout: "rows" (one device_data row per sample) or
+    # "chunks" (compressed columnar curve_chunks, see app/curve_chunks.py)
+    STORAGE_LAYOUT: str = "rows"
+    # Maximum samples per curve_chunks row
+    CURVE_CHUNK_ROWS: int = 4096
+
+    # HDF5 export: rows fetched per server-side cursor partition (bounds export memory)
+    EXPORT_FETCH_ROWS: int = 50000
+    # HDF5 Force / Z dataset layout (see app/hdf5_writer.DatasetLayout).
+    # Maximum elements per chunk; short segments get one chunk of their own length
+    EXPORT_HDF5_CHUNK_ROWS: int = 4096
+    # "gzip" (any HDF5 reader), "lzf" (h5py readers only, faster) or "none"
+    EXPORT_HDF5_COMPRESSION: str = "gzip"
+    EXPORT_HDF5_COMPRESSION_LEVEL: int = 4
+    # Byte-shuffle filter in front of the compressor
+    EXPORT_HDF5_SHUFFLE: bool = True
+    # Store samples as float32 (about half the size, ~7 significant digits)
+    EXPORT_HDF5_FLOAT32: bool = False
+
+    # Folder export jobs run concurrently by the background job queue
+    EXPORT_WORKERS: int = 2
+    # Finished export jobs stay pollable for this long (cached files are kept per folder)
+    EXPORT_JOB_TTL_SECONDS: float = 3600.0
+    # Keep a per-folder master HDF5 file and rewrite only new / changed curves on export
+    EXPORT_INCREMENTAL: bool = True
+
     class Config:
         env_file = ".env"
         extra = "ignore"    # ← add this
@@ -0,0 +1,193 @@
+"""Chunked curve storage: compressed columnar sample runs instead of one row per sample.
+
+With STORAGE_LAYOUT=chunks the saver writes one curve_chunks row per
+(device, folder_id, curve_index, phase) run of up to CURVE_CHUNK_ROWS samples
+instead of one device_data row per sample. Each chunk stores its start time
+and four zlib-compressed little-endian columns:
+
+    time_offsets   int64 deltas of µs offsets from start_time
+    displacement   float64 µm
+    force          float64 µN
+    motor_working  uint8 flags
+
+Readers decode chunks back into NumPy columns. The export and grouped
+endpoints merge them with any device_data rows, so folders recorded before
+switching layouts keep working. Chunk samples have no row id; the grouped
+endpoint reports them with negative synthetic ids (see chunk_sample_ids).
+"""
+
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import CurveChunk, IoTDevice
+from app.telemetry import TelemetryBatch, epoch_to_datetime
+
+ZLIB_LEVEL = 6
+
+# Upper bound of samples per chunk; synthetic sample ids reserve this many per chunk.
+MAX_CHUNK_ROWS = 1 << 20
+
+
+def _pack(values: np.ndarray, dtype: str) -> bytes:
+    return zlib.compress(np.ascontiguousarray(values, dtype=dtype).tobytes(), ZLIB_LEVEL)
+
+
+def _unpack(blob: bytes, dtype: str) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(blob), dtype=dtype)
+
+
+def _epoch(moment: datetime) -> float:
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def encode_chunk(timestamps: np.ndarray, displacement: np.ndarray, force: np.ndarray, motor_working: np.ndarray) -> dict:
+    """Column values for one CurveChunk from epoch-second timestamps and sample columns."""
+    micros = np.round(timestamps * 1e6).astype(np.int64)
+    offsets = micros - micros[0]
+    return {
+        "start_time": epoch_to_datetime(timestamps[:1])[0],
+        "row_count": len(timestamps),
+        "time_offsets": _pack(np.diff(offsets, prepend=0), "<i8"),
+        "displacement": _pack(displacement, "<f8"),
+        "force": _pack(force, "<f8"),
+        "motor_working": _pack(motor_working, "u1"),
+    }
+
+
+def decode_chunk(chunk: CurveChunk) -> Dict[str, np.ndarray]:
+    """NumPy columns of a chunk: epoch-second timestamps, displacement, force, motor_working."""
+    offsets = np.cumsum(_unpack(chunk.time_offsets, "<i8"))
+    start_micros = round(_epoch(chunk.start_time) * 1e6)
+    return {
+        "timestamp": (start_micros + offsets) / 1e6,
+        "displacement": _unpack(chunk.displacement, "<f8"),
+        "force": _unpack(chunk.force, "<f8"),
+        "motor_working": _unpack(chunk.motor_working, "u1").astype(np.int8),
+    }
+
+
+def chunk_sample_ids(chunk: CurveChunk) -> np.ndarray:
+    """Negative ids for chunk samples, distinct from device_data ids and stable per sample."""
+    return -(chunk.id * MAX_CHUNK_ROWS + np.arange(chunk.row_count, dtype=np.int64)) - 1
+
+
+class CurveChunkWriter:
+    """Appends batches to curve_chunks, tracking chunk_seq per (device, folder, curve, phase)."""
+
+    def __init__(self, chunk_rows: int):
+        self.chunk_rows = min(chunk_rows, MAX_CHUNK_ROWS)
+        self._next_seq: Dict[Tuple, int] = {}
+        # Monitoring
+        self.chunks_written = 0
+        self.rows_written = 0
+
+    async def _seq(self, db: AsyncSession, key: Tuple) -> int:
+        seq = self._next_seq.get(key)
+        if seq is None:
+            # Continue after chunks written by an earlier process for the same curve.
+            device_id, folder_id, curve_index, phase = key
+            result = await db.execute(
+                select(func.max(CurveChunk.chunk_seq)).where(
+                    CurveChunk.device_id == device_id,
+                    CurveChunk.folder_id.is_(None) if folder_id is None else CurveChunk.folder_id == folder_id,
+                    CurveChunk.curve_index == curve_index,
+                    CurveChunk.phase == phase,
+                )
+            )
+            latest = result.scalar()
+            seq = 0 if latest is None else latest + 1
+        self._next_seq[key] = seq + 1
+        return seq
+
+    async def write(self, db: AsyncSession, device_id: str, batch: TelemetryBatch, folder_id, curve_index):
+        """Add one chunk per phase run (split at chunk_rows); the caller commits."""
+        phase = np.where(batch.phase == 1, 1, 0)
+        for value in (0, 1):
+            index = np.flatnonzero(phase == value)
+            for start in range(0, len(index), self.chunk_rows):
+                rows = index[start:start + self.chunk_rows]
+                seq = await self._seq(db, (device_id, folder_id, curve_index, value))
+                db.add(CurveChunk(
+                    device_id=device_id,
+                    folder_id=folder_id,
+                    curve_index=curve_index,
+                    phase=value,
+                    chunk_seq=seq,
+                    **encode_chunk(
+                        batch.timestamp[rows], batch.displacement[rows], batch.force[rows], batch.motor_working[rows],
+                    ),
+                ))
+                self.chunks_written += 1
+                self.rows_written += len(rows)
+
+    def get_stats(self) -> dict:
+        return {
+            "curve_chunks_written": self.chunks_written,
+            "curve_chunk_rows_written": self.rows_written,
+        }
+
+
+def _scoped(query, folder_id: Optional[int], user_id: Optional[int]):
+    if user_id is not None:
+        query = query.join(IoTDevice, IoTDevice.id == CurveChunk.device_id).where(IoTDevice.user_id == user_id)
+    if folder_id is not None:
+        query = query.where(CurveChunk.folder_id == folder_id)
+    return query.order_by(CurveChunk.curve_index, CurveChunk.phase, CurveChunk.start_time, CurveChunk.chunk_seq)
+
+
+async def load_curve_chunks(
+    session: AsyncSession,
+    folder_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> List[CurveChunk]:
+    """Chunks of one folder and/or one user's devices, in curve / phase / time order."""
+    result = await session.execute(_scoped(select(CurveChunk), folder_id, user_id))
+    return result.scalars().all()
+
+
+def curve_chunks_query(folder_id: Optional[int] = None, user_id: Optional[int] = None):
+    """Same chunks as plain column rows (no ORM identity map), for streaming."""
+    return _scoped(select(*CurveChunk.__table__.c), folder_id, user_id)
+
+
+def chunk_rows_for_response(chunk: CurveChunk) -> List[dict]:
+    """Per-sample dicts shaped like device_data rows (for the grouped endpoint)."""
+    samples = decode_chunk(chunk)
+    timestamps = epoch_to_datetime(samples["timestamp"])
+    return [
+        {
+            "id": sample_id,
+            "device_id": chunk.device_id,
+            "timestamp": timestamp,
+            "displacement": displacement,
+            "force": force,
+            "folder_id": chunk.folder_id,
+            "curve_index": chunk.curve_index,
+            "phase": chunk.phase,
+            "motor_working": motor,
+        }
+        for sample_id, timestamp, displacement, force, motor in zip(
+            chunk_sample_ids(chunk).tolist(),
+            timestamps,
+            samples["displacement"].tolist(),
+            samples["force"].tolist(),
+            samples["motor_working"].tolist(),
+        )
+    ]
+
+
+__all__ = [
+    "CurveChunkWriter",
+    "encode_chunk",
+    "decode_chunk",
+    "chunk_sample_ids",
+    "chunk_rows_for_response",
+    "load_curve_chunks",
+    "curve_chunks_query",
+]
@@ -0,0 +1,235 @@
+"""Materialized per-curve statistics (curve_stats) for folder listings.
+
+Every saved batch upserts one curve_stats row per (folder_id, curve_index) in
+the same transaction as its samples: counts are added and min/max bounds
+widened. The folder listing and the curve list read these rows instead of
+aggregating device_data, so they cost O(folders + curves), not O(samples).
+
+Deleting samples (device and device_data routes) rebuilds the affected
+folders. Populate or repair the table for existing data with:
+
+    python -m app.curve_stats [folder_id ...]
+"""
+
+import asyncio
+import operator
+import sys
+import warnings
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, case, delete, exists, func, insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.curve_chunks import decode_chunk
+from app.models import CurveChunk, CurveStat, DeviceData, Folder
+from app.telemetry import TelemetryBatch, epoch_to_datetime
+
+# Added on upsert
+STAT_COUNTS = ("row_count", "phase0_count", "phase1_count")
+# Widened on upsert
+STAT_MINIMUMS = ("min_timestamp", "min_force", "min_displacement")
+STAT_MAXIMUMS = ("max_timestamp", "max_force", "max_displacement")
+
+
+def _bounds(values: np.ndarray) -> Tuple[Optional[float], Optional[float]]:
+    """(min, max) ignoring NaN; (None, None) when no value is a number."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanmin(values), np.nanmax(values)
+    if np.isnan(low):
+        return None, None
+    return float(low), float(high)
+
+
+def column_stats(timestamps: np.ndarray, displacement: np.ndarray, force: np.ndarray, phase: np.ndarray) -> dict:
+    """curve_stats values for a non-empty run of samples (epoch-second timestamps)."""
+    min_timestamp, max_timestamp = epoch_to_datetime(np.array([timestamps.min(), timestamps.max()]))
+    min_force, max_force = _bounds(force)
+    min_displacement, max_displacement = _bounds(displacement)
+    phase1_count = int(np.count_nonzero(phase == 1))
+    return {
+        "row_count": len(timestamps),
+        "phase0_count": len(timestamps) - phase1_count,
+        "phase1_count": phase1_count,
+        "min_timestamp": min_timestamp,
+        "max_timestamp": max_timestamp,
+        "min_force": min_force,
+        "max_force": max_force,
+        "min_displacement": min_displacement,
+        "max_displacement": max_displacement,
+    }
+
+
+def curve_stats_delta(folder_id, curve_index, batch: TelemetryBatch) -> Optional[dict]:
+    """Upsert values for one saved batch; None when it is not saved into a folder."""
+    if folder_id is None or len(batch) == 0:
+        return None
+    return {
+        "folder_id": folder_id,
+        "curve_index": curve_index,
+        **column_stats(batch.timestamp, batch.displacement, batch.force, batch.phase),
+    }
+
+
+def merge_stats(current: dict, delta: dict) -> dict:
+    """Python counterpart of the upsert: add counts, widen bounds (None is unbounded)."""
+    merged = dict(current)
+    for key in STAT_COUNTS:
+        merged[key] = current[key] + delta[key]
+    for keys, pick in ((STAT_MINIMUMS, min), (STAT_MAXIMUMS, max)):
+        for key in keys:
+            values = [value for value in (current[key], delta[key]) if value is not None]
+            merged[key] = pick(values) if values else None
+    return merged
+
+
+def _widen(current, incoming, wider):
+    """SQL: the incoming bound if it is wider than the stored one (or nothing is stored)."""
+    return case((or_(current.is_(None), wider(incoming, current)), incoming), else_=current)
+
+
+async def upsert_curve_stats(db: AsyncSession, delta: Optional[dict]):
+    """Add a batch's stats to its curve_stats row (INSERT ... ON CONFLICT DO UPDATE); caller commits."""
+    if delta is None:
+        return
+    table = CurveStat.__table__
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = dialect_insert(table).values(**delta)
+    incoming = statement.excluded
+    values = {key: table.c[key] + incoming[key] for key in STAT_COUNTS}
+    values.update({key: _widen(table.c[key], incoming[key], operator.lt) for key in STAT_MINIMUMS})
+    values.update({key: _widen(table.c[key], incoming[key], operator.gt) for key in STAT_MAXIMUMS})
+    await db.execute(statement.on_conflict_do_update(index_elements=["folder_id", "curve_index"], set_=values))
+
+
+def device_data_stats_query(folder_ids: Optional[Iterable[int]] = None):
+    """Per-(folder_id, curve_index) aggregates of device_data, grouped in composite-index order."""
+    query = (
+        select(
+            DeviceData.folder_id,
+            DeviceData.curve_index,
+            func.count().label("row_count"),
+            func.sum(case((DeviceData.phase == 1, 1), else_=0)).label("phase1_count"),
+            func.min(DeviceData.timestamp).label("min_timestamp"),
+            func.max(DeviceData.timestamp).label("max_timestamp"),
+            func.min(DeviceData.force).label("min_force"),
+            func.max(DeviceData.force).label("max_force"),
+            func.min(DeviceData.displacement).label("min_displacement"),
+            func.max(DeviceData.displacement).label("max_displacement"),
+        )
+        .where(DeviceData.folder_id.is_not(None))
+        .group_by(DeviceData.folder_id, DeviceData.curve_index)
+    )
+    if folder_ids is not None:
+        query = query.where(DeviceData.folder_id.in_(list(folder_ids)))
+    return query
+
+
+async def rebuild_curve_stats(db: AsyncSession, folder_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute curve_stats from device_data and curve_chunks for all or the given folders; caller commits."""
+    if folder_ids is not None:
+        folder_ids = list(folder_ids)
+    stats: Dict[Tuple[int, int], dict] = {}
+
+    result = await db.execute(device_data_stats_query(folder_ids))
+    for row in result.all():
+        values = dict(row._mapping)
+        values["phase0_count"] = values["row_count"] - values["phase1_count"]
+        stats[(row.folder_id, row.curve_index)] = values
+
+    # Chunk blobs are decoded one at a time (streamed, not loaded as ORM objects).
+    chunk_query = select(*CurveChunk.__table__.c).where(CurveChunk.folder_id.is_not(None))
+    if folder_ids is not None:
+        chunk_query = chunk_query.where(CurveChunk.folder_id.in_(folder_ids))
+    chunks = await db.stream(chunk_query)
+    async for chunk in chunks:
+        samples = decode_chunk(chunk)
+        delta = column_stats(
+            samples["timestamp"], samples["displacement"], samples["force"],
+            np.full(chunk.row_count, chunk.phase),
+        )
+        key = (chunk.folder_id, chunk.curve_index)
+        if key in stats:
+            stats[key] = merge_stats(stats[key], delta)
+        else:
+            stats[key] = {"folder_id": chunk.folder_id, "curve_index": chunk.curve_index, **delta}
+
+    clear = delete(CurveStat)
+    if folder_ids is not None:
+        clear = clear.where(CurveStat.folder_id.in_(folder_ids))
+    await db.execute(clear)
+    if stats:
+        await db.execute(insert(CurveStat), list(stats.values()))
+    return len(stats)
+
+
+async def backfill_missing_curve_stats(db: AsyncSession) -> int:
+    """Rebuild curve_stats of folders holding samples without stats; caller commits.
+
+    Covers curves stored only as curve_chunks, which the migration's SQL
+    backfill cannot decode, and a curve_stats table created empty by
+    create_all on an existing database. device_data is only scanned when
+    curve_stats is empty, so a regular startup costs one curve_chunks query.
+    """
+    if await db.scalar(select(CurveStat.id).limit(1)) is None:
+        return await rebuild_curve_stats(db)
+    has_stats = exists().where(and_(
+        CurveStat.folder_id == CurveChunk.folder_id,
+        CurveStat.curve_index == CurveChunk.curve_index,
+    ))
+    folder_ids = (await db.scalars(
+        select(CurveChunk.folder_id).where(CurveChunk.folder_id.is_not(None), ~has_stats).distinct()
+    )).all()
+    if not folder_ids:
+        return 0
+    return await rebuild_curve_stats(db, folder_ids)
+
+
+def folder_stats_query(user_id: int):
+    """(Folder, curve_count, row_count) for a user's folders from curve_stats, newest first."""
+    return (
+        select(
+            Folder,
+            func.count(CurveStat.id).label("curve_count"),
+            func.coalesce(func.sum(CurveStat.row_count), 0).label("row_count"),
+        )
+        .outerjoin(CurveStat, CurveStat.folder_id == Folder.id)
+        .where(Folder.user_id == user_id)
+        .group_by(Folder.id)
+        .order_by(Folder.created_at.desc())
+    )
+
+
+def curve_stats_query(folder_id: int):
+    """curve_stats rows of one folder by curve_index."""
+    return select(CurveStat).where(CurveStat.folder_id == folder_id).order_by(CurveStat.curve_index)
+
+
+async def main(folder_ids: list):
+    from app.db import get_db
+
+    async with get_db() as db:
+        count = await rebuild_curve_stats(db, folder_ids or None)
+        await db.commit()
+    target = "all folders" if not folder_ids else f"folder(s) {', '.join(map(str, folder_ids))}"
+    print(f"curve_stats rebuilt for {target}: {count} curve(s)")
+
+
+__all__ = [
+    "column_stats",
+    "curve_stats_delta",
+    "merge_stats",
+    "upsert_curve_stats",
+    "device_data_stats_query",
+    "rebuild_curve_stats",
+    "backfill_missing_curve_stats",
+    "folder_stats_query",
+    "curve_stats_query",
+]
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]]))
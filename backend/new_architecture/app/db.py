@@ -3,13 +3,16 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.future import select
-from app.models import Base, DeviceData, ClientSession, IoTDevice, Folder
+from app.models import Base, DeviceData, ClientSession, IoTDevice, Folder, CurveChunk, CurveStat
 from app.config import settings
+from app.bulk_writer import select_bulk_writer
+from app.curve_chunks import curve_chunks_query, decode_chunk
+from app.curve_stats import upsert_curve_stats
 from datetime import datetime
 from fastapi import HTTPException
 from contextlib import asynccontextmanager
 import logging
-from sqlalchemy import insert
+from sqlalchemy import insert, event
 import pandas as pd
 
 logging.basicConfig(level=logging.DEBUG)
@@ -27,7 +30,7 @@ elif DATABASE_URL.startswith("sqlite://"):
 
 # Holds common async engine options used across all supported database backends.
 engine_options = {
-    "echo": True,
+    "echo": settings.DB_ECHO,
 }
 
 # Apply connection pool tuning only for network database backends.
@@ -44,6 +47,37 @@ async_engine = create_async_engine(
     **engine_options,
 )
 
+def sqlite_pragmas() -> list:
+    """PRAGMA statements for the configured SQLite profile (unset values are skipped)."""
+    pragmas = [
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+        ("cache_size", settings.SQLITE_CACHE_SIZE),
+        ("temp_store", settings.SQLITE_TEMP_STORE),
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+    ]
+    return [f"PRAGMA {name}={value}" for name, value in pragmas if value not in ("", 0, None)]
+
+
+def apply_sqlite_pragmas(engine, pragmas: list):
+    """Run the given PRAGMAs on every new DBAPI connection of an (async) SQLite engine."""
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+# WAL lets readers (folder listings, exports) run while the saver commits;
+# synchronous=NORMAL drops the per-commit fsync of the WAL.
+if normalized_database_url.startswith("sqlite+aiosqlite://"):
+    apply_sqlite_pragmas(async_engine, sqlite_pragmas())
+
+# Bulk writer for device_data rows: binary COPY on Postgres, chunked executemany on SQLite.
+bulk_writer = select_bulk_writer(normalized_database_url)
+
 # Create an async session factory
 AsyncSessionLocal = sessionmaker(
     bind=async_engine,
@@ -108,10 +142,12 @@ async def save_device_data_batch(
 
         # Add all data in one batch
         print("Inserting %d records using bulk insert.", len(device_data_list))
-        stmt = insert(DeviceData).values(device_data_list)
+        # executemany-style: the statement is compiled once and the driver
+        # batches the parameter rows, instead of one giant VALUES clause.
+        stmt = insert(DeviceData)
         try:
         # Execute the bulk insert
-            await db.execute(stmt)
+            await db.execute(stmt, device_data_list)
             await db.commit()
             print("Bulk insert of %d records committed successfully.", len(device_data_list))
         except Exception as e:
@@ -123,6 +159,26 @@ async def save_device_data_batch(
         raise ValueError(f"Error saving batch: {str(e)}")
 
 
+async def save_device_data_rows(db: AsyncSession, rows: list, curve_stats: dict = None):
+    """
+    Save device_data row tuples (DEVICE_DATA_COLUMNS order) with the bulk writer for this backend.
+    curve_stats (app.curve_stats.curve_stats_delta) is upserted in the same transaction.
+    """
+    if not rows:
+        return
+
+    print("Inserting %d records using %s.", len(rows), bulk_writer.name)
+    try:
+        await bulk_writer.write(db, rows)
+        await upsert_curve_stats(db, curve_stats)
+        await db.commit()
+        print("Bulk insert of %d records committed successfully.", len(rows))
+    except Exception as e:
+        await db.rollback()
+        print("Error performing bulk insert: %s", e)
+        raise ValueError(f"Error saving batch: {str(e)}")
+
+
 # Get device data by device_id
 async def get_device_data_by_device_id(db: AsyncSession, device_id: str):
     """Retrieve all data for a specific device."""
@@ -175,8 +231,12 @@ async def get_user_id_by_device_id(db, device_id: str) -> str:
 
 
 import os
+import asyncio
+from typing import Callable, Iterable, Optional
 import h5py
 import numpy as np
+import orjson
+from app.hdf5_writer import CurveFileWriter, DatasetLayout, to_float_array
 
 # Default experiment metadata written to HDF5 tip groups when folder values are unset.
 EXPERIMENT_METADATA_DEFAULTS = {
@@ -191,23 +251,6 @@ EXPERIMENT_METADATA_DEFAULTS = {
 }
 
 
-def _to_float_or_none(value):
-    """Coerce a DB value to float; returns None when conversion fails."""
-    if value is None:
-        return None
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return None
-
-
-def _export_force_value(raw_force):
-    """Negate force for HDF5 export; legacy rows may still store force as strings."""
-    force = _to_float_or_none(raw_force)
-    if force is None:
-        return None
-    return -force
-
 async def export_device_data_to_hdf5(file_path: str = "data/device_data.hdf5", user_id: int = None):
     """Export DeviceData to an HDF5 file with curve0/segment0/Force,Z structure.
 
@@ -221,49 +264,43 @@ async def export_device_data_to_hdf5(file_path: str = "data/device_data.hdf5", u
 
     async with AsyncSessionLocal() as session:
         # Build a query that joins DeviceData -> IoTDevice so we can filter by owner.
-        query = select(DeviceData).join(IoTDevice, IoTDevice.id == DeviceData.device_id)
+        query = (
+            select(DeviceData.force, DeviceData.displacement)
+            .join(IoTDevice, IoTDevice.id == DeviceData.device_id)
+            .execution_options(yield_per=settings.EXPORT_FETCH_ROWS)
+        )
         # Apply user scope when a user_id is supplied; omit to export all rows.
         if user_id is not None:
             query = query.filter(IoTDevice.user_id == user_id)
-        result = await session.execute(query)
-        data = result.scalars().all()
-
-        if not data:
-            print("No data found in device_data table.")
-            raise HTTPException(status_code=404, detail="No device data available to export.")
-
-        # Convert SQLAlchemy objects to list of dicts
-        records = [d.__dict__ for d in data]
-        for record in records:
-            record.pop('_sa_instance_state', None)
-
-        # Collect force and z values for a single curve
-        force_values = []
-        z_values = []
-        for record in records:
-            force = _export_force_value(record.get("force"))
-            z = _to_float_or_none(record.get("displacement"))
-            if force is not None and z is not None:
-                force_values.append(force)
-                z_values.append(z)
-
-        if not force_values or not z_values:
-            print("No valid force or z data found.")
-            raise HTTPException(status_code=400, detail="No valid force or z data to export.")
 
-        # Create HDF5 file
+        # Stream rows, then chunked-layout samples, into a single curve0/segment0.
+        seen_rows = 0
         with h5py.File(file_path, "w") as f:
-            # Create curve0 group
-            curve_group = f.create_group("curve0")
-            # Create segment0 group
-            segment_group = curve_group.create_group("segment0")
-            # Create Force and Z datasets
-            segment_group.create_dataset("Force", data=np.array(force_values, dtype=float))
-            segment_group.create_dataset("Z", data=np.array(z_values, dtype=float))
+            writer = CurveFileWriter(f, layout=DatasetLayout.from_settings(settings))
+            # Core-level stream: skips ORM row processing for these plain column rows.
+            connection = await session.connection()
+            result = await connection.stream(query)
+            async for partition in result.partitions():
+                force, z = zip(*partition)
+                seen_rows += len(partition)
+                writer.append(0, 0, -to_float_array(force), to_float_array(z))
+            chunks = await connection.stream(curve_chunks_query(user_id=user_id))
+            async for chunk in chunks:
+                seen_rows += chunk.row_count
+                samples = decode_chunk(chunk)
+                writer.append(0, 0, -samples["force"], samples["displacement"])
+
+        if writer.rows_written == 0:
+            os.remove(file_path)
+            if seen_rows == 0:
+                print("No data found in device_data table.")
+                raise HTTPException(status_code=404, detail="No device data available to export.")
+            print("No valid force or z data found.")
+            raise HTTPException(status_code=400, detail="No valid force or z data to export.")
 
         # Logs the absolute output location to simplify export-path debugging.
         resolved_output_file_path = os.path.abspath(file_path)
-        print(f"Exported {len(force_values)} records to {resolved_output_file_path}")
+        print(f"Exported {writer.rows_written} records to {resolved_output_file_path}")
 
 
 async def upsert_folder_metadata(
@@ -365,7 +402,77 @@ def _write_tip_metadata_group(tip_group, folder: Folder):
     tip_group.attrs["sensor_type"] = str(_resolve_folder_metadata_value(folder, "sensor_type"))
 
 
-async def export_folder_to_hdf5(file_path: str, folder_id: int, user_id: int) -> str:
+def folder_export_query(folder_id: int, curve_indexes: Optional[Iterable[int]] = None):
+    """device_data columns of one folder (optionally only some curves) in export order: curve, phase, time.
+
+    The ORDER BY matches ix_device_data_folder_curve_phase_ts, so rows stream
+    in index order without a sort (index-only on Postgres, where displacement
+    and force are INCLUDE columns).
+    """
+    query = (
+        select(DeviceData.curve_index, DeviceData.phase, DeviceData.force, DeviceData.displacement)
+        .where(DeviceData.folder_id == folder_id)
+    )
+    if curve_indexes is not None:
+        query = query.where(DeviceData.curve_index.in_(list(curve_indexes)))
+    return query.order_by(DeviceData.curve_index, DeviceData.phase, DeviceData.timestamp)
+
+
+def _append_partition(writer: CurveFileWriter, partition):
+    """Columns of one (curve_index, phase, force, displacement) partition, appended with force negated."""
+    curve_index, phase, force, z = zip(*partition)
+    writer.append_rows(np.asarray(curve_index), np.asarray(phase), -to_float_array(force), to_float_array(z))
+
+
+async def _stream_folder_into(
+    session,
+    writer: CurveFileWriter,
+    folder_id: int,
+    curve_indexes: Optional[Iterable[int]] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    rows_before: int = 0,
+) -> int:
+    """Append a folder's samples (all curves or curve_indexes) to writer; returns the samples read.
+
+    Rows stream in index order (curve, phase, time) through a server-side
+    cursor, then curve_chunks blobs, so memory is bounded by EXPORT_FETCH_ROWS
+    rather than the folder size. progress receives rows_before + samples read.
+    """
+    seen_rows = 0
+    # Core-level stream: skips ORM row processing for these plain column rows.
+    connection = await session.connection()
+    result = await connection.stream(
+        folder_export_query(folder_id, curve_indexes).execution_options(yield_per=settings.EXPORT_FETCH_ROWS)
+    )
+    async for partition in result.partitions():
+        seen_rows += len(partition)
+        await asyncio.to_thread(_append_partition, writer, partition)
+        if progress is not None:
+            progress(rows_before + seen_rows)
+
+    # Chunks arrive in curve / phase / time order; appended after any row-layout samples.
+    chunk_query = curve_chunks_query(folder_id=folder_id)
+    if curve_indexes is not None:
+        chunk_query = chunk_query.where(CurveChunk.curve_index.in_(list(curve_indexes)))
+    chunks = await connection.stream(chunk_query)
+    async for chunk in chunks:
+        seen_rows += chunk.row_count
+        samples = decode_chunk(chunk)
+        await asyncio.to_thread(
+            writer.append, chunk.curve_index, chunk.phase, -samples["force"], samples["displacement"]
+        )
+        if progress is not None:
+            progress(rows_before + seen_rows)
+    return seen_rows
+
+
+async def export_folder_to_hdf5(
+    file_path: str,
+    folder_id: int,
+    user_id: int,
+    progress: Optional[Callable[[int], None]] = None,
+    layout: Optional[DatasetLayout] = None,
+) -> str:
     """Export all curves in a folder to a single HDF5 file.
 
     The file is structured as:
@@ -377,8 +484,14 @@ async def export_folder_to_hdf5(file_path: str, folder_id: int, user_id: int) ->
         curve1/…
         …
 
-    Rows are queried from device_data filtered by folder_id and ordered by
-    curve_index then timestamp so each curve is written in chronological order.
+    Rows are streamed from device_data filtered by folder_id and ordered by
+    curve_index, phase then timestamp so each segment is written in
+    chronological order; curve_chunks samples of the folder are appended per
+    curve and segment. Nothing is held beyond one fetch partition.
+    Column conversion and h5py calls run in a worker thread so the event loop
+    keeps serving while a partition is written. progress, when given, is called with the number of
+    samples read so far. Force / Z datasets use layout (chunking, compression,
+    precision), by default the EXPORT_HDF5_* settings.
     Returns the resolved absolute path of the written file.
     """
     # Resolve and create the output directory before any DB work.
@@ -395,73 +508,212 @@ async def export_folder_to_hdf5(file_path: str, folder_id: int, user_id: int) ->
             # Prevent leaking data from other users or non-existent folders.
             raise HTTPException(status_code=404, detail="Folder not found or not authorized.")
 
-        # Fetch all device_data rows for this folder ordered for deterministic curve output.
-        data_result = await session.execute(
-            select(DeviceData)
-            .where(DeviceData.folder_id == folder_id)
-            .order_by(DeviceData.curve_index, DeviceData.timestamp)
-        )
-        rows = data_result.scalars().all()
-
-        if not rows:
-            # 400, not 404 — the folder exists but contains no recorded device_data yet.
-            raise HTTPException(status_code=400, detail="This folder has no recorded data yet. Start a save session with this folder selected first.")
-
-        # Group rows by curve_index, then split each curve by phase (segment0/segment1).
-        curves: dict = {}
-        for row in rows:
-            idx = row.curve_index if row.curve_index is not None else 0
-            if idx not in curves:
-                curves[idx] = {
-                    "segment0": {"force": [], "z": []},
-                    "segment1": {"force": [], "z": []},
-                }
-            # phase 0 → segment0 (indent), phase 1 → segment1 (retract).
-            phase = row.phase if row.phase in (0, 1) else 0
-            segment_key = "segment0" if phase == 0 else "segment1"
-            force = _export_force_value(row.force)
-            z = _to_float_or_none(row.displacement)
-            if force is None or z is None:
-                continue
-            curves[idx][segment_key]["force"].append(force)
-            curves[idx][segment_key]["z"].append(z)
-
-        total_rows = sum(
-            len(curve_data["segment0"]["force"]) + len(curve_data["segment1"]["force"])
-            for curve_data in curves.values()
-        )
-        if total_rows == 0:
+        def write_tip(curve_group):
+            # Same experiment metadata on every curve in this folder export.
+            _write_tip_metadata_group(curve_group.create_group("tip"), folder)
+
+        hdf = await asyncio.to_thread(h5py.File, file_path, "w")
+        try:
+            writer = CurveFileWriter(hdf, on_new_curve=write_tip, layout=layout or DatasetLayout.from_settings(settings))
+            seen_rows = await _stream_folder_into(session, writer, folder_id, progress=progress)
+        finally:
+            await asyncio.to_thread(hdf.close)
+
+        if writer.rows_written == 0:
+            os.remove(file_path)
+            if seen_rows == 0:
+                # 400, not 404 — the folder exists but contains no recorded device_data yet.
+                raise HTTPException(status_code=400, detail="This folder has no recorded data yet. Start a save session with this folder selected first.")
             raise HTTPException(
                 status_code=400,
                 detail="No valid force or displacement data to export in this folder.",
             )
 
-        # Write the HDF5 file with one group per curve.
-        with h5py.File(file_path, "w") as hdf:
-            for curve_idx in sorted(curves.keys()):
-                curve_group = hdf.create_group(f"curve{curve_idx}")
-                curve_data = curves[curve_idx]
-
-                for segment_name in ("segment0", "segment1"):
-                    segment_values = curve_data[segment_name]
-                    if not segment_values["force"]:
-                        continue
-                    segment_group = curve_group.create_group(segment_name)
-                    segment_group.create_dataset(
-                        "Force",
-                        data=np.array(segment_values["force"], dtype=float),
-                    )
-                    segment_group.create_dataset(
-                        "Z",
-                        data=np.array(segment_values["z"], dtype=float),
-                    )
-
-                # Same experiment metadata on every curve in this folder export.
-                tip_group = curve_group.create_group("tip")
-                _write_tip_metadata_group(tip_group, folder)
-
         resolved_path = os.path.abspath(file_path)
         print(
-            f"Folder export: {len(curves)} curve(s), {total_rows} rows → {resolved_path}"
+            f"Folder export: {writer.curve_count} curve(s), {writer.rows_written} rows → {resolved_path}"
         )
         return resolved_path
+
+
+def incremental_manifest_path(master_path: str) -> str:
+    """JSON manifest kept next to an incremental master file."""
+    return master_path + ".json"
+
+
+def _load_incremental_manifest(master_path: str) -> Optional[dict]:
+    """Manifest of a master file, or None when either is missing or unreadable."""
+    manifest_path = incremental_manifest_path(master_path)
+    if not (os.path.exists(master_path) and os.path.exists(manifest_path)):
+        return None
+    try:
+        with open(manifest_path, "rb") as manifest_file:
+            return orjson.loads(manifest_file.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+
+def _write_incremental_manifest(master_path: str, manifest: dict):
+    """Write the manifest to a temporary file and rename it into place."""
+    manifest_path = incremental_manifest_path(master_path)
+    with open(manifest_path + ".tmp", "wb") as manifest_file:
+        manifest_file.write(orjson.dumps(manifest, option=orjson.OPT_SORT_KEYS))
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _curve_rows_in_file(hdf: h5py.File, curve_index: int) -> int:
+    """Samples stored for one curve (sum of its segment lengths, read from metadata only)."""
+    curve_group = hdf.get(f"curve{curve_index}")
+    if curve_group is None:
+        return 0
+    return sum(
+        curve_group[name]["Force"].shape[0] for name in ("segment0", "segment1") if name in curve_group
+    )
+
+
+async def export_folder_to_hdf5_incremental(
+    master_path: str,
+    folder_id: int,
+    user_id: int,
+    progress: Optional[Callable[[int], None]] = None,
+    layout: Optional[DatasetLayout] = None,
+) -> dict:
+    """Bring a folder's master HDF5 file up to date, rewriting only curves that changed.
+
+    The master has the same structure as export_folder_to_hdf5 output. A JSON
+    manifest next to it records, per curve_index, the curve_stats row_count and
+    max_timestamp the curve was written at, plus the dataset layout key and
+    tip metadata. On each call:
+
+        new curve_index                 curveN group appended
+        row_count / max_timestamp moved curveN group deleted and rewritten
+        curve gone from curve_stats     curveN group deleted
+        tip metadata changed            tip groups rewritten, samples kept
+
+    Only the new and changed curves are read from the database, so the cost is
+    proportional to the new data rather than the folder size. The master is
+    rebuilt from scratch when the manifest or the file is missing or the layout
+    differs; the manifest is removed while the master is being modified, so an
+    interrupted update is followed by a rebuild. The file uses HDF5's
+    persistent free-space manager, so space of deleted curves is reused by
+    later writes. progress is called with samples in the file so far
+    (unchanged curves count as done). Returns a summary of the update.
+    """
+    layout = layout or DatasetLayout.from_settings(settings)
+    os.makedirs(os.path.dirname(master_path) or ".", exist_ok=True)
+
+    async with AsyncSessionLocal() as session:
+        folder_result = await session.execute(
+            select(Folder).where(Folder.id == folder_id, Folder.user_id == user_id)
+        )
+        folder = folder_result.scalars().first()
+        if not folder:
+            raise HTTPException(status_code=404, detail="Folder not found or not authorized.")
+
+        stats_rows = (await session.execute(
+            select(CurveStat.curve_index, CurveStat.row_count, CurveStat.max_timestamp)
+            .where(CurveStat.folder_id == folder_id)
+        )).all()
+        if not stats_rows:
+            # No curve_stats (empty folder, or stats never built): nothing to diff against.
+            manifest_file = incremental_manifest_path(master_path)
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+            await export_folder_to_hdf5(master_path, folder_id, user_id, progress=progress, layout=layout)
+            return {"rebuilt": True, "curves_written": None, "curves_removed": 0, "curves_kept": 0}
+
+        current = {
+            str(row.curve_index): [int(row.row_count), str(row.max_timestamp)] for row in stats_rows
+        }
+        metadata = get_folder_export_metadata(folder)
+        manifest = _load_incremental_manifest(master_path)
+        rebuild = manifest is None or manifest.get("layout") != layout.key
+
+        if rebuild:
+            previous = {}
+            written = {}
+        else:
+            previous = manifest.get("curves", {})
+            written = manifest.get("written", {})
+        changed = [key for key, signature in current.items() if previous.get(key) != signature]
+        removed = [key for key in previous if key not in current]
+        kept = [key for key in current if key not in changed]
+        metadata_changed = not rebuild and manifest.get("metadata") != metadata
+
+        if not rebuild and not changed and not removed and not metadata_changed:
+            if progress is not None:
+                progress(sum(row_count for row_count, _ in current.values()))
+            return {"rebuilt": False, "curves_written": 0, "curves_removed": 0, "curves_kept": len(kept)}
+
+        # From here on the master no longer matches its manifest.
+        manifest_file = incremental_manifest_path(master_path)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+
+        def write_tip(curve_group):
+            _write_tip_metadata_group(curve_group.create_group("tip"), folder)
+
+        def prepare(hdf):
+            for key in removed + changed:
+                if f"curve{key}" in hdf:
+                    del hdf[f"curve{key}"]
+            if metadata_changed:
+                for key in kept:
+                    curve_group = hdf.get(f"curve{key}")
+                    if curve_group is not None:
+                        if "tip" in curve_group:
+                            del curve_group["tip"]
+                        write_tip(curve_group)
+
+        def record_written(hdf):
+            for key in removed:
+                written.pop(key, None)
+            for key in changed:
+                written[key] = _curve_rows_in_file(hdf, int(key))
+
+        if rebuild:
+            hdf = await asyncio.to_thread(h5py.File, master_path, "w", fs_strategy="fsm", fs_persist=True)
+        else:
+            hdf = await asyncio.to_thread(h5py.File, master_path, "a")
+        try:
+            await asyncio.to_thread(prepare, hdf)
+            writer = CurveFileWriter(hdf, on_new_curve=write_tip, layout=layout)
+            if changed:
+                rows_before = sum(current[key][0] for key in kept)
+                await _stream_folder_into(
+                    session,
+                    writer,
+                    folder_id,
+                    curve_indexes=None if rebuild else [int(key) for key in changed],
+                    progress=progress,
+                    rows_before=rows_before,
+                )
+            await asyncio.to_thread(record_written, hdf)
+        finally:
+            await asyncio.to_thread(hdf.close)
+
+        if sum(written.values()) == 0:
+            os.remove(master_path)
+            raise HTTPException(
+                status_code=400,
+                detail="No valid force or displacement data to export in this folder.",
+            )
+
+        _write_incremental_manifest(master_path, {
+            "layout": layout.key,
+            "metadata": metadata,
+            "curves": current,
+            # Samples actually stored per curve (rows with missing values are dropped)
+            "written": written,
+        })
+        summary = {
+            "rebuilt": rebuild,
+            "curves_written": len(changed),
+            "curves_removed": len(removed),
+            "curves_kept": len(kept),
+        }
+        print(
+            f"Incremental folder export: {len(changed)} curve(s) written ({writer.rows_written} rows), "
+            f"{len(removed)} removed, {len(kept)} kept → {os.path.abspath(master_path)}"
+        )
+        return summary
@@ -0,0 +1,132 @@
+"""Level-of-detail decimation for the live WebSocket stream.
+
+Both reducers work on whole columns with NumPy (no per-point Python loop) and
+return sorted row indices, so any TelemetryBatch can be reduced with take().
+Decimation only applies to what is sent to browsers; the DB saver always
+receives full-rate rows from the device ring.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from app.telemetry import TelemetryBatch
+
+DECIMATION_MODES = ("minmax", "lttb")
+
+
+def _first_per_bucket(candidates: np.ndarray, bucket_id: np.ndarray) -> np.ndarray:
+    """Among candidate row indices, keep the first one of each bucket."""
+    _, first = np.unique(bucket_id[candidates], return_index=True)
+    return candidates[first]
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Keep the min and max of y in each of n_out // 2 equal-count buckets (peaks survive)."""
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return np.arange(n)
+    buckets = n_out // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    bucket_id = np.repeat(np.arange(buckets), np.diff(edges))
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    lows = _first_per_bucket(np.flatnonzero(y == mins[bucket_id]), bucket_id)
+    highs = _first_per_bucket(np.flatnonzero(y == maxs[bucket_id]), bucket_id)
+    return np.unique(np.concatenate((lows, highs)))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets, vectorized variant.
+
+    Classic LTTB anchors each bucket on the point picked in the previous
+    bucket, which forces a sequential loop. Here the anchor is the previous
+    bucket's centroid, so every bucket is scored in one pass; the picked
+    shapes are visually equivalent for plotting.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = x - x[0]
+    inner = n_out - 2
+    # Buckets cover rows 1 .. n-2; the first and last rows are always kept.
+    edges = np.linspace(1, n - 1, inner + 1).astype(np.int64)
+    sizes = np.diff(edges)
+    starts = edges[:-1]
+    bucket_id = np.zeros(n, dtype=np.int64)
+    bucket_id[1:n - 1] = np.repeat(np.arange(inner), sizes)
+
+    cx = np.add.reduceat(x[:n - 1], starts) / sizes
+    cy = np.add.reduceat(y[:n - 1], starts) / sizes
+    # Anchor: centroid of the previous bucket (row 0 for the first bucket).
+    ax = np.concatenate(([x[0]], cx[:-1]))
+    ay = np.concatenate(([y[0]], cy[:-1]))
+    # Look-ahead: centroid of the next bucket (last row for the final bucket).
+    nx = np.concatenate((cx[1:], [x[-1]]))
+    ny = np.concatenate((cy[1:], [y[-1]]))
+
+    rows = np.arange(1, n - 1)
+    b = bucket_id[rows]
+    area = np.abs((ax[b] - nx[b]) * (y[rows] - ay[b]) - (ax[b] - x[rows]) * (ny[b] - ay[b]))
+    best = np.maximum.reduceat(area, starts - 1)
+    picks = _first_per_bucket(np.flatnonzero(area == best[b]), b) + 1
+    return np.concatenate(([0], picks, [n - 1]))
+
+
+def decimate_batch(batch: TelemetryBatch, n_out: int, mode: str) -> TelemetryBatch:
+    """Reduce a single-device batch to about n_out rows (force is the plotted channel)."""
+    if len(batch) <= n_out:
+        return batch
+    if mode == "lttb":
+        index = lttb_indices(batch.timestamp, batch.force, n_out)
+    else:
+        index = minmax_indices(batch.force, n_out)
+    return batch.take(index)
+
+
+class LevelOfDetail:
+    """Per-subscription point budget negotiated in the first /ws message."""
+
+    def __init__(self, max_points_per_sec: int, mode: str):
+        self.max_points_per_sec = max_points_per_sec
+        self.mode = mode
+
+    @property
+    def key(self):
+        return (self.mode, self.max_points_per_sec)
+
+    @classmethod
+    def from_client_message(cls, data: dict) -> Optional["LevelOfDetail"]:
+        """Parse {"max_points_per_sec": 500, "mode": "minmax"}; None means full rate."""
+        try:
+            limit = int(data.get("max_points_per_sec") or 0)
+        except (TypeError, ValueError):
+            return None
+        if limit <= 0:
+            return None
+        mode = data.get("mode", "minmax")
+        if mode not in DECIMATION_MODES:
+            mode = "minmax"
+        return cls(limit, mode)
+
+    def apply(self, batch: TelemetryBatch, interval: float) -> TelemetryBatch:
+        """Decimate a merged multi-device frame covering `interval` seconds, splitting the budget per device."""
+        budget = int(self.max_points_per_sec * interval)
+        if len(batch) <= budget:
+            return batch
+        per_device = batch.split_by_device()
+        share = max(3, budget // len(per_device))
+        return TelemetryBatch.concat(
+            decimate_batch(rows, share, self.mode) for rows in per_device.values()
+        )
+
+
+__all__ = [
+    "DECIMATION_MODES",
+    "minmax_indices",
+    "lttb_indices",
+    "decimate_batch",
+    "LevelOfDetail",
+]
@@ -0,0 +1,118 @@
+"""Optional process-pool stage for decoding large JSON ingest batches.
+
+orjson.loads plus schema extraction on 1000-point array payloads is pure CPU
+work on the event loop thread. With DECODE_POOL_WORKERS > 0, a raw batch whose
+estimated point count reaches DECODE_POOL_MIN_POINTS is split across a
+ProcessPoolExecutor; each worker returns a columnar TelemetryBatch (NumPy
+columns pickle as flat buffers, far smaller than the JSON they came from).
+Smaller batches keep the inline path, so single-point publishers see no extra
+hop. Workers are spawned, not forked, because the parent runs paho threads.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import orjson
+
+from app.telemetry import TelemetryBatch, TelemetryDecoder
+
+
+def estimate_points(raw_messages: List[bytes]) -> int:
+    """Cheap point-count estimate: one '{' per JSON object (nested dicts overcount)."""
+    return sum(payload.count(b"{") for payload in raw_messages)
+
+
+def decode_json_chunk(raw_messages: List[bytes]) -> Tuple[TelemetryBatch, List[int], int]:
+    """Worker entry point: decode JSON payloads into one columnar batch.
+
+    Returns (batch, per-message point counts with -1 for single-point messages,
+    parse error count) so the parent can keep its message-type metrics.
+    """
+    decoder = TelemetryDecoder()
+    sizes: List[int] = []
+    errors = 0
+    for raw_payload in raw_messages:
+        try:
+            message_content = orjson.loads(raw_payload)
+        except orjson.JSONDecodeError:
+            errors += 1
+            continue
+        sizes.append(len(message_content) if isinstance(message_content, list) else -1)
+        decoder.add_message(message_content)
+    return decoder.build(), sizes, errors
+
+
+def _warm_up() -> bool:
+    return True
+
+
+class DecodePool:
+    """Lazily started process pool that decodes JSON payload chunks off the event loop."""
+
+    def __init__(self, workers: int, min_points: int):
+        self.workers = workers
+        self.min_points = min_points
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Monitoring
+        self.batches_offloaded = 0
+        self.payloads_offloaded = 0
+        self.batches_inline = 0
+        self.last_decode_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def should_offload(self, raw_messages: List[bytes]) -> bool:
+        if not self.enabled or not raw_messages:
+            return False
+        if estimate_points(raw_messages) >= self.min_points:
+            return True
+        self.batches_inline += 1
+        return False
+
+    def start(self):
+        if self._executor is None and self.enabled:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            # Spawn the workers now rather than on the first large batch.
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+            print(f"[DECODE] Process pool started with {self.workers} workers (threshold {self.min_points} points)")
+
+    async def decode(self, raw_messages: List[bytes]) -> Tuple[List[TelemetryBatch], List[int], int]:
+        """Decode payloads in up to `workers` chunks; returns (batches, message sizes, errors)."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        chunk_size = -(-len(raw_messages) // self.workers)
+        chunks = [raw_messages[i:i + chunk_size] for i in range(0, len(raw_messages), chunk_size)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, decode_json_chunk, chunk) for chunk in chunks
+        ))
+        self.last_decode_seconds = time.perf_counter() - started
+        self.batches_offloaded += 1
+        self.payloads_offloaded += len(raw_messages)
+        batches = [batch for batch, _, _ in results]
+        sizes = [size for _, chunk_sizes, _ in results for size in chunk_sizes]
+        return batches, sizes, sum(errors for _, _, errors in results)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        return {
+            "decode_pool_workers": self.workers,
+            "decode_pool_min_points": self.min_points,
+            "decode_pool_batches_offloaded": self.batches_offloaded,
+            "decode_pool_payloads_offloaded": self.payloads_offloaded,
+            "decode_pool_batches_inline": self.batches_inline,
+            "decode_pool_last_decode_seconds": self.last_decode_seconds,
+        }
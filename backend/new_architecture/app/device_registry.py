@@ -0,0 +1,136 @@
+"""In-process cache of device existence and ownership for the ingest hot path.
+
+process_batch must know a device exists before inserting its rows, and the
+broadcaster must know which user owns it. Both used to query iot_devices on
+every batch. The registry loads all devices at startup. Entries expire after
+DEVICE_REGISTRY_TTL_SECONDS; unknown ids are negatively cached for
+DEVICE_REGISTRY_NEGATIVE_TTL_SECONDS so an unregistered publisher does not
+cost a query per batch either. The /devices routes call invalidate() after
+create and delete; other processes catch up through the TTL (and, in worker
+mode, through the relayed "invalidate_device" control message).
+"""
+
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.db import get_db
+from app.models import IoTDevice
+
+# User that owns devices auto-created from telemetry, and unknown devices' live data.
+DEFAULT_DEVICE_USER_ID = 1
+
+
+class DeviceRegistry:
+    """Maps device_id -> owning user id (None when the device does not exist)."""
+
+    def __init__(self, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # device_id -> (exists, user_id, expires_at)
+        self._entries: Dict[str, Tuple[bool, Optional[int], float]] = {}
+        # Monitoring
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.created = 0
+        self.invalidations = 0
+
+    def _store(self, device_id: str, exists: bool, user_id: Optional[int] = None):
+        ttl = self.ttl if exists else self.negative_ttl
+        self._entries[device_id] = (exists, user_id, time.monotonic() + ttl)
+
+    def _cached(self, device_id: str):
+        entry = self._entries.get(device_id)
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        if entry[0]:
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return entry
+
+    async def load(self):
+        """Prime the cache with every registered device."""
+        async with get_db() as db:
+            result = await db.execute(select(IoTDevice.id, IoTDevice.user_id))
+            rows = result.all()
+        for device_id, user_id in rows:
+            self._store(device_id, True, user_id)
+        print(f"[REGISTRY] Loaded {len(rows)} devices")
+
+    async def _fetch(self, db, device_id: str):
+        self.misses += 1
+        result = await db.execute(select(IoTDevice.id, IoTDevice.user_id).where(IoTDevice.id == device_id))
+        row = result.first()
+        if row is None:
+            self._store(device_id, False)
+            return self._entries[device_id]
+        self._store(device_id, True, row.user_id)
+        return self._entries[device_id]
+
+    async def lookup(self, device_id: str) -> Tuple[bool, Optional[int]]:
+        """(exists, user_id) for a device, querying the DB only on a cache miss."""
+        entry = self._cached(device_id)
+        if entry is None:
+            async with get_db() as db:
+                entry = await self._fetch(db, device_id)
+        return entry[0], entry[1]
+
+    async def ensure_device(self, db, device_id: str, device_token: str):
+        """Create the device on first sight of its telemetry (within the caller's session)."""
+        entry = self._cached(device_id)
+        if entry is None:
+            entry = await self._fetch(db, device_id)
+        if entry[0]:
+            return
+        print(f"Device {device_id} not found, creating it...")
+        db.add(IoTDevice(
+            id=device_id,
+            device_name=f"Device {device_id}",
+            device_type="sensor",
+            device_token=device_token,
+            user_id=DEFAULT_DEVICE_USER_ID,
+        ))
+        await db.commit()
+        self._store(device_id, True, DEFAULT_DEVICE_USER_ID)
+        self.created += 1
+        print(f"Device {device_id} created successfully")
+
+    def invalidate(self, device_ids: Optional[Iterable[str]] = None):
+        """Forget some devices (or all of them) so the next lookup re-reads the DB."""
+        if device_ids is None:
+            self._entries.clear()
+        else:
+            for device_id in device_ids:
+                self._entries.pop(device_id, None)
+        self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "registry_devices": len(self._entries),
+            "registry_hits": self.hits,
+            "registry_negative_hits": self.negative_hits,
+            "registry_misses": self.misses,
+            "registry_created": self.created,
+            "registry_invalidations": self.invalidations,
+        }
+
+
+# Process-wide registry used by process_batch and broadcaster routing
+device_registry = DeviceRegistry(
+    ttl=settings.DEVICE_REGISTRY_TTL_SECONDS,
+    negative_ttl=settings.DEVICE_REGISTRY_NEGATIVE_TTL_SECONDS,
+)
+
+
+def invalidate_devices(device_ids: Iterable[str]):
+    """Invalidate locally and, in worker mode, in the ingest worker that runs process_batch."""
+    device_ids = list(device_ids)
+    device_registry.invalidate(device_ids)
+    if settings.INGEST_MODE == "worker":
+        from app.ingest_link import ingest_link_client
+        if ingest_link_client is not None:
+            ingest_link_client.send_control({"type": "invalidate_device", "device_ids": device_ids})
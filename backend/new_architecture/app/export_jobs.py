@@ -0,0 +1,449 @@
+"""Background folder export jobs with progress reporting and cached HDF5 files.
+
+POST /api/export/folder/{id}/jobs queues a job; EXPORT_WORKERS worker tasks
+run export_folder_to_hdf5, whose h5py writes go to a thread so the event loop
+keeps serving. Progress is polled with GET /api/export/jobs/{job_id}; it is
+not pushed over /ws, whose frames the dashboards read as telemetry.
+
+Jobs run in the process that accepted them, but their state is also written
+to a JSON status file (jobs/<job_id>.json in the export directory) on every
+transition and at most every STATUS_WRITE_INTERVAL seconds of progress, so
+with uvicorn --workers N a poll or download that lands on another worker
+still finds the job.
+
+Each finished file is cached under the folder's content version, a hash of
+its curve_stats totals (curve count, row count, newest timestamp), its tip
+metadata and the HDF5 dataset layout. A request for an unchanged folder is answered with the cached file
+without touching the samples; a new version replaces the folder's previous
+file.
+
+With EXPORT_INCREMENTAL a new version is produced by updating the folder's
+master file (incremental/folder{id}.master, see
+export_folder_to_hdf5_incremental), which reads only new and changed curves
+from the database, and copying it to the versioned file. The master and its
+manifest use extensions local_agent does not upload.
+"""
+
+import asyncio
+import glob
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.db import export_folder_to_hdf5, export_folder_to_hdf5_incremental, get_folder_export_metadata
+from app.hdf5_writer import DatasetLayout
+from app.models import CurveStat, Folder
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): master files are only guarded within one process there.
+    fcntl = None
+
+# Preferred persistent export directory; project-local fallback when /data is read-only.
+PREFERRED_EXPORT_DIRECTORY = "/data/barytech"
+FALLBACK_EXPORT_DIRECTORY = os.path.join(os.getcwd(), "data", "barytech")
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+# Minimum seconds between status file writes for the progress of one job
+STATUS_WRITE_INTERVAL = 0.5
+
+
+def resolve_export_directory() -> str:
+    """Create and return the export directory, falling back if /data is not writable."""
+    try:
+        os.makedirs(PREFERRED_EXPORT_DIRECTORY, exist_ok=True)
+        return PREFERRED_EXPORT_DIRECTORY
+    except OSError:
+        os.makedirs(FALLBACK_EXPORT_DIRECTORY, exist_ok=True)
+        return FALLBACK_EXPORT_DIRECTORY
+
+
+def artifact_path(directory: str, folder_id: int, version: str) -> str:
+    """Cached export file of one folder content version."""
+    return os.path.join(directory, f"folder{folder_id}_{version}.hdf5")
+
+
+def master_path(directory: str, folder_id: int) -> str:
+    """Incremental master file of a folder (not matched by local_agent's *.h5 / *.hdf5 globs)."""
+    return os.path.join(directory, "incremental", f"folder{folder_id}.master")
+
+
+def job_status_path(directory: str, job_id: str) -> str:
+    """Status file of one export job, shared by all server processes."""
+    return os.path.join(directory, "jobs", f"{job_id}.json")
+
+
+def _acquire_file_lock(path: str):
+    """Open path and take an exclusive flock on it (blocking); closing the file releases it."""
+    lock_file = open(path, "a")
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def download_filename(folder: Folder, extension: str = ".hdf5") -> str:
+    """Folder name made safe for use as a filename."""
+    safe_name = "".join(c if c.isalnum() or c in " _-." else "_" for c in folder.name).strip()
+    return f"{safe_name or f'folder{folder.id}'}{extension}"
+
+
+async def folder_content_version(db: AsyncSession, folder: Folder, layout: DatasetLayout) -> Tuple[str, int]:
+    """(content version, sample count) of a folder.
+
+    Read from curve_stats, O(curves): every saved batch raises row_count and
+    usually max_timestamp, deletions rebuild the folder's stats, and metadata
+    edits change the metadata part, so any change yields a new version. A
+    different dataset layout (EXPORT_HDF5_* settings) is a different version too.
+    """
+    curve_count, row_total, max_timestamp = (await db.execute(
+        select(
+            func.count(CurveStat.id),
+            func.coalesce(func.sum(CurveStat.row_count), 0),
+            func.max(CurveStat.max_timestamp),
+        ).where(CurveStat.folder_id == folder.id)
+    )).one()
+    content = orjson.dumps(
+        [curve_count, row_total, max_timestamp, get_folder_export_metadata(folder), layout.key],
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha1(content).hexdigest()[:16], int(row_total)
+
+
+class ExportJob:
+    """One folder export request and its progress."""
+
+    def __init__(
+        self,
+        folder_id: int,
+        user_id: int,
+        version: str,
+        file_path: str,
+        filename: str,
+        rows_total: int,
+        layout: Optional[DatasetLayout],
+        job_id: Optional[str] = None,
+    ):
+        self.id = job_id or uuid.uuid4().hex
+        self.folder_id = folder_id
+        self.user_id = user_id
+        self.version = version
+        self.file_path = file_path
+        self.filename = filename
+        self.rows_total = rows_total
+        # None for a job loaded from another process's status file
+        self.layout = layout
+        self.layout_key = layout.key if layout is not None else ""
+        self.rows_done = 0
+        self.status = "queued"
+        # True when the file already existed for this version and nothing was exported
+        self.cached = False
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.finished_monotonic: Optional[float] = None
+        self.done = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def finish(self, status: str, status_code: Optional[int] = None, error: Optional[str] = None):
+        self.status = status
+        self.status_code = status_code
+        self.error = error
+        if status == "done":
+            self.rows_done = max(self.rows_done, self.rows_total)
+        self.finished_at = datetime.now()
+        self.finished_monotonic = time.monotonic()
+        self.done.set()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "folder_id": self.folder_id,
+            "status": self.status,
+            "version": self.version,
+            "layout": self.layout_key,
+            "rows_done": self.rows_done,
+            "rows_total": self.rows_total,
+            "progress": min(self.rows_done / self.rows_total, 1.0) if self.rows_total else float(self.status == "done"),
+            "cached": self.cached,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "download_url": f"/api/export/jobs/{self.id}/download" if self.status == "done" else None,
+        }
+
+    def to_state(self) -> dict:
+        """to_dict plus what another process needs to authorize and serve the job."""
+        return {
+            **self.to_dict(),
+            "user_id": self.user_id,
+            "file_path": self.file_path,
+            "filename": self.filename,
+            "status_code": self.status_code,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "ExportJob":
+        """Read-only snapshot of a job from its status file."""
+        job = cls(
+            state["folder_id"], state["user_id"], state["version"], state["file_path"],
+            state["filename"], state["rows_total"], None, job_id=state["job_id"],
+        )
+        job.layout_key = state["layout"]
+        job.rows_done = state["rows_done"]
+        job.status = state["status"]
+        job.cached = state["cached"]
+        job.error = state["error"]
+        job.status_code = state["status_code"]
+        job.created_at = datetime.fromisoformat(state["created_at"])
+        if state["finished_at"] is not None:
+            job.finished_at = datetime.fromisoformat(state["finished_at"])
+        if not job.active:
+            job.done.set()
+        return job
+
+
+class ExportJobQueue:
+    """Queue of folder export jobs drained by a fixed number of worker tasks."""
+
+    def __init__(self, workers: int, job_ttl_seconds: float):
+        self.workers = max(1, workers)
+        self.job_ttl_seconds = job_ttl_seconds
+        self._queue: "asyncio.Queue[ExportJob]" = asyncio.Queue()
+        self._tasks: list = []
+        self.jobs: Dict[str, ExportJob] = {}
+        # Latest job per (folder_id, version), so repeated requests share one export
+        self._by_version: Dict[Tuple[int, str], ExportJob] = {}
+        # One writer per master file: jobs of the same folder update it in turn. Other
+        # processes (uvicorn --workers N) are excluded by a flock on "<master>.lock".
+        self._master_locks: Dict[int, asyncio.Lock] = {}
+        # Monitoring
+        self.jobs_submitted = 0
+        self.jobs_loaded = 0
+        self.cache_hits = 0
+        self.jobs_joined = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.incremental_curves_written = 0
+        self.incremental_rebuilds = 0
+        self.last_export_seconds = 0.0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            print(f"[EXPORT] Job queue started with {self.workers} workers")
+
+    async def submit(self, db: AsyncSession, folder: Folder, user_id: int) -> ExportJob:
+        """Job for the folder's current content: cached, already in flight, or newly queued."""
+        self._prune()
+        self.jobs_submitted += 1
+        layout = DatasetLayout.from_settings(settings)
+        version, rows_total = await folder_content_version(db, folder, layout)
+        existing = self._by_version.get((folder.id, version))
+        if existing is not None and (existing.active or (existing.status == "done" and os.path.exists(existing.file_path))):
+            self.jobs_joined += 1
+            return existing
+
+        file_path = artifact_path(resolve_export_directory(), folder.id, version)
+        job = ExportJob(folder.id, user_id, version, file_path, download_filename(folder), rows_total, layout)
+        self.jobs[job.id] = job
+        self._by_version[(folder.id, version)] = job
+        if os.path.exists(file_path):
+            job.cached = True
+            job.finish("done")
+            self.cache_hits += 1
+        else:
+            self.start()
+            self._queue.put_nowait(job)
+        self._write_status(job)
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[ExportJob]:
+        """A job of this user, or None (other users' jobs are invisible).
+
+        Jobs of other server processes are read from their status files.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            job = self._load_status(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    @staticmethod
+    def _write_status(job: ExportJob):
+        """Atomically replace the job's status file."""
+        path = job_status_path(os.path.dirname(job.file_path), job.id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "wb") as status_file:
+                status_file.write(orjson.dumps(job.to_state()))
+            os.replace(temp_path, path)
+        except OSError as exc:
+            print(f"[EXPORT] Could not write status of job {job.id}: {exc}")
+
+    def _load_status(self, job_id: str) -> Optional[ExportJob]:
+        # Job ids are uuid4 hex; anything else never names a status file.
+        if len(job_id) != 32 or any(c not in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(job_status_path(resolve_export_directory(), job_id), "rb") as status_file:
+                state = orjson.loads(status_file.read())
+        except (OSError, ValueError):
+            return None
+        self.jobs_loaded += 1
+        return ExportJob.from_state(state)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ExportJob):
+        job.status = "running"
+        self._write_status(job)
+        # Written under a name local_agent does not pick up, then renamed into place.
+        # Unique per process and job, so concurrent exports of one version never share it.
+        partial_path = f"{job.file_path}.{os.getpid()}-{job.id}.part"
+        started = time.perf_counter()
+        last_write = time.monotonic()
+
+        def on_progress(rows_done: int):
+            nonlocal last_write
+            job.rows_done = rows_done
+            if time.monotonic() - last_write >= STATUS_WRITE_INTERVAL:
+                last_write = time.monotonic()
+                self._write_status(job)
+
+        try:
+            if settings.EXPORT_INCREMENTAL:
+                await self._export_incremental(job, partial_path, on_progress)
+            else:
+                await export_folder_to_hdf5(partial_path, job.folder_id, job.user_id, progress=on_progress, layout=job.layout)
+            os.replace(partial_path, job.file_path)
+        except HTTPException as exc:
+            job.finish("failed", exc.status_code, str(exc.detail))
+        except Exception as exc:
+            print(f"[EXPORT] Job {job.id} for folder {job.folder_id} failed: {exc}")
+            job.finish("failed", 500, f"Export failed: {exc}")
+        else:
+            job.finish("done")
+            self._remove_stale_artifacts(job)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        if job.status == "done":
+            self.jobs_completed += 1
+            self.last_export_seconds = time.perf_counter() - started
+        else:
+            self.jobs_failed += 1
+        self._write_status(job)
+
+    async def _export_incremental(self, job: ExportJob, partial_path: str, progress: Callable[[int], None]):
+        """Update the folder's master file, then copy it to partial_path."""
+        path = master_path(os.path.dirname(job.file_path), job.folder_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock = self._master_locks.setdefault(job.folder_id, asyncio.Lock())
+        async with lock:
+            lock_file = await asyncio.to_thread(_acquire_file_lock, path + ".lock")
+            try:
+                summary = await export_folder_to_hdf5_incremental(
+                    path, job.folder_id, job.user_id, progress=progress, layout=job.layout
+                )
+                # The master keeps changing with later exports; the versioned file is a copy.
+                await asyncio.to_thread(shutil.copyfile, path, partial_path)
+            finally:
+                lock_file.close()
+        self.incremental_curves_written += summary["curves_written"] or 0
+        self.incremental_rebuilds += int(summary["rebuilt"])
+
+    @staticmethod
+    def _remove_stale_artifacts(job: ExportJob):
+        """Drop cached files of older versions of the same folder."""
+        pattern = os.path.join(os.path.dirname(job.file_path), f"folder{job.folder_id}_*.hdf5")
+        for path in glob.glob(pattern):
+            if path != job.file_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_monotonic is not None and now - job.finished_monotonic > self.job_ttl_seconds:
+                del self.jobs[job_id]
+                if self._by_version.get((job.folder_id, job.version)) is job:
+                    del self._by_version[(job.folder_id, job.version)]
+        # Status files of every process; those of jobs still held here are kept.
+        # A job is rewritten at least on each transition, so an old file is finished
+        # or belongs to a process that died.
+        pattern = job_status_path(resolve_export_directory(), "*")
+        for path in glob.glob(pattern):
+            job_id = os.path.basename(path)[:-len(".json")]
+            try:
+                if job_id not in self.jobs and time.time() - os.path.getmtime(path) > self.job_ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def get_stats(self) -> dict:
+        return {
+            "export_workers": self.workers,
+            "export_jobs_queued": self._queue.qsize(),
+            "export_jobs_running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "export_jobs_submitted": self.jobs_submitted,
+            "export_cache_hits": self.cache_hits,
+            "export_jobs_joined": self.jobs_joined,
+            "export_jobs_loaded": self.jobs_loaded,
+            "export_jobs_completed": self.jobs_completed,
+            "export_jobs_failed": self.jobs_failed,
+            "export_incremental_curves_written": self.incremental_curves_written,
+            "export_incremental_rebuilds": self.incremental_rebuilds,
+            "export_last_seconds": self.last_export_seconds,
+        }
+
+
+export_jobs = ExportJobQueue(settings.EXPORT_WORKERS, settings.EXPORT_JOB_TTL_SECONDS)
+
+
+__all__ = [
+    "ExportJob",
+    "ExportJobQueue",
+    "export_jobs",
+    "download_filename",
+    "folder_content_version",
+    "job_status_path",
+    "master_path",
+    "resolve_export_directory",
+]
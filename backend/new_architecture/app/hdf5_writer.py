@@ -0,0 +1,179 @@
+"""Incremental HDF5 curve writer for the folder export.
+
+Samples arrive in bounded blocks (a server-side cursor partition or a decoded
+curve_chunks blob) and are appended to resizable, chunked datasets:
+
+    curve{N}/segment0/Force, Z   indent  (phase 0)
+    curve{N}/segment1/Force, Z   retract (phase 1)
+    curve{N}/tip                 written once, when the curve group is created
+
+so memory stays bounded by the block size instead of the folder size.
+
+Dataset creation options come from a DatasetLayout: chunk length, gzip or lzf
+compression with the shuffle filter, and float32 instead of float64 samples.
+Groups, dataset names and tip attributes are the same for every layout, and
+HDF5 applies the filters transparently on read. lzf is an h5py filter, so
+only h5py-based readers (SoftMech included) can open lzf files; gzip works
+with any HDF5 reader.
+"""
+
+from typing import Callable, Optional, Tuple
+
+import h5py
+import numpy as np
+
+# Maximum elements per HDF5 chunk of the resizable Force / Z datasets
+DATASET_CHUNK_ROWS = 4096
+# A segment's chunks follow the length of its first block, but never below this
+MIN_CHUNK_ROWS = 512
+
+COMPRESSIONS = ("none", "gzip", "lzf")
+
+
+def to_float_array(values) -> np.ndarray:
+    """float64 array from DB values; None and unparsable legacy strings become NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        converted = []
+        for value in values:
+            try:
+                converted.append(float(value))
+            except (TypeError, ValueError):
+                converted.append(np.nan)
+        return np.asarray(converted, dtype=np.float64)
+
+
+class DatasetLayout:
+    """h5py create_dataset options for the Force / Z datasets."""
+
+    def __init__(
+        self,
+        chunk_rows: int = DATASET_CHUNK_ROWS,
+        compression: str = "none",
+        compression_level: int = 4,
+        shuffle: bool = True,
+        float32: bool = False,
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown HDF5 compression {compression!r}; expected one of {COMPRESSIONS}")
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.compression = compression
+        self.compression_level = min(max(int(compression_level), 0), 9)
+        # Shuffle only helps in front of a compressor.
+        self.shuffle = bool(shuffle) and compression != "none"
+        self.float32 = bool(float32)
+
+    @classmethod
+    def from_settings(cls, settings) -> "DatasetLayout":
+        return cls(
+            chunk_rows=settings.EXPORT_HDF5_CHUNK_ROWS,
+            compression=settings.EXPORT_HDF5_COMPRESSION,
+            compression_level=settings.EXPORT_HDF5_COMPRESSION_LEVEL,
+            shuffle=settings.EXPORT_HDF5_SHUFFLE,
+            float32=settings.EXPORT_HDF5_FLOAT32,
+        )
+
+    @property
+    def dtype(self):
+        return np.float32 if self.float32 else np.float64
+
+    @property
+    def key(self) -> str:
+        """Short description, e.g. "gzip4-shuffle-f64-c4096" (part of export cache versions)."""
+        parts = [f"gzip{self.compression_level}" if self.compression == "gzip" else self.compression]
+        if self.shuffle:
+            parts.append("shuffle")
+        parts.append("f32" if self.float32 else "f64")
+        parts.append(f"c{self.chunk_rows}")
+        return "-".join(parts)
+
+    def dataset_kwargs(self, first_rows: int = DATASET_CHUNK_ROWS) -> dict:
+        """Options for a new dataset whose first append has first_rows samples.
+
+        Chunks are sized to that first block (within MIN_CHUNK_ROWS..chunk_rows)
+        so a short curve is stored as one exact chunk instead of being padded
+        to a full chunk_rows chunk on disk.
+        """
+        chunk_rows = min(self.chunk_rows, max(first_rows, MIN_CHUNK_ROWS))
+        kwargs = {"dtype": self.dtype, "chunks": (chunk_rows,)}
+        if self.compression == "gzip":
+            kwargs["compression"] = "gzip"
+            kwargs["compression_opts"] = self.compression_level
+        elif self.compression == "lzf":
+            kwargs["compression"] = "lzf"
+        if self.shuffle:
+            kwargs["shuffle"] = True
+        return kwargs
+
+
+class CurveFileWriter:
+    """Appends (curve, phase) runs of Force / Z samples to an open h5py.File."""
+
+    def __init__(
+        self,
+        hdf: h5py.File,
+        on_new_curve: Callable[[h5py.Group], None] = None,
+        layout: Optional[DatasetLayout] = None,
+    ):
+        self.hdf = hdf
+        self.on_new_curve = on_new_curve
+        self.layout = layout or DatasetLayout()
+        # Only the segment being appended stays open: each open dataset holds its
+        # own HDF5 chunk cache, so keeping every segment open would grow with the
+        # number of curves. A segment revisited later is reopened from the file.
+        self._open_key: Optional[Tuple[int, str]] = None
+        self._open_datasets: Optional[Tuple[h5py.Dataset, h5py.Dataset]] = None
+        self.curve_count = 0
+        self.rows_written = 0
+
+    def _segment(self, curve_index: int, segment_name: str, first_rows: int) -> Tuple[h5py.Dataset, h5py.Dataset]:
+        key = (curve_index, segment_name)
+        if key == self._open_key:
+            return self._open_datasets
+        curve_name = f"curve{curve_index}"
+        if curve_name not in self.hdf:
+            curve_group = self.hdf.create_group(curve_name)
+            self.curve_count += 1
+            if self.on_new_curve is not None:
+                self.on_new_curve(curve_group)
+        curve_group = self.hdf[curve_name]
+        if segment_name in curve_group:
+            segment_group = curve_group[segment_name]
+            datasets = (segment_group["Force"], segment_group["Z"])
+        else:
+            segment_group = curve_group.create_group(segment_name)
+            dataset_kwargs = self.layout.dataset_kwargs(first_rows)
+            datasets = tuple(
+                segment_group.create_dataset(name, shape=(0,), maxshape=(None,), **dataset_kwargs)
+                for name in ("Force", "Z")
+            )
+        self._open_key, self._open_datasets = key, datasets
+        return datasets
+
+    def append(self, curve_index: int, phase: int, force: np.ndarray, z: np.ndarray):
+        """Append one run of a single curve and phase; force is written as given (already negated)."""
+        valid = ~(np.isnan(force) | np.isnan(z))
+        if not valid.all():
+            force, z = force[valid], z[valid]
+        if len(force) == 0:
+            return
+        segment_name = "segment1" if phase == 1 else "segment0"
+        for dataset, values in zip(self._segment(curve_index, segment_name, len(force)), (force, z)):
+            start = dataset.shape[0]
+            dataset.resize((start + len(values),))
+            dataset[start:] = values
+        self.rows_written += len(force)
+
+    def append_rows(self, curve_index: np.ndarray, phase: np.ndarray, force: np.ndarray, z: np.ndarray):
+        """Append a block sorted by (curve_index, phase), splitting it into runs."""
+        # Phases other than 1 export as segment0, like phase 0.
+        phase = np.where(phase == 1, 1, 0)
+        breaks = np.flatnonzero((np.diff(curve_index) != 0) | (np.diff(phase) != 0)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(curve_index)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self.append(int(curve_index[start]), int(phase[start]), force[start:end], z[start:end])
+
+
+__all__ = ["CurveFileWriter", "DatasetLayout", "DATASET_CHUNK_ROWS", "MIN_CHUNK_ROWS", "COMPRESSIONS", "to_float_array"]
@@ -0,0 +1,190 @@
+"""Local socket link between the ingest worker process and API processes.
+
+With INGEST_MODE=worker, app.ingest_worker owns MQTT ingest, decoding and DB
+writes and runs an IngestLinkServer. Every API process (any number of uvicorn
+workers) connects an IngestLinkClient and receives every live device batch;
+each API process only delivers them to its own WebSocket connections.
+
+Wire format: each message is a "<IB" header (payload length, kind) followed
+by the payload.
+
+    LINK_LIVE     u16 device_id length, device_id UTF-8, LINK_DTYPE rows
+    LINK_CONTROL  orjson object, API -> ingest ("save", "publish", "invalidate_device")
+"""
+
+import asyncio
+import struct
+from typing import Awaitable, Callable, Optional, Set
+
+import numpy as np
+import orjson
+
+from app.telemetry import TelemetryBatch
+
+LINK_HEADER = struct.Struct("<IB")
+LINK_LIVE = 1
+LINK_CONTROL = 2
+
+LINK_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("displacement", "<f8"),
+    ("force", "<f8"),
+    ("phase", "i1"),
+    ("motor_working", "i1"),
+    ("state", "i1"),
+])
+
+# Drop live frames for a subscriber whose unsent transport buffer exceeds this.
+SUBSCRIBER_BUFFER_LIMIT = 8 * 1024 * 1024
+
+
+def encode_live(device_id: str, batch: TelemetryBatch) -> bytes:
+    rows = np.empty(len(batch), dtype=LINK_DTYPE)
+    for name in LINK_DTYPE.names:
+        rows[name] = getattr(batch, name)
+    device_bytes = device_id.encode("utf-8")
+    payload = struct.pack("<H", len(device_bytes)) + device_bytes + rows.tobytes()
+    return LINK_HEADER.pack(len(payload), LINK_LIVE) + payload
+
+
+def decode_live(payload: bytes):
+    (id_len,) = struct.unpack_from("<H", payload, 0)
+    device_id = payload[2:2 + id_len].decode("utf-8")
+    rows = np.frombuffer(payload, dtype=LINK_DTYPE, offset=2 + id_len)
+    batch = TelemetryBatch(
+        device_ids=[device_id],
+        device_codes=np.zeros(len(rows), dtype=np.int32),
+        timestamp=rows["timestamp"],
+        displacement=rows["displacement"],
+        force=rows["force"],
+        phase=rows["phase"],
+        motor_working=rows["motor_working"],
+        state=rows["state"],
+    )
+    return device_id, batch
+
+
+def encode_control(message: dict) -> bytes:
+    payload = orjson.dumps(message)
+    return LINK_HEADER.pack(len(payload), LINK_CONTROL) + payload
+
+
+async def read_message(reader: asyncio.StreamReader):
+    header = await reader.readexactly(LINK_HEADER.size)
+    length, kind = LINK_HEADER.unpack(header)
+    return kind, await reader.readexactly(length)
+
+
+class IngestLinkServer:
+    """Runs in the ingest worker: fans live batches out to every connected API process."""
+
+    def __init__(self, host: str, port: int, on_control: Callable[[dict], Awaitable[None]]):
+        self.host = host
+        self.port = port
+        self.on_control = on_control
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.frames_published = 0
+        self.frames_dropped = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"[INGEST] Link listening on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def publish_live(self, device_id: str, batch: TelemetryBatch):
+        """Write one live batch to every subscriber without waiting on any of them."""
+        if not self.subscribers:
+            return
+        message = encode_live(device_id, batch)
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT:
+                # A stalled API process must not grow ingest memory; it loses live frames only.
+                self.frames_dropped += 1
+                continue
+            writer.write(message)
+            self.frames_published += 1
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        print(f"[INGEST] API process connected: {peer}")
+        self.subscribers.add(writer)
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == LINK_CONTROL:
+                    try:
+                        await self.on_control(orjson.loads(payload))
+                    except Exception as e:
+                        print(f"[INGEST] Error handling control message: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+            print(f"[INGEST] API process disconnected: {peer}")
+
+    def get_stats(self) -> dict:
+        return {
+            "link_subscribers": len(self.subscribers),
+            "link_frames_published": self.frames_published,
+            "link_frames_dropped": self.frames_dropped,
+        }
+
+
+class IngestLinkClient:
+    """Runs in each API process: receives live batches and relays control messages."""
+
+    def __init__(self, host: str, port: int, on_live: Callable[[str, TelemetryBatch], Awaitable[None]]):
+        self.host = host
+        self.port = port
+        self.on_live = on_live
+        self.connected = False
+        self.frames_received = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def run(self, retry_delay: float = 1.0):
+        """Connect and consume live frames, reconnecting while the ingest worker is down."""
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                self.connected = True
+                print(f"[INGEST] Connected to ingest worker at {self.host}:{self.port}")
+                while True:
+                    kind, payload = await read_message(reader)
+                    if kind == LINK_LIVE:
+                        device_id, batch = decode_live(payload)
+                        self.frames_received += 1
+                        await self.on_live(device_id, batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    print(f"[INGEST] Lost ingest worker link: {e}")
+            finally:
+                self.connected = False
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(retry_delay)
+
+    def send_control(self, message: dict) -> bool:
+        """Send a control message to the ingest worker; False when the link is down."""
+        if self._writer is None:
+            print(f"[INGEST] Ingest worker not connected, dropping control message: {message.get('type')}")
+            return False
+        self._writer.write(encode_control(message))
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "link_connected": self.connected,
+            "link_frames_received": self.frames_received,
+        }
+
+
+# API-side link client; set by the FastAPI lifespan when INGEST_MODE=worker.
+ingest_link_client: Optional[IngestLinkClient] = None
@@ -0,0 +1,69 @@
+"""Dedicated ingest process: MQTT ingest, decoding and DB writes off the API event loop.
+
+Start one per deployment next to the API when INGEST_MODE=worker:
+
+    python -m app.ingest_worker
+    uvicorn app.main:app --workers 4
+
+The API processes then skip their own MQTT client and receive live batches
+over the ingest link (app/ingest_link.py). Save-flag changes and slider
+publishes made through /ws are relayed back here, so curve numbering and
+DB writes stay in this single process regardless of the uvicorn worker count.
+"""
+
+import asyncio
+
+import app.message_processor as message_processor
+from app.config import settings
+from app.ingest_link import IngestLinkServer
+from app.mqtt_client import start_mqtt_client, get_mqtt_client, process_raw_messages, start_monitoring, decode_pool
+from app.shared_state import apply_save_flag
+from app.device_registry import device_registry
+
+
+async def handle_control(message: dict):
+    """Apply control messages relayed by API processes."""
+    message_type = message.get("type")
+    if message_type == "save":
+        apply_save_flag(message.get("save", False), message.get("folder_id"), message.get("metadata"))
+    elif message_type == "publish":
+        get_mqtt_client().publish(message["topic"], message["payload"])
+    elif message_type == "invalidate_device":
+        device_registry.invalidate(message.get("device_ids"))
+    else:
+        print(f"[INGEST] Unknown control message type: {message_type}")
+
+
+async def run_ingest_worker():
+    server = IngestLinkServer(settings.INGEST_LINK_HOST, settings.INGEST_LINK_PORT, handle_control)
+    await server.start()
+    # Broadcasters publish to the link instead of local WebSockets.
+    message_processor.live_publisher = server.publish_live
+
+    if settings.INGEST_METRICS_PORT:
+        from app.metrics import PROMETHEUS_AVAILABLE
+        if PROMETHEUS_AVAILABLE:
+            from prometheus_client import start_http_server
+            start_http_server(settings.INGEST_METRICS_PORT)
+            print(f"[INGEST] Prometheus metrics on :{settings.INGEST_METRICS_PORT}")
+
+    try:
+        await device_registry.load()
+    except Exception as e:
+        print(f"[REGISTRY] Initial device load failed, filling on demand: {e}")
+
+    start_mqtt_client()
+    tasks = [
+        asyncio.create_task(process_raw_messages()),
+        asyncio.create_task(start_monitoring()),
+    ]
+    try:
+        await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        decode_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_ingest_worker())
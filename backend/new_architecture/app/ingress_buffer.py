@@ -0,0 +1,257 @@
+"""Bounded ingress buffer between the paho network thread and the event loop.
+
+Raw MQTT payloads are kept in memory up to a high-water mark. Past it, the
+paho thread appends payloads to segment files on local disk instead of
+growing RAM; the event loop replays them in arrival order once it has
+drained memory. While any spilled data is pending, new payloads also go to
+disk so ordering is preserved. Segments left over from a previous run are
+replayed first on startup.
+
+Segment record layout: "<Id" header (payload length, enqueue epoch s), then
+the payload bytes. Files are named ingress-<sequence>.seg and deleted once
+fully replayed.
+
+A spill directory belongs to one process at a time: the queue holds an
+exclusive flock on its .lock file. When another live process holds the
+configured directory, the queue takes the first free slot-<n> subdirectory
+instead, so a restarted process still finds (and replays) its own leftovers.
+"""
+
+import os
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): spill directories are not shared-process safe there.
+    fcntl = None
+
+SPILL_RECORD = struct.Struct("<Id")
+SEGMENT_PREFIX = "ingress-"
+SEGMENT_SUFFIX = ".seg"
+
+# Records read from disk per replay refill.
+REPLAY_CHUNK = 512
+LOCK_FILE = ".lock"
+# Slot subdirectories tried when the configured spill directory is taken
+MAX_SPILL_SLOTS = 64
+
+
+def claim_spill_dir(base_dir: str):
+    """(directory, open lock file) of the first spill slot no other process holds."""
+    for slot in range(MAX_SPILL_SLOTS):
+        directory = base_dir if slot == 0 else os.path.join(base_dir, f"slot-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        if fcntl is None:
+            return directory, None
+        lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return directory, lock_file
+    raise RuntimeError(f"No free ingress spill slot under {base_dir}")
+
+
+class SpillingIngressQueue:
+    """Thread-safe FIFO with queue.Queue's put_nowait/get_nowait/qsize interface."""
+
+    def __init__(
+        self,
+        high_water: int,
+        spill_dir: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_spill_bytes: int = 2 * 1024 * 1024 * 1024,
+    ):
+        self.high_water = high_water
+        # Held for the life of the queue; released by the OS if the process dies.
+        self.spill_dir, self._dir_lock = claim_spill_dir(spill_dir)
+        self.segment_bytes = segment_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self._lock = threading.Lock()
+        self._memory: Deque[bytes] = deque()
+        # Records already read back from disk, waiting to be handed out.
+        self._replay: Deque[tuple] = deque()
+        self._segments: List[str] = []
+        self._writer = None
+        self._reader = None
+        self._reader_path: Optional[str] = None
+        # Monitoring
+        self.spill_bytes = 0
+        self.spill_records = 0
+        self.spilled_bytes_total = 0
+        self.spilled_records_total = 0
+        self.replayed_records_total = 0
+        self.dropped = 0
+        self.replay_lag = 0.0
+        self._recover_segments()
+
+    # ── Producer side (paho thread) ───────────────────────────────────────────
+
+    def put_nowait(self, payload: bytes):
+        """Enqueue a payload; raises queue.Full only when memory and disk are both exhausted."""
+        with self._lock:
+            if not self._spilling and len(self._memory) < self.high_water:
+                self._memory.append(payload)
+                return
+            if self.spill_bytes + SPILL_RECORD.size + len(payload) > self.max_spill_bytes:
+                self.dropped += 1
+                raise queue.Full
+            try:
+                self._append(payload)
+            except OSError as e:
+                self.dropped += 1
+                print(f"[INGRESS] Spill write failed: {e}")
+                raise queue.Full
+
+    @property
+    def _spilling(self) -> bool:
+        return self.spill_records > 0 or bool(self._replay)
+
+    def _append(self, payload: bytes):
+        if self._writer is None or self._writer.tell() >= self.segment_bytes:
+            self._open_segment()
+        record = SPILL_RECORD.pack(len(payload), time.time())
+        self._writer.write(record)
+        self._writer.write(payload)
+        self._writer.flush()
+        size = len(record) + len(payload)
+        self.spill_bytes += size
+        self.spill_records += 1
+        self.spilled_bytes_total += size
+        self.spilled_records_total += 1
+
+    def _open_segment(self):
+        if self._writer is not None:
+            self._writer.close()
+        os.makedirs(self.spill_dir, exist_ok=True)
+        sequence = int(self._segments[-1][len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1 if self._segments else 0
+        name = f"{SEGMENT_PREFIX}{sequence:08d}{SEGMENT_SUFFIX}"
+        self._segments.append(name)
+        self._writer = open(os.path.join(self.spill_dir, name), "ab")
+
+    # ── Consumer side (event loop) ────────────────────────────────────────────
+
+    def get_nowait(self) -> bytes:
+        """Dequeue the oldest payload: memory first, then spilled records in order."""
+        with self._lock:
+            if self._memory:
+                return self._memory.popleft()
+            if not self._replay and self.spill_records:
+                self._refill()
+            if self._replay:
+                payload, enqueued_at = self._replay.popleft()
+                self.replay_lag = time.time() - enqueued_at
+                self.replayed_records_total += 1
+                if not self._spilling:
+                    self.replay_lag = 0.0
+                return payload
+            raise queue.Empty
+
+    def _refill(self):
+        """Read up to REPLAY_CHUNK records from the oldest segment(s)."""
+        while len(self._replay) < REPLAY_CHUNK and self.spill_records:
+            if self._reader is None:
+                self._reader_path = os.path.join(self.spill_dir, self._segments[0])
+                if self._writer is not None and self._segments[0] == self._current_writer_name():
+                    self._writer.flush()
+                self._reader = open(self._reader_path, "rb")
+            header = self._reader.read(SPILL_RECORD.size)
+            if len(header) < SPILL_RECORD.size:
+                if self._segments[0] == self._current_writer_name():
+                    # Caught up with the active segment; keep it open for appends.
+                    self._reader.seek(-len(header), os.SEEK_CUR)
+                    break
+                self._finish_segment()
+                continue
+            length, enqueued_at = SPILL_RECORD.unpack(header)
+            payload = self._reader.read(length)
+            if len(payload) < length:
+                # Partial record at the end of a crashed segment.
+                self._reader.seek(-(len(header) + len(payload)), os.SEEK_CUR)
+                if self._segments[0] == self._current_writer_name():
+                    break
+                self._finish_segment()
+                continue
+            self._replay.append((payload, enqueued_at))
+            self.spill_records -= 1
+            self.spill_bytes -= SPILL_RECORD.size + length
+        if not self.spill_records and self._reader is not None:
+            # Everything on disk is in the replay buffer; drop the files.
+            self._reader.close()
+            self._reader = None
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for name in self._segments:
+                self._remove(name)
+            self._segments.clear()
+            self.spill_bytes = 0
+
+    def _current_writer_name(self) -> Optional[str]:
+        return self._segments[-1] if self._writer is not None and self._segments else None
+
+    def _finish_segment(self):
+        self._reader.close()
+        self._reader = None
+        self._remove(self._segments.pop(0))
+
+    def _remove(self, name: str):
+        try:
+            os.remove(os.path.join(self.spill_dir, name))
+        except OSError as e:
+            print(f"[INGRESS] Could not remove spill segment {name}: {e}")
+
+    def _recover_segments(self):
+        """Queue segments left by a previous run for replay ahead of new data."""
+        if not os.path.isdir(self.spill_dir):
+            return
+        names = sorted(
+            name for name in os.listdir(self.spill_dir)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            with open(path, "rb") as segment:
+                while True:
+                    header = segment.read(SPILL_RECORD.size)
+                    if len(header) < SPILL_RECORD.size:
+                        break
+                    length, _ = SPILL_RECORD.unpack(header)
+                    if len(segment.read(length)) < length:
+                        break
+                    self.spill_records += 1
+                    self.spill_bytes += SPILL_RECORD.size + length
+            self._segments.append(name)
+        if self.spill_records:
+            print(f"[INGRESS] Replaying {self.spill_records} spilled payloads from a previous run in {self.spill_dir}")
+
+    # ── queue.Queue compatibility and monitoring ──────────────────────────────
+
+    def qsize(self) -> int:
+        with self._lock:
+            return len(self._memory) + len(self._replay) + self.spill_records
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "ingress_memory": len(self._memory),
+                "ingress_high_water": self.high_water,
+                "ingress_spill_bytes": self.spill_bytes,
+                "ingress_spill_records": self.spill_records + len(self._replay),
+                "ingress_spilled_bytes_total": self.spilled_bytes_total,
+                "ingress_spilled_records_total": self.spilled_records_total,
+                "ingress_replayed_records_total": self.replayed_records_total,
+                "ingress_replay_lag_seconds": self.replay_lag,
+                "ingress_dropped": self.dropped,
+                "ingress_spill_dir": self.spill_dir,
+            }
@@ -4,15 +4,18 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from app.message_processor import broadcast_messages, batch_processor, global_message_processor
 from app.mqtt_client import process_raw_messages
-from app.mqtt_client import start_mqtt_client, get_mqtt_client
+from app.mqtt_client import start_mqtt_client, get_mqtt_client, decode_pool
 from app.db import get_db, save_client_session, mark_client_disconnected
 import json
 import asyncio
 import threading
 from contextlib import asynccontextmanager
 from app.websocket_manager import websocket_connections
+from app.ws_fanout import get_socket_sender
+from app.decimation import LevelOfDetail
 from .auth import router as auth_router
-from app.shared_state import save_flag, main_event_loop, current_folder_id, current_curve_index, folder_curve_index_map
+from app.shared_state import save_flag, main_event_loop, current_folder_id, current_curve_index, folder_curve_index_map, apply_save_flag
+from app.config import settings
 from app.routers import router
 from strawberry.asgi import GraphQL
 import strawberry
@@ -46,10 +49,41 @@ async def lifespan(app: FastAPI):
     # Open persistent WebSocket connection to the Pi on startup.
     await printer_service.connect()
 
-    # Initialize MQTT client and subscribe to broker topics during API startup.
-    start_mqtt_client()
-    # Runs continuous raw-message batch processing without blocking startup.
-    raw_message_processor_task = asyncio.create_task(process_raw_messages())
+    # Prime the device registry so ingest and live routing start without per-batch queries.
+    from app.device_registry import device_registry
+    try:
+        await device_registry.load()
+    except Exception as e:
+        print(f"[REGISTRY] Initial device load failed, filling on demand: {e}")
+
+    # Folder listings and export versions read curve_stats; fill it for curves saved without stats.
+    from app.curve_stats import backfill_missing_curve_stats
+    try:
+        async with get_db() as db:
+            backfilled = await backfill_missing_curve_stats(db)
+            await db.commit()
+        if backfilled:
+            print(f"[STATS] curve_stats backfilled for {backfilled} curve(s)")
+    except Exception as e:
+        print(f"[STATS] curve_stats backfill failed, run python -m app.curve_stats: {e}")
+
+    # Stores background task for the ingest worker link (INGEST_MODE=worker only).
+    ingest_link_task = None
+
+    if settings.INGEST_MODE == "worker":
+        # MQTT ingest and DB writes run in app.ingest_worker; this process only
+        # receives live batches for its own WebSocket clients.
+        import app.ingest_link as ingest_link
+        from app.message_processor import deliver_live_batch
+        ingest_link.ingest_link_client = ingest_link.IngestLinkClient(
+            settings.INGEST_LINK_HOST, settings.INGEST_LINK_PORT, deliver_live_batch
+        )
+        ingest_link_task = asyncio.create_task(ingest_link.ingest_link_client.run())
+    else:
+        # Initialize MQTT client and subscribe to broker topics during API startup.
+        start_mqtt_client()
+        # Runs continuous raw-message batch processing without blocking startup.
+        raw_message_processor_task = asyncio.create_task(process_raw_messages())
     # Runs periodic monitoring output for pipeline health and throughput visibility.
     from app.mqtt_client import start_monitoring
     monitoring_task = asyncio.create_task(start_monitoring())
@@ -82,6 +116,13 @@ async def lifespan(app: FastAPI):
             await raw_message_processor_task
         except asyncio.CancelledError:
             pass
+        decode_pool.shutdown()
+    if ingest_link_task:
+        ingest_link_task.cancel()
+        try:
+            await ingest_link_task
+        except asyncio.CancelledError:
+            pass
     # Prevent noisy cancellation warnings when stopping periodic monitor task.
     if monitoring_task:
         monitoring_task.cancel()
@@ -90,6 +131,10 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
 
+    # Stop folder export workers; a cancelled job removes its half-written .part file.
+    from app.export_jobs import export_jobs
+    await export_jobs.shutdown()
+
     # Close cleanly on shutdown.
     await printer_service.disconnect()
 
@@ -137,6 +182,20 @@ async def get_monitoring_stats():
     # Get total messages sent to frontend from message_processor
     from app.message_processor import total_messages_sent_to_frontend
     combined_stats["total_messages_sent_to_frontend"] = total_messages_sent_to_frontend
+
+    # Per-socket outbound queue depth, lag and slow-consumer drops
+    from app.ws_fanout import get_socket_sender_stats
+    combined_stats["websocket_senders"] = get_socket_sender_stats()
+
+    # Ingest worker link state (INGEST_MODE=worker); MQTT/DB counters live in that process
+    from app.ingest_link import ingest_link_client
+    combined_stats["ingest_mode"] = settings.INGEST_MODE
+    if ingest_link_client is not None:
+        combined_stats.update(ingest_link_client.get_stats())
+
+    # Background folder export queue and cache hits
+    from app.export_jobs import export_jobs
+    combined_stats.update(export_jobs.get_stats())
     
     return combined_stats
 
@@ -191,16 +250,24 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.accept()
         # Use a default client_id if none is provided
         client_id = "1"  # Default client ID for all connections
+        # Optional live-stream level of detail, e.g. {"max_points_per_sec": 500, "mode": "minmax"}
+        lod = None
+        # Live-stream encoding: "json" (default) or "binary" (see app/ws_frame.py)
+        wire_format = "json"
         try:
             first_message = await websocket.receive_text()
             client_data = json.loads(first_message)
             if client_data.get("client_id"):
                 client_id = str(client_data.get("client_id"))  # Ensure it's a string
+            lod = LevelOfDetail.from_client_message(client_data)
+            wire_format = str(client_data.get("format", "json"))
         except Exception as e:
             print("No client_id provided, using default:", e)
             # Continue with default client_id
         
-        print(f"Connected client ID: {client_id}")
+        print(f"Connected client ID: {client_id}, level of detail: {lod.key if lod else 'full rate'}, format: {wire_format}")
+        # Register the outbound sender before the socket becomes visible to the fan-out
+        get_socket_sender(client_id, websocket, lod, wire_format)
         
         # Save client session asynchronously
         await save_client_session(db, client_id, str(websocket))
@@ -224,8 +291,14 @@ async def websocket_endpoint(websocket: WebSocket):
                 
                 if message_type == "slider":
                     # Handle slider updates
-                    mqtt_client = get_mqtt_client()  # Dynamically fetch the MQTT client
-                    mqtt_client.publish("PAR", json.dumps(params))
+                    if settings.INGEST_MODE == "worker":
+                        # The ingest worker owns the MQTT connection.
+                        from app.ingest_link import ingest_link_client
+                        if ingest_link_client is not None:
+                            ingest_link_client.send_control({"type": "publish", "topic": "PAR", "payload": json.dumps(params)})
+                    else:
+                        mqtt_client = get_mqtt_client()  # Dynamically fetch the MQTT client
+                        mqtt_client.publish("PAR", json.dumps(params))
                     print(f"Published slider data to PAR: {params}")
                 
                 elif message_type == "save":
@@ -259,6 +332,9 @@ async def websocket_endpoint(websocket: WebSocket):
                 # Publish to MQTT
                 
         except WebSocketDisconnect:
+            # Stop this socket's outbound sender and drop its backlog
+            from app.ws_fanout import close_socket_sender
+            close_socket_sender(websocket)
             # Mark client as disconnected asynchronously
             await mark_client_disconnected(db, client_id)
             # Remove WebSocket connection from the dictionary
@@ -384,39 +460,16 @@ def handle_save_flag(flag: bool, folder_id=None, metadata=None):
     """
     Update the global save state.
 
-    On a False→True transition the curve_index for the target folder is
-    incremented so every new save session records into a distinct curve slot.
-    folder_id is stored globally so message_processor can stamp rows without
-    the WebSocket context being passed all the way down the call stack.
-    Optional metadata (velocity, conversion factors, tip params) is stored
-    on the folder so all curves in the experiment share the same HDF5 tip attrs.
+    With INGEST_MODE=worker the ingest process owns the save state (it stamps
+    rows and numbers curves), so the change is relayed over the ingest link.
     """
-    import app.shared_state as state
-
-    # Detect the False→True edge that marks the start of a new curve.
-    is_rising_edge = (not state.save_flag) and flag
-
-    state.save_flag = flag
-
-    if flag:
-        # Remember which folder this save session targets.
-        state.current_folder_id = folder_id
-        # Store optional experiment metadata for the active folder save session.
-        state.current_folder_metadata = metadata if isinstance(metadata, dict) else None
-
-        if is_rising_edge and folder_id is not None:
-            # Increment the curve counter for this folder on each new ON press.
-            previous_index = state.folder_curve_index_map.get(folder_id, -1)
-            state.folder_curve_index_map[folder_id] = previous_index + 1
-            state.current_curve_index = state.folder_curve_index_map[folder_id]
-            print(f"Save ON — folder {folder_id}, curve_index {state.current_curve_index}")
-        elif is_rising_edge:
-            # No folder_id provided; reset to index 0 for legacy behaviour.
-            state.current_curve_index = 0
-            print("Save ON — no folder_id, curve_index 0")
-
-        print("Save data action triggered!")
-    else:
-        print("Save data action disabled.")
-        # Keep current_folder_id and current_curve_index so any in-flight
-        # messages still being flushed to DB pick up the correct values.
\ No newline at end of file
+    if settings.INGEST_MODE == "worker":
+        from app.ingest_link import ingest_link_client
+        if ingest_link_client is not None:
+            ingest_link_client.send_control(
+                {"type": "save", "save": flag, "folder_id": folder_id, "metadata": metadata}
+            )
+        else:
+            print("Ingest link not started; save flag change not relayed")
+        return
+    apply_save_flag(flag, folder_id, metadata)
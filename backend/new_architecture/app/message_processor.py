@@ -1,27 +1,35 @@
 import asyncio
-import json
 import time
 import orjson
-import zlib
-from datetime import datetime
+from itertools import repeat
 from typing import Dict, Set, List
 from fastapi import WebSocket
-from app.db import get_db, save_device_data_batch
-from app.models import IoTDevice
+from app.db import get_db, save_device_data_rows
+from app.bulk_writer import DEVICE_DATA_COLUMNS
+from app.curve_chunks import CurveChunkWriter
+from app.curve_stats import curve_stats_delta, upsert_curve_stats
+from app.device_registry import device_registry, DEFAULT_DEVICE_USER_ID
 from app.debug_log import debug_log
 from app.websocket_manager import websocket_connections  # Import from websocket_manager
 import app.shared_state as shared_state  # Import shared save state (save_flag, folder_id, curve_index)
-
-# Global variables for device queues
-device_queues: Dict[str, asyncio.Queue] = {}
+from app.telemetry import TelemetryBatch, TelemetryDecoder, epoch_to_datetime
+from app.ring_buffer import DeviceRingBuffer
+from app.config import settings
+from app.ws_fanout import get_user_fanout, get_fanout_stats, encode_payload
+
+# Per-device preallocated ring buffers, read by the broadcaster (drop-oldest)
+# and the saver (block, then spill) through independent cursors
+device_rings: Dict[str, DeviceRingBuffer] = {}
 device_config: Dict[str, dict] = {}
-device_save_queues: Dict[str, asyncio.Queue] = {}
 device_broadcasters: Dict[str, asyncio.Task] = {}  # Track broadcaster tasks
 device_savers: Dict[str, asyncio.Task] = {}  # Track saver tasks
 global_message_queue: asyncio.Queue = asyncio.Queue()  # Global message queue
 
-# Cache mapping device_id -> user_id (str) to avoid repeated DB lookups per broadcast cycle
-device_user_map: Dict[str, str] = {}
+# Set by the ingest worker process: live batches go to the ingest link instead of local WebSockets
+live_publisher = None
+
+# Chunked curve writer when STORAGE_LAYOUT=chunks; None keeps one device_data row per sample
+curve_chunk_writer = CurveChunkWriter(settings.CURVE_CHUNK_ROWS) if settings.STORAGE_LAYOUT == "chunks" else None
 
 # Global counter for total messages sent to frontend
 total_messages_sent_to_frontend = 0
@@ -29,8 +37,6 @@ total_messages_sent_to_frontend = 0
 # WebSocket broadcasting configuration
 WEBSOCKET_BATCH_SIZE = 500  # Smaller batch size for frontend broadcast
 WEBSOCKET_BATCH_TIMEOUT = 0.02  # 20ms timeout for frontend batches
-COMPRESSION_THRESHOLD = 1000  # Compress if batch size > 1000
-COMPRESSION_LEVEL = 6  # zlib compression level (1-9, 6 is balanced)
 
 # Monitoring counters for broadcasting and database operations
 class ProcessingCounters:
@@ -62,7 +68,13 @@ processing_counters = ProcessingCounters()
 # Function to get processing stats
 def get_processing_stats():
     """Get current processing statistics."""
-    return processing_counters.get_stats()
+    stats = processing_counters.get_stats()
+    stats.update(get_fanout_stats())
+    stats.update(device_registry.get_stats())
+    if curve_chunk_writer is not None:
+        stats.update(curve_chunk_writer.get_stats())
+    stats["device_rings"] = {device_id: ring.get_stats() for device_id, ring in device_rings.items()}
+    return stats
 
 def print_processing_stats():
     """Print current processing statistics."""
@@ -78,41 +90,58 @@ def print_processing_stats():
 async def process_message_batches(msg):
     """Handles incoming MQTT messages, processes them directly."""
     try:
-        # Decode the MQTT message payload and parse it into a dictionary
-        message_content = json.loads(msg.payload.decode())  # Parse directly
-        
-        # Process message directly instead of queuing
-        device_id = message_content.get("device_id")
-        
-        if device_id not in device_config:
-            device_config[device_id] = {"save_flag": False}
-        
-        # Ensure broadcaster is started for this device
-        await start_device_broadcaster(device_id)
-        
-        # Put message in device queue for broadcasting
-        try:
-            device_queues[device_id].put_nowait(message_content)
-        except asyncio.QueueFull:
-            print(f"Warning: Device queue full for {device_id}")
-        
-        # Save message if save flag is enabled; attach current folder/curve context.
-        if shared_state.save_flag:
-            await start_device_saver(device_id)
-            try:
-                device_save_queues[device_id].put_nowait(message_content)
-            except asyncio.QueueFull:
-                print(f"Warning: Save queue full for {device_id}")
-
-    except json.JSONDecodeError as e:
+        decoder = TelemetryDecoder()
+        decoder.add_message(orjson.loads(msg.payload))
+        for device_id, device_batch in decoder.build().split_by_device().items():
+            await enqueue_device_batch(device_id, device_batch)
+    except orjson.JSONDecodeError as e:
         print(f"Error decoding MQTT message: {e}")
     except Exception as e:
         print(f"Error processing MQTT message: {e}")
 
+def get_device_ring(device_id: str) -> DeviceRingBuffer:
+    """Return the ring buffer for a device, allocating it on first use."""
+    ring = device_rings.get(device_id)
+    if ring is None:
+        ring = DeviceRingBuffer(
+            device_id,
+            capacity=settings.DEVICE_RING_CAPACITY,
+            block_timeout=settings.SAVE_OVERFLOW_BLOCK_SECONDS,
+            max_spill_rows=settings.SAVE_SPILL_MAX_ROWS,
+        )
+        device_rings[device_id] = ring
+    return ring
+
+async def enqueue_device_batch(device_id: str, batch: TelemetryBatch):
+    """Write a single-device columnar batch into the device ring for broadcast and, if saving, persistence."""
+    if device_id not in device_config:
+        device_config[device_id] = {"save_flag": False}
+
+    # Ensure broadcaster is started for this device
+    await start_device_broadcaster(device_id)
+
+    # Save messages if save flag is enabled; folder/curve context is stamped at flush time.
+    persist = shared_state.save_flag
+    if persist:
+        await start_device_saver(device_id)
+
+    ring = device_rings[device_id]
+    spilled_before = ring.spilled_total
+    spill_dropped_before = ring.spill_dropped
+    await ring.write(batch, persist=persist)
+    if ring.spilled_total > spilled_before:
+        # Not lost: the saver drains spilled rows first, but it is falling behind.
+        print(f"Warning: Save ring overflow for {device_id}, spilled {ring.spilled_total - spilled_before} rows")
+    if ring.spill_dropped > spill_dropped_before:
+        # Lost: the spill is full, its oldest unsaved rows were discarded.
+        dropped = ring.spill_dropped - spill_dropped_before
+        print(f"Warning: Save spill full for {device_id}, dropped {dropped} unsaved rows")
+        from app.metrics import record_message_loss
+        record_message_loss("save_spill_full", dropped)
+
 async def start_device_broadcaster(device_id: str):
     """Starts a broadcaster task for a specific device_id, if not already started."""
-    if device_id not in device_queues:
-        device_queues[device_id] = asyncio.Queue()
+    get_device_ring(device_id)
 
     if device_id not in device_broadcasters:
         # Create the broadcaster task
@@ -139,62 +168,32 @@ async def global_message_processor():
                 await asyncio.sleep(0.0001)  # Very short sleep if no messages
                 continue
             
-            # Process all messages in the batch efficiently
-            device_batches = {}
-            
+            # Decode all queued messages into one columnar batch, then route per device
+            decoder = TelemetryDecoder()
             for message_content in messages:
-                device_id = message_content.get("device_id")
-                
-                if device_id not in device_config:
-                    device_config[device_id] = {"save_flag": False}
-                
-                # Group messages by device for efficient processing
-                if device_id not in device_batches:
-                    device_batches[device_id] = []
-                device_batches[device_id].append(message_content)
-            
-            # Process each device's messages
-            for device_id, device_messages in device_batches.items():
-                # Ensure broadcaster is started for this device
-                await start_device_broadcaster(device_id)
-                
-                # Put all messages for this device in queue
-                for message_content in device_messages:
-                    try:
-                        device_queues[device_id].put_nowait(message_content)
-                    except asyncio.QueueFull:
-                        print(f"Warning: Device queue full for {device_id}")
-                        break
-                
-                # Save messages if save flag is enabled
-                if shared_state.save_flag:
-                    await start_device_saver(device_id)
-                    for message_content in device_messages:
-                        try:
-                            device_save_queues[device_id].put_nowait(message_content)
-                        except asyncio.QueueFull:
-                            print(f"Warning: Save queue full for {device_id}")
-                            break
-                        
+                decoder.add_message(message_content)
+
+            for device_id, device_batch in decoder.build().split_by_device().items():
+                await enqueue_device_batch(device_id, device_batch)
+
         except Exception as e:
             print(f"Error in global message processor: {e}")
             await asyncio.sleep(0.01)
 
 async def start_device_saver(device_id: str):
     """Start a saver task if not started."""
-    if device_id not in device_save_queues:
-        device_save_queues[device_id] = asyncio.Queue()
+    get_device_ring(device_id)
     if device_id not in device_savers:
         device_savers[device_id] = asyncio.create_task(batch_processor(device_id))
 
 
-async def save_device_data_batch_to_db(device_id: str, batch: list):
+async def save_device_data_batch_to_db(device_id: str, batch: TelemetryBatch):
     """Compatibility wrapper for batch DB writes."""
     await process_batch(device_id, batch)
 
 async def batch_processor(device_id: str, batch_size: int = 500, interval: float = 1.0):
     """
-    Continuously consumes messages for a specific device from its dedicated queue,
+    Continuously consumes rows marked for persistence from the device ring,
     batches them, and processes the batches.
     
     :param device_id: ID of the device to process.
@@ -202,73 +201,66 @@ async def batch_processor(device_id: str, batch_size: int = 500, interval: float
     :param interval: Time interval in seconds to wait before processing whatever
                      messages have accumulated even if not at full batch_size.
     """
-    queue = device_save_queues[device_id]
-    pending_messages = []
-    last_flush = asyncio.get_event_loop().time()
+    ring = device_rings[device_id]
 
     while True:
+        pending_rows = 0
         try:
-            # Wait for a message, or a timeout
-            # timeout ensures that we periodically flush even if we don't get a full batch
-            message = await asyncio.wait_for(queue.get(), timeout=interval)
-            pending_messages.append(message)
-
-            # Process batch if we have enough messages or enough time has passed
-            current_time = asyncio.get_event_loop().time()
-            if len(pending_messages) >= batch_size or (current_time - last_flush) >= interval:
-                if pending_messages:
-                    # MONITORING: Count database saves
-                    processing_counters.db_saved += len(pending_messages)
-                    
-                    await save_device_data_batch_to_db(device_id, pending_messages)
-                    pending_messages = []
-                    last_flush = current_time
-
-        except asyncio.TimeoutError:
-            # Timeout occurred, flush any pending messages
-            if pending_messages:
-                # MONITORING: Count database saves
-                processing_counters.db_saved += len(pending_messages)
-                
-                await save_device_data_batch_to_db(device_id, pending_messages)
-                pending_messages = []
-                last_flush = asyncio.get_event_loop().time()
+            # Parked until data arrives; then flush at batch_size rows or after interval.
+            pending = await ring.collect(ring.saver, batch_size, interval)
+            pending_rows = len(pending)
+            if not pending_rows:
+                continue
+
+            # MONITORING: Count database saves
+            processing_counters.db_saved += pending_rows
+
+            await save_device_data_batch_to_db(device_id, pending)
         except Exception as e:
             # MONITORING: Count database errors
-            processing_counters.db_errors += len(pending_messages)
+            processing_counters.db_errors += pending_rows
             print(f"Error in batch processor for device {device_id}: {e}")
             await asyncio.sleep(0.1)  # Brief pause on error
 
 
-async def process_batch(device_id: str, batch: list):
+def build_device_data_rows(device_id: str, batch: TelemetryBatch, folder_id, curve_index) -> list:
+    """Convert a columnar batch into device_data row tuples (DEVICE_DATA_COLUMNS order).
+
+    Timestamps convert in one vectorized call; rows are zipped from the
+    column lists, with no per-row datetime or field lookups.
     """
-    Processes a batch of messages and saves them to the database.
+    count = len(batch)
+    columns = (
+        repeat(device_id, count),
+        epoch_to_datetime(batch.timestamp),
+        batch.displacement.tolist(),
+        batch.force.tolist(),
+        # Stamp every row with the folder and curve it belongs to.
+        repeat(folder_id, count),
+        repeat(curve_index, count),
+        # phase 0 = indent/segment0, phase 1 = retract/segment1.
+        batch.phase.tolist(),
+        batch.motor_working.tolist(),
+    )
+    return list(zip(*columns))
+
+
+def build_device_data_records(device_id: str, batch: TelemetryBatch, folder_id, curve_index) -> list:
+    """Convert a columnar batch into insert-ready device_data row dicts."""
+    return [
+        dict(zip(DEVICE_DATA_COLUMNS, row))
+        for row in build_device_data_rows(device_id, batch, folder_id, curve_index)
+    ]
+
+
+async def process_batch(device_id: str, batch: TelemetryBatch):
+    """
+    Processes a columnar batch of telemetry and saves it to the database.
     """
     try:
         async with get_db() as db:
-            # First, ensure the device exists in the iot_devices table
-            from app.models import IoTDevice
-            from sqlalchemy.future import select
-            
-            # Check if device exists
-            result = await db.execute(
-                select(IoTDevice).where(IoTDevice.id == device_id)
-            )
-            device = result.scalars().first()
-            
-            if not device:
-                print(f"Device {device_id} not found, creating it...")
-                # Create the device
-                new_device = IoTDevice(
-                    id=device_id,
-                    device_name=f"Device {device_id}",
-                    device_type="sensor",
-                    device_token=batch[0].get("device_token", "default_token"),
-                    user_id=1  # Default user_id
-                )
-                db.add(new_device)
-                await db.commit()
-                print(f"Device {device_id} created successfully")
+            # Ensure the device exists in iot_devices (cached; no query in steady state)
+            await device_registry.ensure_device(db, device_id, batch.device_tokens.get(device_id, "default_token"))
             
             # Snapshot folder context at batch-flush time so all rows in this
             # batch share a consistent folder_id and curve_index even if the
@@ -276,27 +268,20 @@ async def process_batch(device_id: str, batch: list):
             batch_folder_id = shared_state.current_folder_id
             batch_curve_index = shared_state.current_curve_index
 
-            # Convert messages to records for bulk insert
-            records = []
-            for msg in batch:
-                ts_str = msg["timestamp"].replace("Z", "+00:00")
-                timestamp = datetime.fromisoformat(ts_str)
-
-                records.append({
-                    "device_id": msg["device_id"],
-                    "timestamp": timestamp,
-                    "displacement": msg["displacement"],
-                    "force": msg["force"],
-                    # Stamp every row with the folder and curve it belongs to.
-                    "folder_id": batch_folder_id,
-                    "curve_index": batch_curve_index,
-                    # phase 0 = indent/segment0, phase 1 = retract/segment1.
-                    "phase": msg.get("phase", 0),
-                    "motor_working": msg.get("motor_working", 0),
-                })
-
-            # Bulk insert
-            await save_device_data_batch(db, records)
+            # Folder-listing aggregates, upserted in the same transaction as the samples
+            stats_delta = curve_stats_delta(batch_folder_id, batch_curve_index, batch)
+
+            if curve_chunk_writer is not None:
+                # One compressed curve_chunks row per phase run instead of a row per sample
+                await curve_chunk_writer.write(db, device_id, batch, batch_folder_id, batch_curve_index)
+                await upsert_curve_stats(db, stats_delta)
+                await db.commit()
+            else:
+                # Convert columns to row tuples for the bulk writer
+                rows = build_device_data_rows(device_id, batch, batch_folder_id, batch_curve_index)
+
+                # Bulk insert (COPY on Postgres, chunked executemany on SQLite)
+                await save_device_data_rows(db, rows, curve_stats=stats_delta)
 
         debug_log(f"Batch of {len(batch)} messages for device {device_id} saved successfully.")
     except Exception as e:
@@ -330,36 +315,22 @@ async def process_batch(device_id: str, batch: list):
 
 async def _resolve_user_id_for_device(device_id: str) -> str:
     """
-    Look up the user_id that owns this device from the database.
-    Result is cached in device_user_map to avoid repeated queries.
+    Look up the user_id that owns this device through the device registry
+    (TTL cache with negative entries, invalidated by the /devices routes).
     Falls back to "1" if the device is not found.
     """
-    # Re-use cache only when the target user still has an active WebSocket connection
-    cached_user_id = device_user_map.get(device_id)
-    if cached_user_id and websocket_connections.get(cached_user_id):
-        return cached_user_id
-
     # Prevent crash if DB is temporarily unavailable during lookup
     try:
-        from sqlalchemy.future import select
-        async with get_db() as db:
-            result = await db.execute(
-                select(IoTDevice).where(IoTDevice.id == device_id)
-            )
-            device = result.scalars().first()
-            if device and device.user_id:
-                # Cache as string because websocket_connections keys are strings
-                user_id_str = str(device.user_id)
-                device_user_map[device_id] = user_id_str
-                debug_log(f"[RESOLVE] Device {device_id} belongs to user {user_id_str}")
-                return user_id_str
+        exists, user_id = await device_registry.lookup(device_id)
+        if exists and user_id:
+            # String because websocket_connections keys are strings
+            return str(user_id)
     except Exception as e:
         print(f"[RESOLVE] DB lookup failed for device {device_id}: {e}")
 
     # Default fallback — device unknown or DB unreachable
-    debug_log(f"[RESOLVE] Device {device_id} not found in DB, defaulting to user '1'")
-    device_user_map[device_id] = "1"
-    return "1"
+    debug_log(f"[RESOLVE] Device {device_id} not found in DB, defaulting to user '{DEFAULT_DEVICE_USER_ID}'")
+    return str(DEFAULT_DEVICE_USER_ID)
 
 
 async def broadcast_messages(device_id: str):
@@ -367,49 +338,52 @@ async def broadcast_messages(device_id: str):
     global total_messages_sent_to_frontend
     BATCH_SIZE = 2000  # Backend processing batch size
     BATCH_TIMEOUT = 0.05  # Backend processing timeout
-    queue = device_queues[device_id]
+    ring = device_rings[device_id]
 
     while True:
-        batch = []
-        start_time = time.time()  # Track the time when batch collection started
-        # Collect messages for the batch
-        while len(batch) < BATCH_SIZE and (time.time() - start_time) < BATCH_TIMEOUT:
-            try:    
-                message = await asyncio.wait_for(queue.get(), timeout=0.005)  # Reduced timeout
-                batch.append(message)
-            except asyncio.TimeoutError:
-                await asyncio.sleep(0.0005)  # Reduced sleep time
+        # Parked while the device is idle; drains up to BATCH_SIZE rows or BATCH_TIMEOUT.
+        # A lagging reader skips to the newest ring window (drop-oldest).
+        dropped_before = ring.live.dropped
+        rows = await ring.collect(ring.live, BATCH_SIZE, BATCH_TIMEOUT)
+        if ring.live.dropped > dropped_before:
+            from app.metrics import record_message_loss
+            record_message_loss("device_ring_overwrite", ring.live.dropped - dropped_before)
 
         # Send the batch if it's non-empty
-        if batch:
+        if len(rows):
             # MONITORING: Count device processed messages
-            processing_counters.device_processed += len(batch)
+            processing_counters.device_processed += len(rows)
 
-            # Re-resolve owner on each batch so routing picks up DB changes and new WebSocket sessions
-            target_frontend = await _resolve_user_id_for_device(device_id)
-            
-            debug_log(f"[SEND] Sending batch of {len(batch)} messages from {device_id} to frontend-{target_frontend}")
-            total_messages_sent_to_frontend += len(batch)  # Update the accumulator
+            if live_publisher is not None:
+                # Ingest worker: every API process receives the batch over the link.
+                live_publisher(device_id, rows)
+                processing_counters.broadcast_sent += len(rows)
+                continue
+
+            total_messages_sent_to_frontend += len(rows)  # Update the accumulator
             debug_log(f"[STATS] Total messages sent to frontend: {total_messages_sent_to_frontend}")
-            
-            # Send only to the target frontend
-            websockets = websocket_connections.get(target_frontend, set())
-            debug_log(f"[CHECK] Checking websockets for frontend-{target_frontend}: {len(websockets)} connections")
-            if websockets:
-                try:
-                    await send_to_connected_clients_optimized(target_frontend, batch)
-                    # MONITORING: Count successful broadcasts
-                    processing_counters.broadcast_sent += len(batch)
-                    debug_log(f"[OK] Successfully sent {len(batch)} messages to frontend-{target_frontend}")
-                except Exception as e:
-                    # MONITORING: Count broadcast errors
-                    processing_counters.broadcast_errors += len(batch)
-                    print(f"[ERROR] Error sending to frontend-{target_frontend}: {e}")
-            else:
-                print(f"[WARNING] No WebSocket connections found for frontend-{target_frontend}")
-        else:
-            # No messages collected in this cycle, sleep briefly to reduce CPU usage
-            await asyncio.sleep(0.005)  # Reduced sleep time
+            await deliver_live_batch(device_id, rows, warn_unrouted=True)
+
+
+async def deliver_live_batch(device_id: str, rows: TelemetryBatch, warn_unrouted: bool = False):
+    """Route a device batch to its owner's fan-out in this process (also fed by the ingest link)."""
+    if not warn_unrouted and not any(websocket_connections.values()):
+        # Link-fed API process with no sockets at all: skip the owner lookup.
+        return
+    # Re-resolve owner on each batch so routing picks up DB changes and new WebSocket sessions
+    target_frontend = await _resolve_user_id_for_device(device_id)
+    debug_log(f"[SEND] Queueing batch of {len(rows)} messages from {device_id} for frontend-{target_frontend}")
+
+    # Hand off to the user's fan-out, which merges devices and encodes once for all sockets
+    if websocket_connections.get(target_frontend):
+        get_user_fanout(target_frontend).submit(rows)
+        # MONITORING: Count broadcasts handed to the fan-out
+        processing_counters.broadcast_sent += len(rows)
+    elif warn_unrouted:
+        print(f"[WARNING] No WebSocket connections found for frontend-{target_frontend}")
+    else:
+        # Other uvicorn workers may hold this user's sockets.
+        debug_log(f"[SEND] No local WebSocket connections for frontend-{target_frontend}")
 
 
 async def send_to_connected_clients_optimized(client_id: str, messages: list):
@@ -420,19 +394,11 @@ async def send_to_connected_clients_optimized(client_id: str, messages: list):
         return
 
     try:
-        # OPTIMIZED: Use orjson for faster serialization and binary output
-        message_data = orjson.dumps(messages)
-        
-        # OPTIMIZED: Compress large payloads to reduce network overhead
-        if len(message_data) > COMPRESSION_THRESHOLD:
-            compressed_data = zlib.compress(message_data, level=COMPRESSION_LEVEL)
-            debug_log(f"📦 Compressed payload: {len(message_data)} -> {len(compressed_data)} bytes ({len(compressed_data)/len(message_data)*100:.1f}% compression)")
-            
-            # Send compressed data as binary
-            tasks = [ws.send_bytes(compressed_data) for ws in websockets]
-        else:
-            # Send uncompressed data as binary (faster than text)
-            tasks = [ws.send_bytes(message_data) for ws in websockets]
+        # OPTIMIZED: Encode (orjson + zlib for large payloads) once and share the bytes
+        payload, raw_len = encode_payload(messages)
+        if len(payload) != raw_len:
+            debug_log(f"📦 Compressed payload: {raw_len} -> {len(payload)} bytes ({len(payload)/raw_len*100:.1f}% compression)")
+        tasks = [ws.send_bytes(payload) for ws in websockets]
         
         # OPTIMIZED: Use gather for concurrent sending
         await asyncio.gather(*tasks, return_exceptions=True)
@@ -27,9 +27,22 @@ if PROMETHEUS_AVAILABLE:
     MQTT_CONNECTION_STATUS = Gauge("mqtt_connection_status", "MQTT connection status (1=connected, 0=disconnected)")
     
     # Queue Metrics
-    INGRESS_QUEUE_LEN = Gauge("ingress_queue_length", "Raw ingress queue size")
-    DEVICE_QUEUE_LEN = Gauge("device_queue_length", "Per-device queue size", ["device_id"])
-    SAVE_QUEUE_LEN = Gauge("save_queue_length", "Per-device save queue size", ["device_id"])
+    INGRESS_QUEUE_LEN = Gauge("ingress_queue_length", "Raw ingress queue size (memory + spilled)")
+    INGRESS_SPILL_BYTES = Gauge("ingress_spill_bytes", "Raw payload bytes currently spilled to disk")
+    INGRESS_SPILLED_BYTES = Gauge("ingress_spilled_bytes_cumulative", "Raw payload bytes spilled to disk since start")
+    INGRESS_REPLAY_LAG_SEC = Gauge("ingress_replay_lag_seconds", "Age of the spilled payload most recently replayed")
+    INGRESS_SHARD_QUEUE_LEN = Gauge("ingress_shard_queue_length", "Raw ingress queue size per subscriber shard", ["shard"])
+    INGRESS_DROPPED = Gauge("ingress_dropped_cumulative", "Payloads dropped because memory and spill were full")
+    DEVICE_QUEUE_LEN = Gauge("device_queue_length", "Per-device unread broadcast rows in the ring", ["device_id"])
+    SAVE_QUEUE_LEN = Gauge("save_queue_length", "Per-device rows waiting for the DB saver (ring + spill)", ["device_id"])
+
+    # Ring Buffer Metrics
+    RING_OCCUPANCY = Gauge("device_ring_occupancy_ratio", "Fraction of the device ring not yet consumed by a reader", ["device_id", "reader"])
+    RING_CAPACITY = Gauge("device_ring_capacity_rows", "Device ring capacity in rows", ["device_id"])
+    RING_LIVE_DROPPED = Gauge("device_ring_live_dropped_rows", "Rows skipped by the broadcaster (drop-oldest) since start", ["device_id"])
+    RING_SPILL_ROWS = Gauge("device_ring_spill_rows", "Unsaved rows spilled out of the ring awaiting the saver", ["device_id"])
+    RING_SPILLED_TOTAL = Gauge("device_ring_spilled_rows", "Rows spilled out of the ring since start", ["device_id"])
+    RING_SPILL_DROPPED = Gauge("device_ring_spill_dropped_rows", "Unsaved rows dropped because the spill was full", ["device_id"])
     
     # Processing Metrics
     BATCH_SIZE_PROC = Histogram("processor_batch_size", "Processor batch size", buckets=[10, 50, 100, 200, 500, 1000, 2000])
@@ -49,6 +62,12 @@ if PROMETHEUS_AVAILABLE:
     WS_SEND_ERRORS = Counter("ws_send_errors_total", "WS send errors")
     WS_SEND_SUCCESS = Counter("ws_send_success_total", "WS send success", ["client_id"])
     WS_COMPRESSION_RATIO = Histogram("ws_compression_ratio", "WebSocket compression ratio", buckets=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+    WS_FANOUT_FRAMES = Counter("ws_fanout_frames_total", "Merged per-user frames encoded once")
+    WS_FANOUT_BLOCKS_MERGED = Counter("ws_fanout_device_blocks_total", "Device batches merged into per-user frames")
+    WS_FANOUT_ENCODE_SEC = Histogram("ws_fanout_encode_seconds", "Serialize+compress time per shared frame", buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1])
+    WS_FANOUT_ENCODE_SAVED_SEC = Counter("ws_fanout_encode_seconds_saved_total", "Encode time avoided by sharing frame bytes across sockets")
+    WS_FANOUT_RAW_BYTES = Counter("ws_fanout_raw_bytes_total", "Uncompressed JSON bytes delivered to sockets")
+    WS_FANOUT_WIRE_BYTES = Counter("ws_fanout_wire_bytes_total", "Bytes written to sockets after compression")
     
     # End-to-End Metrics
     E2E_LATENCY_SEC = Histogram("end_to_end_latency_seconds", "End-to-end latency", buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5])
@@ -85,19 +104,32 @@ def update_queue_metrics():
         return
         
     try:
-        from app.message_processor import device_queues, device_save_queues
-        from app.mqtt_client import message_queue
-        
-        # Update ingress queue length
-        INGRESS_QUEUE_LEN.set(message_queue.qsize())
+        from app.message_processor import device_rings
+        from app.mqtt_client import message_queue, subscriber_shards
         
-        # Update device queue lengths
-        for device_id, queue in device_queues.items():
-            DEVICE_QUEUE_LEN.labels(device_id=device_id).set(queue.qsize())
+        # Update ingress queue length and disk spill state (only the ingesting process has one)
+        if message_queue is not None:
+            INGRESS_QUEUE_LEN.set(message_queue.qsize())
+            ingress = message_queue.get_stats()
+            INGRESS_SPILL_BYTES.set(ingress["ingress_spill_bytes"])
+            INGRESS_SPILLED_BYTES.set(ingress["ingress_spilled_bytes_total"])
+            INGRESS_REPLAY_LAG_SEC.set(ingress["ingress_replay_lag_seconds"])
+            INGRESS_DROPPED.set(ingress["ingress_dropped"])
+        for shard in subscriber_shards:
+            INGRESS_SHARD_QUEUE_LEN.labels(shard=str(shard.index)).set(shard.ingress.qsize())
         
-        # Update save queue lengths
-        for device_id, queue in device_save_queues.items():
-            SAVE_QUEUE_LEN.labels(device_id=device_id).set(queue.qsize())
+        # Update per-device ring occupancy for the broadcast and save readers
+        for device_id, ring in device_rings.items():
+            stats = ring.get_stats()
+            DEVICE_QUEUE_LEN.labels(device_id=device_id).set(stats["live_lag"])
+            SAVE_QUEUE_LEN.labels(device_id=device_id).set(stats["save_pending"])
+            RING_CAPACITY.labels(device_id=device_id).set(stats["capacity"])
+            RING_OCCUPANCY.labels(device_id=device_id, reader="broadcast").set(stats["live_occupancy"])
+            RING_OCCUPANCY.labels(device_id=device_id, reader="saver").set(stats["save_occupancy"])
+            RING_LIVE_DROPPED.labels(device_id=device_id).set(stats["live_dropped"])
+            RING_SPILL_ROWS.labels(device_id=device_id).set(stats["save_spill_rows"])
+            RING_SPILLED_TOTAL.labels(device_id=device_id).set(stats["save_spilled_total"])
+            RING_SPILL_DROPPED.labels(device_id=device_id).set(stats["save_spill_dropped"])
     except Exception as e:
         print(f"Error updating queue metrics: {e}")
 
@@ -159,6 +191,21 @@ def record_websocket_send(batch_size, client_id, success=True, compression_ratio
     except Exception as e:
         print(f"Error recording WebSocket send metrics: {e}")
 
+def record_fanout_frame(blocks, sockets, encode_time, raw_bytes, wire_bytes):
+    """Record one shared fan-out frame sent to `sockets` WebSocket connections."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+        
+    try:
+        WS_FANOUT_FRAMES.inc()
+        WS_FANOUT_BLOCKS_MERGED.inc(blocks)
+        WS_FANOUT_ENCODE_SEC.observe(encode_time)
+        WS_FANOUT_ENCODE_SAVED_SEC.inc(encode_time * max(sockets - 1, 0))
+        WS_FANOUT_RAW_BYTES.inc(raw_bytes * sockets)
+        WS_FANOUT_WIRE_BYTES.inc(wire_bytes * sockets)
+    except Exception as e:
+        print(f"Error recording fan-out metrics: {e}")
+
 def record_message_loss(stage, count=1):
     """Record message loss at a specific stage."""
     if not PROMETHEUS_AVAILABLE:
@@ -238,14 +285,14 @@ def update_system_health():
         return
         
     try:
-        from app.message_processor import device_queues, total_messages_sent_to_frontend
+        from app.message_processor import device_rings, total_messages_sent_to_frontend
         from app.mqtt_client import message_counters
         
         # Update uptime
         SYSTEM_UPTIME.set(time.time() - message_counters.start_time)
         
         # Update active devices
-        ACTIVE_DEVICES.set(len(device_queues))
+        ACTIVE_DEVICES.set(len(device_rings))
         
         # Update total messages sent
         TOTAL_MESSAGES_SENT._value._value = total_messages_sent_to_frontend
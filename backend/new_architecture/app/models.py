@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, JSON, Boolean, DateTime, Float, ForeignKey, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from app.utils import generate_token  # Utility function to generate token
@@ -37,6 +37,10 @@ class Folder(Base):
     user = relationship("User", back_populates="folders")
     # All device_data rows that belong to this folder; deleted when folder is removed.
     device_data = relationship("DeviceData", back_populates="folder", cascade="all, delete-orphan")
+    # Compressed sample chunks (STORAGE_LAYOUT=chunks); deleted with the folder.
+    curve_chunks = relationship("CurveChunk", back_populates="folder", cascade="all, delete-orphan")
+    # Per-curve aggregates maintained on insert (folder listing); deleted with the folder.
+    curve_stats = relationship("CurveStat", back_populates="folder", cascade="all, delete-orphan")
 
 
 class DeviceData(Base):
@@ -48,7 +52,7 @@ class DeviceData(Base):
     displacement = Column(Float, nullable=False)  # Displacement in micrometers (µm)
     force = Column(Float, nullable=False)  # Force in micronewtons (µN)
     # Foreign key to the folder this row belongs to; nullable for un-grouped rows.
-    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=True, index=True)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=True)
     # Zero-based index of the save-cycle (ON→OFF) within the folder this row was recorded during.
     curve_index = Column(Integer, default=0, nullable=False)
     # Indentation phase: 0 = approaching/indenting (segment0), 1 = retracting (segment1).
@@ -61,6 +65,70 @@ class DeviceData(Base):
     # ORM back-reference to the parent Folder row.
     folder = relationship("Folder", back_populates="device_data")
 
+    # Folder export order and per-folder / per-curve counts; leading folder_id also serves folder lookups.
+    __table_args__ = (
+        Index(
+            "ix_device_data_folder_curve_phase_ts",
+            "folder_id", "curve_index", "phase", "timestamp",
+            postgresql_include=["displacement", "force"],
+        ),
+    )
+
+
+class CurveChunk(Base):
+    """A run of samples of one curve phase, stored as compressed columns (see app/curve_chunks.py)."""
+    __tablename__ = "curve_chunks"
+
+    id = Column(Integer, primary_key=True)
+    device_id = Column(String, ForeignKey("iot_devices.id"), nullable=False)
+    # Folder and save-cycle the samples belong to; folder is nullable like device_data.folder_id.
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=True)
+    curve_index = Column(Integer, default=0, nullable=False)
+    # 0 = indent/segment0, 1 = retract/segment1.
+    phase = Column(Integer, default=0, nullable=False)
+    # Order of this chunk within (device, folder, curve, phase).
+    chunk_seq = Column(Integer, nullable=False)
+    # Time of the first sample; the other samples are offsets from it.
+    start_time = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    # zlib-compressed little-endian arrays: int64 µs offset deltas, float64 µm, float64 µN, uint8 flags.
+    time_offsets = Column(LargeBinary, nullable=False)
+    displacement = Column(LargeBinary, nullable=False)
+    force = Column(LargeBinary, nullable=False)
+    motor_working = Column(LargeBinary, nullable=False)
+
+    device = relationship("IoTDevice", back_populates="curve_chunks")
+    folder = relationship("Folder", back_populates="curve_chunks")
+
+    __table_args__ = (
+        Index("ix_curve_chunks_folder_curve", "folder_id", "curve_index", "phase", "chunk_seq"),
+    )
+
+
+class CurveStat(Base):
+    """Running aggregates of one curve of a folder, upserted with every saved batch (see app/curve_stats.py)."""
+    __tablename__ = "curve_stats"
+
+    id = Column(Integer, primary_key=True)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False)
+    curve_index = Column(Integer, nullable=False)
+    # Samples in the curve, in total and per phase (0 = indent, 1 = retract).
+    row_count = Column(Integer, nullable=False, default=0)
+    phase0_count = Column(Integer, nullable=False, default=0)
+    phase1_count = Column(Integer, nullable=False, default=0)
+    min_timestamp = Column(DateTime, nullable=True)
+    max_timestamp = Column(DateTime, nullable=True)
+    min_force = Column(Float, nullable=True)
+    max_force = Column(Float, nullable=True)
+    min_displacement = Column(Float, nullable=True)
+    max_displacement = Column(Float, nullable=True)
+
+    folder = relationship("Folder", back_populates="curve_stats")
+
+    __table_args__ = (
+        UniqueConstraint("folder_id", "curve_index", name="uq_curve_stats_folder_curve"),
+    )
+
 
 class ClientSession(Base):
     __tablename__ = "client_sessions"
@@ -100,5 +168,6 @@ class IoTDevice(Base):
     user = relationship("User", back_populates="devices")
     
     data = relationship("DeviceData", back_populates="device", cascade="all, delete-orphan")  # Updated relationship
+    curve_chunks = relationship("CurveChunk", back_populates="device", cascade="all, delete-orphan")
 
 
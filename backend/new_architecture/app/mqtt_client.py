@@ -5,9 +5,16 @@ import app.shared_state
 import os
 import time
 import queue
+import zlib
 import orjson
+from typing import List, Optional
 from app.debug_log import debug_log
 from app.metrics import record_mqtt_message, record_message_type, record_e2e_latency, update_system_health
+from app.telemetry import TelemetryBatch, TelemetryDecoder, schema_resolver
+from app.telemetry_frame import is_telemetry_frame, decode_frame, decode_frame_header, FrameSequenceTracker
+from app.ingress_buffer import SpillingIngressQueue
+from app.decode_pool import DecodePool
+from app.config import settings
 
 mqtt_client = None
 
@@ -17,131 +24,78 @@ total_messages_received = 0
 last_message_count = 0
 last_rate_check = time.time()
 
-# Thread-safe queue for messages from MQTT thread to async event loop
-message_queue = queue.Queue(maxsize=0)  # Unbounded, thread-safe queue
+# Thread-safe queue for messages from MQTT thread to async event loop (shard 0's ingress).
+# Bounded in memory at INGRESS_HIGH_WATER payloads; overflow spills to disk and is replayed in order.
+# Created by start_mqtt_client, so only the ingesting process claims a spill directory.
+message_queue: Optional[SpillingIngressQueue] = None
 
-DEFAULT_FRONTEND_DEVICE_ID = os.getenv("DEFAULT_FRONTEND_DEVICE_ID", "frontend1_device")
 
-def first_defined_value(source, keys):
-    for key in keys:
-        value = source.get(key)
-        if value is not None:
-            return value
-    return None
-
-def to_float_or_none(value):
-    try:
-        number = float(value)
-    except (TypeError, ValueError):
-        return None
-    return number
+def create_ingress_queue(spill_dir: str) -> SpillingIngressQueue:
+    return SpillingIngressQueue(
+        high_water=settings.INGRESS_HIGH_WATER,
+        spill_dir=spill_dir,
+        segment_bytes=settings.INGRESS_SPILL_SEGMENT_BYTES,
+        max_spill_bytes=settings.INGRESS_SPILL_MAX_BYTES,
+    )
 
-def to_int_or_none(value):
-    """Parse an integer flag (0/1) from MQTT payloads, or None when invalid."""
-    try:
-        number = int(value)
-    except (TypeError, ValueError):
-        return None
-    return number
-
-def to_phase_or_default(value):
-    """Normalize phase to 0 (indent) or 1 (retract); default to indent when missing."""
-    parsed = to_int_or_none(value)
-    if parsed in (0, 1):
-        return parsed
-    return 0
-
-def to_motor_flag_or_default(value):
-    """Normalize motor_working to 0 (idle) or 1 (moving); default to idle when missing."""
-    parsed = to_int_or_none(value)
-    if parsed in (0, 1):
-        return parsed
-    return 0
-
-# Keys that carry force already in Newtons rather than millinewtons.
-FORCE_NEWTON_KEYS = {"force_N", "Force_N", "force_n"}
-
-def first_defined_key_and_value(source, keys):
-    """Return the first matching key and value pair from a telemetry dict."""
-    for key in keys:
-        value = source.get(key)
-        if value is not None:
-            return key, value
-    return None, None
-
-def to_displacement_micrometers(value):
-    """Convert MQTT displacement from millimeters to micrometers."""
-    parsed = to_float_or_none(value)
-    if parsed is None:
-        return None
-    return parsed * 1000.0
+# Optional process pool for large JSON batches (DECODE_POOL_WORKERS=0 keeps decoding inline)
+decode_pool = DecodePool(settings.DECODE_POOL_WORKERS, settings.DECODE_POOL_MIN_POINTS)
+
+class SubscriberShard:
+    """One subscriber client: its own paho network thread, ingress buffer and decoder task."""
+
+    def __init__(
+        self,
+        index: int,
+        ingress: SpillingIngressQueue,
+        topics: List[str],
+        protocol=None,
+    ):
+        self.index = index
+        self.ingress = ingress
+        self.topics = topics
+        self.protocol = protocol if protocol is not None else mqtt.MQTTv311
+        self.client: Optional[mqtt.Client] = None
+        self.received = 0
+        self.decoded_batches = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "shard": self.index,
+            "topics": self.topics,
+            "received": self.received,
+            "decoded_batches": self.decoded_batches,
+            "queued": self.ingress.qsize(),
+        }
 
-def to_force_micronewtons(value, force_key=None):
-    """Convert MQTT force to micronewtons (mN×1000, or N×1e6 for Newton keys)."""
-    parsed = to_float_or_none(value)
-    if parsed is None:
-        return None
-    if force_key in FORCE_NEWTON_KEYS:
-        return parsed * 1_000_000.0
-    return parsed * 1000.0
 
-def normalize_data_point(data_point):
-    """Return a canonical telemetry payload, or None for non-telemetry messages."""
-    if not isinstance(data_point, dict):
-        return None
+# Subscriber clients; shard 0 owns message_queue and is the publishing client
+subscriber_shards: List[SubscriberShard] = []
 
-    state = data_point.get("state") if isinstance(data_point.get("state"), dict) else {}
-    position = data_point.get("position") if isinstance(data_point.get("position"), dict) else {}
+# Per-device sequence tracking for binary telemetry frames (detects dropped frames).
+frame_sequences = FrameSequenceTracker()
+# Off with shared subscriptions: shards see one device's frames out of order, which reads as gaps.
+track_frame_sequences = True
 
-    device_id = (
-        first_defined_value(data_point, ["device_id", "deviceId", "device", "id"])
-        or first_defined_value(state, ["device_id", "deviceId", "device", "id"])
-    )
-    displacement_keys = ["displacement", "displacement_mm", "z", "Z", "z_mm", "Z_mm"]
-    displacement_key, displacement = first_defined_key_and_value(data_point, displacement_keys)
-    if displacement is None:
-        displacement_key, displacement = first_defined_key_and_value(state, displacement_keys)
-    if displacement is None:
-        displacement_key, displacement = first_defined_key_and_value(position, ["z", "Z"])
-
-    force_keys = ["force", "Force", "force_mN", "force_N", "force_n", "Force_mN", "Force_N"]
-    force_key, force = first_defined_key_and_value(data_point, force_keys)
-    if force is None:
-        force_key, force = first_defined_key_and_value(state, force_keys)
-    # Phase: 0 = indenting (segment0), 1 = retracting (segment1).
-    phase_raw = first_defined_value(
-        data_point,
-        ["phase", "Phase", "segment", "segment_type", "segmentType"],
-    )
-    if phase_raw is None:
-        phase_raw = first_defined_value(state, ["phase", "Phase", "segment", "segment_type"])
-    phase = to_phase_or_default(phase_raw)
-    # Motor activity flag: 0 = idle, 1 = moving.
-    motor_raw = first_defined_value(
-        data_point,
-        ["motor_working", "motorWorking", "motor", "motor_active", "motorActive"],
-    )
-    if motor_raw is None:
-        motor_raw = first_defined_value(state, ["motor_working", "motorWorking", "motor"])
-    motor_working = to_motor_flag_or_default(motor_raw)
+def normalize_data_point(data_point):
+    """Return a canonical telemetry payload, or None for non-telemetry messages.
 
-    if displacement is None and force is None:
+    Field lookup goes through the shared schema cache, so alias scanning and
+    unit-factor selection happen once per device payload layout.
+    """
+    fields = schema_resolver.extract(data_point)
+    if fields is None:
         return None
-
-    # Default missing channel to zero so partial MQTT payloads still persist.
-    displacement_um = to_displacement_micrometers(displacement)
-    if displacement_um is None:
-        displacement_um = 0.0
-    force_uN = to_force_micronewtons(force, force_key)
-    if force_uN is None:
-        force_uN = 0.0
+    device_id, timestamp, displacement_um, force_uN, phase, motor_working, _ = fields
 
     normalized = dict(data_point)
-    normalized["device_id"] = str(device_id or DEFAULT_FRONTEND_DEVICE_ID)
-    normalized["timestamp"] = first_defined_value(data_point, ["timestamp", "time", "t"]) or first_defined_value(state, ["timestamp", "time", "t"]) or datetime_utc_iso()
+    normalized["device_id"] = device_id
+    normalized["timestamp"] = timestamp or datetime_utc_iso()
     normalized["displacement"] = displacement_um
     normalized["force"] = force_uN
+    # Phase: 0 = indenting (segment0), 1 = retracting (segment1).
     normalized["phase"] = phase
+    # Motor activity flag: 0 = idle, 1 = moving.
     normalized["motor_working"] = motor_working
     return normalized
 
@@ -179,7 +133,11 @@ class MessageCounters:
             "mqtt_rate": self.mqtt_received / elapsed if elapsed > 0 else 0,
             "processing_rate": self.device_processed / elapsed if elapsed > 0 else 0,
             "broadcast_rate": self.broadcast_sent / elapsed if elapsed > 0 else 0,
-            "db_rate": self.db_saved / elapsed if elapsed > 0 else 0
+            "db_rate": self.db_saved / elapsed if elapsed > 0 else 0,
+            **schema_resolver.get_stats(),
+            **(message_queue.get_stats() if message_queue is not None else {}),
+            **decode_pool.get_stats(),
+            "subscriber_shards": [shard.get_stats() for shard in subscriber_shards],
         }
     
     def print_stats(self):
@@ -207,24 +165,25 @@ def get_mqtt_client():
         raise RuntimeError("MQTT client is not initialized!")
     return mqtt_client
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
         print("Connected to MQTT Broker!")
         # Update Prometheus metric for connection status
         from app.metrics import MQTT_CONNECTION_STATUS
         MQTT_CONNECTION_STATUS.set(1)
         
-        client.subscribe("MON", qos=1)
-        client.subscribe("device_data", qos=1)  # Subscribe to base device_data topic
-        client.subscribe("device_data/#", qos=1)  # Subscribe to all device-specific topics
-        print("Subscribed to topics: MON, device_data, device_data/#")
+        topics = userdata.topics if userdata else DEFAULT_TOPICS
+        for topic in topics:
+            client.subscribe(topic, qos=1)
+        shard = f" (shard {userdata.index})" if userdata else ""
+        print(f"Subscribed to topics{shard}: {', '.join(topics)}")
     else:
         print(f"Failed to connect, return code {rc}")
         # Update Prometheus metric for connection status
         from app.metrics import MQTT_CONNECTION_STATUS
         MQTT_CONNECTION_STATUS.set(0)
 
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, rc, properties=None):
     print(f"Disconnected from MQTT Broker with code {rc}")
     # Update Prometheus metric for connection status
     from app.metrics import MQTT_CONNECTION_STATUS
@@ -240,17 +199,20 @@ def on_message(client, userdata, msg):
         record_mqtt_message(parsed_successfully=True)
         
         # OPTIMAL APPROACH: Thread-safe queue for message storage
-        # Push raw message payload directly into thread-safe queue
+        # Push raw message payload directly into this shard's thread-safe queue
+        ingress = message_queue
+        if userdata is not None:
+            userdata.received += 1
+            ingress = userdata.ingress
         try:
-            message_queue.put_nowait(msg.payload)
+            ingress.put_nowait(msg.payload)
         except queue.Full:
-            print("[WARNING] Message queue full - dropping message")
+            # Memory is at the high-water mark and the disk spill is full (or failing)
+            print("[WARNING] Ingress buffer and spill full - dropping message")
             message_counters.mqtt_errors += 1
             # PROMETHEUS: Record message loss
             from app.metrics import record_message_loss
             record_message_loss("queue_full")
-            # In practice, with maxsize=0 (unbounded), this should never happen
-            # But good to have the safety check
     except Exception as e:
         print(f"Error in on_message callback: {e}")
         message_counters.mqtt_errors += 1
@@ -259,9 +221,18 @@ def on_message(client, userdata, msg):
         from app.metrics import record_message_loss
         record_message_loss("on_message_error")
 
-async def process_raw_messages():
-    """Process raw messages from MQTT thread efficiently using thread-safe queue."""
-    print("Raw message processor started (thread-safe queue)")
+async def process_raw_messages(shard: Optional[SubscriberShard] = None):
+    """Process raw messages from MQTT thread efficiently using thread-safe queue.
+
+    Without a shard, runs one decoder task per subscriber shard (or drains
+    message_queue when no shards were started).
+    """
+    if shard is None and len(subscriber_shards) > 1:
+        await asyncio.gather(*(process_raw_messages(each) for each in subscriber_shards))
+        return
+    ingress = shard.ingress if shard is not None else message_queue
+    label = f" for shard {shard.index}" if shard is not None else ""
+    print(f"Raw message processor started{label} (thread-safe queue)")
     
     # Configuration for batch processing
     MAX_BATCH_SIZE = 2000  # Increased batch size for better throughput
@@ -276,7 +247,7 @@ async def process_raw_messages():
             # Try to collect messages up to MAX_BATCH_SIZE or timeout
             while len(batch) < MAX_BATCH_SIZE and (time.time() - start_time) < BATCH_TIMEOUT:
                 try:
-                    payload = message_queue.get_nowait()
+                    payload = ingress.get_nowait()
                     batch.append(payload)
                 except queue.Empty:
                     # No more messages available, break out of collection loop
@@ -291,6 +262,8 @@ async def process_raw_messages():
                 record_batch_processing(len(batch), time.time() - start_time)
                 
                 await process_raw_message_batch(batch)
+                if shard is not None:
+                    shard.decoded_batches += 1
             else:
                 # No messages, sleep briefly to avoid busy-waiting
                 await asyncio.sleep(0.001)
@@ -300,100 +273,97 @@ async def process_raw_messages():
             await asyncio.sleep(0.01)
     
 async def process_raw_message_batch(raw_messages: list):
-    """Process a batch of raw messages efficiently with optimized JSON parsing."""
+    """Decode a batch of raw messages into columnar per-device TelemetryBatch blocks."""
     try:
         # Import here to avoid circular imports
-        from app.message_processor import device_queues, device_config, start_device_broadcaster
-        
-        # Group messages by device
-        device_messages = {}
+        from app.message_processor import enqueue_device_batch
+
+        decoder = TelemetryDecoder()
+        # Decoded blocks in arrival order; the JSON decoder is flushed at every binary frame.
+        blocks = []
         parsed_count = 0
         error_count = 0
-        
-        # OPTIMIZED: Parse JSON in batches to reduce Python overhead
+        # Pooled JSON and inline frames are decoded apart, so arrival order is restored by timestamp.
+        reorder = False
+
+        # Large JSON batches go to the decode pool; binary frames are cheap and stay inline.
+        if decode_pool.should_offload(raw_messages):
+            arrived = raw_messages
+            json_payloads = [payload for payload in raw_messages if not is_telemetry_frame(payload)]
+            raw_messages = [payload for payload in raw_messages if is_telemetry_frame(payload)]
+            if json_payloads:
+                try:
+                    pooled_batches, message_sizes, pool_errors = await decode_pool.decode(json_payloads)
+                    blocks.extend(pooled_batches)
+                    reorder = bool(raw_messages)
+                    parsed_count += len(message_sizes)
+                    error_count += pool_errors
+                    for size in message_sizes:
+                        record_message_type(is_batched=size >= 0, batch_size=max(size, 0))
+                    for _ in range(pool_errors):
+                        record_mqtt_message(parsed_successfully=False)
+                except Exception as e:
+                    # A broken pool must not lose data: fall back to the inline path.
+                    print(f"Decode pool failed, decoding inline: {e}")
+                    raw_messages = arrived
+
+        # One pass over all payloads: points go straight into column lists.
         for raw_payload in raw_messages:
             try:
+                # Binary frames are recognised by magic bytes and decoded in place.
+                if is_telemetry_frame(raw_payload):
+                    header = decode_frame_header(raw_payload)
+                    if decoder.codes:
+                        blocks.append(decoder.build())
+                        decoder = TelemetryDecoder()
+                    blocks.append(decode_frame(raw_payload))
+                    parsed_count += 1
+                    record_message_type(is_batched=True, batch_size=header["count"])
+                    skipped = frame_sequences.observe(header["device_id"], header["sequence"]) if track_frame_sequences else 0
+                    if skipped:
+                        from app.metrics import record_message_loss
+                        record_message_loss("frame_sequence_gap", skipped)
+                    continue
+
                 # Parse JSON using orjson for fastest processing
                 message_content = orjson.loads(raw_payload)
                 parsed_count += 1
-                
-                is_batched = isinstance(message_content, list)
-                data_points = message_content if is_batched else [message_content]
 
                 # PROMETHEUS: Record message type
-                if is_batched:
-                    debug_log(f"Processing batched message with {len(data_points)} data points")
-                    record_message_type(is_batched=True, batch_size=len(data_points))
+                if isinstance(message_content, list):
+                    debug_log(f"Processing batched message with {len(message_content)} data points")
+                    record_message_type(is_batched=True, batch_size=len(message_content))
                 else:
                     record_message_type(is_batched=False)
 
-                for data_point in data_points:
-                    normalized_point = normalize_data_point(data_point)
-                    if not normalized_point:
-                        continue
+                decoder.add_message(message_content)
 
-                    device_id = normalized_point["device_id"]
-                    if device_id not in device_messages:
-                        device_messages[device_id] = []
-                    device_messages[device_id].append(normalized_point)
-                    
             except Exception as e:
                 error_count += 1
                 print(f"Error parsing message {error_count}: {e}")
                 # PROMETHEUS: Record parse error
                 record_mqtt_message(parsed_successfully=False)
                 continue
-        
+
         # MONITORING: Update parsing statistics
         message_counters.mqtt_parsed += parsed_count
         message_counters.mqtt_errors += error_count
-        
-        # Process each device's messages
-        for device_id, messages in device_messages.items():
-            # Initialize device config if needed
-            if device_id not in device_config:
-                device_config[device_id] = {"save_flag": False}
-            
-            # Ensure broadcaster is started for this device
-            await start_device_broadcaster(device_id)
-            
-            # Put messages in device queue for broadcasting
-            if device_id not in device_queues:
-                device_queues[device_id] = asyncio.Queue()
-                
-            for message in messages:
-                try:
-                    device_queues[device_id].put_nowait(message)
-                    # MONITORING: Count messages queued for device processing
-                    message_counters.device_queued += 1
-                except asyncio.QueueFull:
-                    print(f"Warning: Device queue full for {device_id}")
-                    message_counters.mqtt_errors += 1
-                    # PROMETHEUS: Record message loss
-                    from app.metrics import record_message_loss
-                    record_message_loss("device_queue_full")
-                    break
-            
-            # Save messages if save flag is enabled
-            import app.shared_state
-            if app.shared_state.save_flag:
-                from app.message_processor import device_save_queues, start_device_saver
-                await start_device_saver(device_id)
-                for message in messages:
-                    try:
-                        device_save_queues[device_id].put_nowait(message)
-                    except asyncio.QueueFull:
-                        print(f"Warning: Save queue full for {device_id}")
-                        message_counters.db_errors += 1
-                        # PROMETHEUS: Record message loss
-                        from app.metrics import record_message_loss
-                        record_message_loss("save_queue_full")
-                        break
-        
-        total_points = sum(len(messages) for messages in device_messages.values())
+
+        blocks.append(decoder.build())
+        telemetry = TelemetryBatch.concat(blocks)
+        device_batches = telemetry.split_by_device() if len(telemetry) else {}
+        if reorder:
+            device_batches = {device_id: batch.in_time_order() for device_id, batch in device_batches.items()}
+
+        # Hand each device its columnar block; the broadcaster and saver read it directly.
+        for device_id, device_batch in device_batches.items():
+            await enqueue_device_batch(device_id, device_batch)
+            # MONITORING: Count messages queued for device processing
+            message_counters.device_queued += len(device_batch)
+
         debug_log(f"JSON Parsing Stats: {parsed_count} parsed, {error_count} errors")
-        debug_log(f"Processed {len(raw_messages)} raw messages into {total_points} data points for {len(device_messages)} devices")
-        
+        debug_log(f"Processed {len(raw_messages)} raw messages into {len(telemetry)} data points for {len(device_batches)} devices")
+
     except Exception as e:
         print(f"Error processing raw message batch: {e}")
         message_counters.mqtt_errors += len(raw_messages)
@@ -419,28 +389,89 @@ async def start_monitoring():
         # PROMETHEUS: Update system health metrics
         update_system_health()
 
-def start_mqtt_client():
-    """Start the MQTT client and connect to the broker."""
-    global mqtt_client
-    
-    # Create MQTT client
-    mqtt_client = mqtt.Client()
-    mqtt_client.on_connect = on_connect
-    mqtt_client.on_disconnect = on_disconnect
-    mqtt_client.on_message = on_message
+# Topics of a single, unsharded subscriber
+DEFAULT_TOPICS = ["MON", "device_data", "device_data/#"]
+
+
+def shard_for_device(device_id: str, shards: int) -> int:
+    """Stable shard index for a device id (crc32, unlike hash(), is the same in every process)."""
+    return zlib.crc32(device_id.encode("utf-8")) % shards
+
+
+def plan_shard_topics(shards: int, strategy: str, group: str, device_ids: List[str]) -> List[List[str]]:
+    """Topic list per shard for the configured sharding strategy.
+
+    "hash": every listed device is subscribed by exactly one shard, so each
+    message is delivered once; shard 0 adds the exact MON and device_data
+    topics. No shard holds a device_data/# wildcard (it would receive every
+    device again), so unlisted devices are not received.
+    """
+    if shards <= 1:
+        return [list(DEFAULT_TOPICS)]
+    if strategy == "hash":
+        if not device_ids:
+            raise ValueError("MQTT_SHARD_STRATEGY=hash needs the device ids in MQTT_SHARD_DEVICE_IDS")
+        plan = [["MON", "device_data"]] + [[] for _ in range(shards - 1)]
+        for device_id in device_ids:
+            plan[shard_for_device(device_id, shards)].append(f"device_data/{device_id}")
+        return plan
+    # MQTT v5 shared subscriptions: every shard joins the same group, the broker balances.
+    return [[f"$share/{group}/{topic}" for topic in DEFAULT_TOPICS] for _ in range(shards)]
+
+
+def _create_subscriber(shard: SubscriberShard) -> mqtt.Client:
+    client_id = f"backend-ingest-{os.getpid()}-{shard.index}"
+    if shard.protocol == mqtt.MQTTv5:
+        client = mqtt.Client(client_id=client_id, userdata=shard, protocol=mqtt.MQTTv5)
+    else:
+        client = mqtt.Client(client_id=client_id, userdata=shard)
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.on_message = on_message
     
     # Set MQTT client options for high performance
-    mqtt_client.max_inflight_messages_set(10000)
-    mqtt_client.max_queued_messages_set(10000)
-    
+    client.max_inflight_messages_set(10000)
+    client.max_queued_messages_set(10000)
+    return client
+
+
+def start_mqtt_client():
+    """Start the MQTT subscriber client(s) and connect to the broker."""
+    global mqtt_client, message_queue, track_frame_sequences
+
+    shards = max(1, settings.MQTT_SUBSCRIBER_SHARDS)
+    strategy = settings.MQTT_SHARD_STRATEGY
+    device_ids = [d.strip() for d in settings.MQTT_SHARD_DEVICE_IDS.split(",") if d.strip()]
+    if shards > 1 and strategy == "hash":
+        print(f"Hash sharding: {len(device_ids)} listed devices spread over {shards} shards, unlisted devices are not subscribed")
+    track_frame_sequences = not (shards > 1 and strategy != "hash")
+    if not track_frame_sequences:
+        print("Shared subscriptions: per-device ordering is not kept across shards, frame sequence gaps are not tracked")
+    protocol = mqtt.MQTTv5 if shards > 1 and strategy != "hash" else mqtt.MQTTv311
+
+    if message_queue is None:
+        message_queue = create_ingress_queue(settings.INGRESS_SPILL_DIR)
+    subscriber_shards.clear()
+    plan = plan_shard_topics(shards, strategy, settings.MQTT_SHARED_GROUP, device_ids)
+    for index, topics in enumerate(plan):
+        ingress = message_queue if index == 0 else create_ingress_queue(
+            os.path.join(settings.INGRESS_SPILL_DIR, f"shard-{index}")
+        )
+        subscriber_shards.append(SubscriberShard(index, ingress, topics, protocol))
+
     try:
-        # Connect to MQTT broker
-        mqtt_client.connect("localhost", 1883, 60)
-        
-        # Start the MQTT client loop in a separate thread
-        mqtt_client.loop_start()
+        for shard in subscriber_shards:
+            shard.client = _create_subscriber(shard)
+            # Connect to MQTT broker
+            shard.client.connect(settings.MQTT_BROKER_HOST, settings.MQTT_BROKER_PORT, 60)
+            # Start the MQTT client loop in its own network thread
+            shard.client.loop_start()
         
-        print("MQTT client started successfully")
+        # Spawn decode workers up front so the first large batch does not pay for it
+        decode_pool.start()
+        # Shard 0 doubles as the publishing client (slider commands)
+        mqtt_client = subscriber_shards[0].client
+        print(f"MQTT client started successfully ({len(subscriber_shards)} subscriber shard(s), {strategy if shards > 1 else 'unsharded'})")
         
     except Exception as e:
         print(f"Error starting MQTT client: {e}")
@@ -0,0 +1,269 @@
+"""Fixed-capacity per-device telemetry ring buffers with independent readers.
+
+Each device owns one preallocated structured array. The live broadcaster and
+the DB saver read it through separate cursors with different overflow rules:
+
+- live view (drop-oldest): a lagging broadcaster skips ahead to the newest
+  `capacity` rows and the skipped rows are counted as dropped.
+- persistence (block/spill): before unsaved rows are overwritten the writer
+  waits up to `block_timeout` seconds for the saver, then copies the oldest
+  unsaved rows to an in-memory spill list that the saver drains first. The
+  spill holds at most `max_spill_rows` rows; beyond that its oldest rows are
+  dropped and counted, so a stalled database cannot grow memory without bound.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Optional
+
+import numpy as np
+
+from app.telemetry import TelemetryBatch
+
+# One ring slot per sample; `persist` marks rows recorded while saving was on.
+RING_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("displacement", "<f8"),
+    ("force", "<f8"),
+    ("phase", "i1"),
+    ("motor_working", "i1"),
+    ("state", "i1"),
+    ("persist", "u1"),
+])
+
+DROP_OLDEST = "drop_oldest"
+BLOCK_SPILL = "block_spill"
+
+
+class RingReader:
+    """Read cursor (absolute row number) plus wake-up event for one consumer."""
+
+    def __init__(self, name: str, policy: str):
+        self.name = name
+        self.policy = policy
+        self.cursor = 0
+        self.event = asyncio.Event()
+        # Rows skipped by the drop-oldest policy.
+        self.dropped = 0
+
+
+class DeviceRingBuffer:
+    """Preallocated telemetry ring for one device with live and persistence readers."""
+
+    def __init__(self, device_id: str, capacity: int, block_timeout: float = 0.5, max_spill_rows: int = 1 << 20):
+        self.device_id = device_id
+        self.capacity = capacity
+        self.block_timeout = block_timeout
+        self.max_spill_rows = max_spill_rows
+        self.rows = np.zeros(capacity, dtype=RING_DTYPE)
+        # Total rows ever written; slot of row r is r % capacity.
+        self.head = 0
+        self.live = RingReader("broadcast", DROP_OLDEST)
+        self.saver = RingReader("saver", BLOCK_SPILL)
+        # Persist-flagged rows still in the ring and not yet consumed by the saver.
+        self.pending_persist = 0
+        # Unsaved rows moved out of the ring on overflow, oldest first.
+        self.spill: Deque[np.ndarray] = deque()
+        self.spill_rows = 0
+        self.spilled_total = 0
+        # Unsaved rows discarded because the spill was full.
+        self.spill_dropped = 0
+        self.blocked_writes = 0
+        self._saver_progress = asyncio.Event()
+        # First device_token seen, kept for auto-registering unknown devices.
+        self.device_token: Optional[str] = None
+
+    # ── Writing ───────────────────────────────────────────────────────────────
+
+    async def write(self, batch: TelemetryBatch, persist: bool):
+        """Append a single-device batch; persist marks the rows for the DB saver."""
+        if self.device_token is None:
+            self.device_token = batch.device_tokens.get(self.device_id)
+        rows = np.empty(len(batch), dtype=RING_DTYPE)
+        rows["timestamp"] = batch.timestamp
+        rows["displacement"] = batch.displacement
+        rows["force"] = batch.force
+        rows["phase"] = batch.phase
+        rows["motor_working"] = batch.motor_working
+        rows["state"] = batch.state
+        rows["persist"] = 1 if persist else 0
+        # Oversized batches are written capacity rows at a time so spill stays ordered.
+        for start in range(0, len(rows), self.capacity):
+            chunk = rows[start:start + self.capacity]
+            await self._make_room(len(chunk), block=persist)
+            self._store(chunk)
+            if persist:
+                self.pending_persist += len(chunk)
+        self.live.event.set()
+        if persist:
+            self.saver.event.set()
+
+    async def _make_room(self, count: int, block: bool):
+        """Apply the persistence overflow policy before `count` rows overwrite old slots."""
+        if self.pending_persist == 0:
+            # Nothing unsaved in the ring: the saver cursor simply follows the head.
+            self.saver.cursor = self.head
+            return
+        overflow = self.head + count - self.capacity - self.saver.cursor
+        if overflow > 0 and block and self.block_timeout > 0:
+            self.blocked_writes += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.block_timeout
+            while overflow > 0 and self.pending_persist > 0:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._saver_progress.clear()
+                try:
+                    await asyncio.wait_for(self._saver_progress.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                overflow = self.head + count - self.capacity - self.saver.cursor
+        if overflow > 0:
+            self._spill(overflow)
+
+    def _spill(self, count: int):
+        """Move the oldest `count` unsaved ring rows into the spill list."""
+        rows = self._slice(self.saver.cursor, count)
+        keep = rows[rows["persist"] == 1]
+        self.saver.cursor += count
+        self.pending_persist -= len(keep)
+        if len(keep):
+            self.spill.append(keep)
+            self.spill_rows += len(keep)
+            self.spilled_total += len(keep)
+            self._trim_spill()
+
+    def _trim_spill(self):
+        """Drop the oldest spilled rows beyond max_spill_rows."""
+        excess = self.spill_rows - self.max_spill_rows
+        while excess > 0 and self.spill:
+            chunk = self.spill.popleft()
+            if len(chunk) > excess:
+                self.spill.appendleft(chunk[excess:])
+                dropped = excess
+            else:
+                dropped = len(chunk)
+            self.spill_rows -= dropped
+            self.spill_dropped += dropped
+            excess -= dropped
+
+    def _store(self, rows: np.ndarray):
+        start = self.head % self.capacity
+        first = min(len(rows), self.capacity - start)
+        self.rows[start:start + first] = rows[:first]
+        if first < len(rows):
+            self.rows[:len(rows) - first] = rows[first:]
+        self.head += len(rows)
+
+    # ── Reading ───────────────────────────────────────────────────────────────
+
+    def _slice(self, cursor: int, count: int) -> np.ndarray:
+        """Copy `count` rows starting at absolute row `cursor`, handling wrap-around."""
+        start = cursor % self.capacity
+        first = min(count, self.capacity - start)
+        if first == count:
+            return self.rows[start:start + count].copy()
+        return np.concatenate((self.rows[start:], self.rows[:count - first]))
+
+    def available(self, reader: RingReader) -> int:
+        if reader is self.saver:
+            return self.pending_persist + self.spill_rows
+        return min(self.head - reader.cursor, self.capacity)
+
+    def read(self, reader: RingReader, max_rows: int) -> np.ndarray:
+        """Copy out up to max_rows unread rows for a reader and advance its cursor."""
+        if reader is self.saver:
+            return self._read_saver(max_rows)
+        lag = self.head - reader.cursor
+        if lag > self.capacity:
+            # Drop-oldest: the live view only cares about the newest window.
+            reader.dropped += lag - self.capacity
+            reader.cursor = self.head - self.capacity
+            lag = self.capacity
+        count = min(lag, max_rows)
+        rows = self._slice(reader.cursor, count)
+        reader.cursor += count
+        return rows
+
+    def _read_saver(self, max_rows: int) -> np.ndarray:
+        parts = []
+        taken = 0
+        while self.spill and taken < max_rows:
+            chunk = self.spill.popleft()
+            if taken + len(chunk) > max_rows:
+                self.spill.appendleft(chunk[max_rows - taken:])
+                chunk = chunk[:max_rows - taken]
+            parts.append(chunk)
+            taken += len(chunk)
+            self.spill_rows -= len(chunk)
+        if taken < max_rows and self.pending_persist > 0:
+            count = min(self.head - self.saver.cursor, max_rows - taken)
+            rows = self._slice(self.saver.cursor, count)
+            self.saver.cursor += count
+            rows = rows[rows["persist"] == 1]
+            self.pending_persist -= len(rows)
+            parts.append(rows)
+        self._saver_progress.set()
+        if not parts:
+            return np.empty(0, dtype=RING_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    async def collect(self, reader: RingReader, max_rows: int, flush_delay: float) -> TelemetryBatch:
+        """
+        Wait for unread rows, then keep filling until max_rows or flush_delay
+        seconds after the first row was seen, and return them as a batch.
+
+        An idle reader is parked on its event with no timer wakeups.
+        """
+        while self.available(reader) == 0:
+            reader.event.clear()
+            await reader.event.wait()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + flush_delay
+        while self.available(reader) < max_rows:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            reader.event.clear()
+            try:
+                await asyncio.wait_for(reader.event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.to_batch(self.read(reader, max_rows))
+
+    def to_batch(self, rows: np.ndarray) -> TelemetryBatch:
+        """Wrap ring rows as a single-device TelemetryBatch (column views, no copy)."""
+        return TelemetryBatch(
+            device_ids=[self.device_id],
+            device_codes=np.zeros(len(rows), dtype=np.int32),
+            timestamp=rows["timestamp"],
+            displacement=rows["displacement"],
+            force=rows["force"],
+            phase=rows["phase"],
+            motor_working=rows["motor_working"],
+            state=rows["state"],
+            device_tokens={self.device_id: self.device_token} if self.device_token else {},
+        )
+
+    # ── Monitoring ────────────────────────────────────────────────────────────
+
+    def get_stats(self) -> dict:
+        live_lag = min(self.head - self.live.cursor, self.capacity)
+        saver_lag = self.head - self.saver.cursor if self.pending_persist else 0
+        return {
+            "capacity": self.capacity,
+            "written": self.head,
+            "live_lag": live_lag,
+            "live_occupancy": live_lag / self.capacity,
+            "live_dropped": self.live.dropped,
+            "save_pending": self.pending_persist + self.spill_rows,
+            "save_occupancy": min(saver_lag, self.capacity) / self.capacity,
+            "save_spill_rows": self.spill_rows,
+            "save_spilled_total": self.spilled_total,
+            "save_spill_dropped": self.spill_dropped,
+            "save_blocked_writes": self.blocked_writes,
+        }
+
+
+__all__ = ["DeviceRingBuffer", "RingReader", "RING_DTYPE", "DROP_OLDEST", "BLOCK_SPILL"]
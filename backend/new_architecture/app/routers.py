@@ -6,16 +6,19 @@ from app.schemas import (
     IoTDeviceCreate, IoTDeviceResponse, DeviceDataResponse,
     FolderCreate, FolderResponse, CurveInfo,
     DeviceDataRowResponse, GroupedCurveResponse, GroupedFolderResponse,
-    FolderMetadataUpdate, FolderExportMetadataResponse,
+    FolderMetadataUpdate, FolderExportMetadataResponse, ExportJobResponse,
 )
-from app.models import IoTDevice, DeviceData, Folder
+from app.models import IoTDevice, DeviceData, Folder, CurveChunk
 from app.db import get_db
+from app.device_registry import invalidate_devices
+from app.curve_chunks import load_curve_chunks, chunk_rows_for_response
+from app.curve_stats import folder_stats_query, curve_stats_query, rebuild_curve_stats
 from app.utils import generate_token
 from app.auth import get_current_user_id  # Dependency to get user_id from token
-from typing import List
+from typing import List, Optional
+from types import SimpleNamespace
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -47,6 +50,8 @@ async def create_device(
             await db.refresh(new_device)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save device: {str(e)}")
+        # Drop any negative cache entry so ingest and routing see the new device
+        invalidate_devices([new_device.id])
 
         return new_device
 
@@ -80,6 +85,9 @@ async def get_device_data_grouped(
     Folders are ordered most-recently-created first.
     Curves within each folder are ordered by curve_index ascending.
     Rows within each curve are ordered by timestamp ascending.
+
+    Samples stored as curve_chunks are decoded and merged into the same
+    hierarchy; they carry negative synthetic ids.
     """
     async with get_db() as db:
         # Single query: join device_data → iot_devices (for user scope) →
@@ -95,13 +103,26 @@ async def get_device_data_grouped(
         )
         pairs = result.all()
 
+        # Chunked-layout samples plus the folders they belong to.
+        chunks = await load_curve_chunks(db, user_id=user_id)
+        chunk_folder_ids = {chunk.folder_id for chunk in chunks if chunk.folder_id is not None}
+        folder_result = await db.execute(select(Folder).where(Folder.id.in_(chunk_folder_ids)))
+        chunk_folders = {folder.id: folder for folder in folder_result.scalars().all()}
+
+    # Decoded chunk samples take the same (data_row, folder_row) shape as the query rows.
+    chunk_pairs = [
+        (SimpleNamespace(**sample), chunk_folders.get(chunk.folder_id))
+        for chunk in chunks
+        for sample in chunk_rows_for_response(chunk)
+    ]
+
     # ── Group in Python ───────────────────────────────────────────────────────
     # folder_map  : folder_id (or None) → folder bucket dict
     # folder_order: insertion-ordered list of folder_ids to preserve first-seen order
     folder_map: dict = {}
     folder_order: list = []
 
-    for data_row, folder_row in pairs:
+    for data_row, folder_row in [*pairs, *chunk_pairs]:
         # Use Python None as the dict key for null-folder rows.
         fid = data_row.folder_id
 
@@ -137,6 +158,11 @@ async def get_device_data_grouped(
     for fid in sorted_fids:
         fd = folder_map[fid]
 
+        if chunk_pairs:
+            # Chunk samples were appended after the query rows; restore timestamp order (stable).
+            for rows in fd["curve_map"].values():
+                rows.sort(key=lambda r: r.timestamp)
+
         curves = [
             GroupedCurveResponse(
                 curve_index=ci,
@@ -211,9 +237,21 @@ async def delete_devices(
                 status_code=404, detail="Devices not found or not authorized."
             )
 
+        # Folders holding samples of these devices; their curve_stats are rebuilt below.
+        owned_ids = [device.id for device in devices]
+        folder_result = await db.execute(
+            select(DeviceData.folder_id).where(DeviceData.device_id.in_(owned_ids))
+            .union(select(CurveChunk.folder_id).where(CurveChunk.device_id.in_(owned_ids)))
+        )
+        affected_folder_ids = [fid for fid in folder_result.scalars().all() if fid is not None]
+
         for device in devices:
             await db.delete(device)
+        if affected_folder_ids:
+            await db.flush()
+            await rebuild_curve_stats(db, affected_folder_ids)
         await db.commit()
+        invalidate_devices([device.id for device in devices])
 
         return {"detail": f"{len(devices)} devices deleted successfully."}
 
@@ -248,15 +286,26 @@ async def delete_device_data(
 
         for entry in device_data_entries:
             await db.delete(entry)
+        # Keep the folder listing aggregates in step with the remaining rows.
+        affected_folder_ids = {entry.folder_id for entry in device_data_entries if entry.folder_id is not None}
+        if affected_folder_ids:
+            await db.flush()
+            await rebuild_curve_stats(db, affected_folder_ids)
         await db.commit()
 
         return {"detail": f"{len(device_data_entries)} device data entries deleted successfully."}
 
 
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import os
+import tempfile
 from datetime import datetime
-from app.db import export_device_data_to_hdf5, export_folder_to_hdf5, upsert_folder_metadata, get_folder_export_metadata
+from app.db import export_device_data_to_hdf5, upsert_folder_metadata, get_folder_export_metadata
+from app.export_jobs import export_jobs, download_filename
+from app.arrow_export import (
+    ARROW_AVAILABLE, ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE, write_folder_parquet, stream_folder_arrow,
+)
 
 # ── Legacy single-curve export (kept for backward compatibility) ──────────────
 
@@ -332,20 +381,8 @@ async def list_folders(
 ):
     """List all folders owned by the current user with curve and row counts."""
     async with get_db() as db:
-        # Fetch folders with aggregated curve_count and row_count in one query.
-        result = await db.execute(
-            select(
-                Folder,
-                # Count distinct curve indices to get the number of curves per folder.
-                func.count(DeviceData.curve_index.distinct()).label("curve_count"),
-                # Count total rows stored in this folder.
-                func.count(DeviceData.id).label("row_count"),
-            )
-            .outerjoin(DeviceData, DeviceData.folder_id == Folder.id)
-            .where(Folder.user_id == user_id)
-            .group_by(Folder.id)
-            .order_by(Folder.created_at.desc())
-        )
+        # Folders with curve_count and row_count read from curve_stats (no device_data scan).
+        result = await db.execute(folder_stats_query(user_id))
         rows = result.all()
 
         folders = []
@@ -462,64 +499,136 @@ async def list_folder_curves(
         if not folder_result.scalars().first():
             raise HTTPException(status_code=404, detail="Folder not found or not authorized.")
 
-        # Aggregate row count per curve_index.
-        result = await db.execute(
-            select(
-                DeviceData.curve_index,
-                func.count(DeviceData.id).label("row_count"),
-            )
-            .where(DeviceData.folder_id == folder_id)
-            .group_by(DeviceData.curve_index)
-            .order_by(DeviceData.curve_index)
-        )
-        rows = result.all()
+        # One curve_stats row per curve (maintained on insert).
+        result = await db.execute(curve_stats_query(folder_id))
+        stats = result.scalars().all()
 
-        return [CurveInfo(curve_index=row.curve_index, row_count=row.row_count) for row in rows]
+        return [CurveInfo(curve_index=stat.curve_index, row_count=stat.row_count) for stat in stats]
 
 
 # ── Folder HDF5 export ────────────────────────────────────────────────────────
 
-@router.get("/export/folder/{folder_id}")
-async def download_folder_hdf5(
+async def _owned_folder(db, folder_id: int, user_id: int) -> Folder:
+    folder_result = await db.execute(
+        select(Folder).where(Folder.id == folder_id, Folder.user_id == user_id)
+    )
+    folder = folder_result.scalars().first()
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found or not authorized.")
+    return folder
+
+
+@router.post("/export/folder/{folder_id}/jobs", response_model=ExportJobResponse, status_code=202)
+async def create_folder_export_job(
     folder_id: int,
     user_id: int = Depends(get_current_user_id),
 ):
-    """Export all curves in a folder to a single HDF5 file named after the folder."""
-    # Preferred persistent export directory; fall back to project-local path if read-only.
-    preferred_export_directory_path = "/data/barytech"
-    fallback_export_directory_path = os.path.join(os.getcwd(), "data", "barytech")
-    # Resolve the export directory, falling back if the preferred path is not writable.
-    export_directory_path = preferred_export_directory_path
-    # Prevent crash when deployment filesystem blocks writes to `/data`.
-    try:
-        os.makedirs(preferred_export_directory_path, exist_ok=True)
-    except OSError:
-        export_directory_path = fallback_export_directory_path
-        os.makedirs(export_directory_path, exist_ok=True)
-
-    # Fetch the folder name to use as the filename.
+    """Queue a background HDF5 export of a folder; an unchanged folder is served from cache."""
     async with get_db() as db:
-        folder_result = await db.execute(
-            select(Folder).where(Folder.id == folder_id, Folder.user_id == user_id)
-        )
-        folder = folder_result.scalars().first()
-        if not folder:
-            raise HTTPException(status_code=404, detail="Folder not found or not authorized.")
-        # Sanitise the folder name so it is safe to use as a filesystem filename.
-        safe_name = "".join(c if c.isalnum() or c in " _-." else "_" for c in folder.name).strip()
-        # Append a timestamp so repeated exports never overwrite each other.
-        export_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        export_filename = f"{safe_name}_{export_timestamp}.hdf5"
+        folder = await _owned_folder(db, folder_id, user_id)
+        job = await export_jobs.submit(db, folder, user_id)
+    return ExportJobResponse(**job.to_dict())
 
-    # Builds the absolute export file path.
-    file_path = os.path.join(export_directory_path, export_filename)
-    await export_folder_to_hdf5(file_path, folder_id, user_id)
 
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Export failed — file not created.")
+@router.get("/export/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Status and progress of an export job."""
+    job = export_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found.")
+    return ExportJobResponse(**job.to_dict())
+
+
+def _job_file_response(job) -> FileResponse:
+    if job.status == "failed":
+        raise HTTPException(status_code=job.status_code or 500, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}.")
+    # A newer export of the same folder replaces the cached file.
+    if not os.path.exists(job.file_path):
+        raise HTTPException(status_code=404, detail="Export file no longer available; start a new export.")
+    return FileResponse(
+        path=job.file_path,
+        filename=job.filename,
+        media_type="application/octet-stream",
+    )
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Download the HDF5 file of a finished export job."""
+    job = export_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found.")
+    return _job_file_response(job)
+
+
+# ── Columnar (Arrow / Parquet) folder export ─────────────────────────────────
+
+def _require_arrow():
+    if not ARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Arrow / Parquet export needs pyarrow installed on the server.")
+
 
+@router.get("/export/folder/{folder_id}.parquet")
+async def download_folder_parquet(
+    folder_id: int,
+    curve_index: Optional[int] = None,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Folder (or one curve with ?curve_index=) as a Parquet file of columnar samples."""
+    _require_arrow()
+    async with get_db() as db:
+        folder = await _owned_folder(db, folder_id, user_id)
+    fd, file_path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await write_folder_parquet(file_path, folder_id, curve_index)
+    except Exception:
+        os.remove(file_path)
+        raise
+    suffix = f"_curve{curve_index}.parquet" if curve_index is not None else ".parquet"
     return FileResponse(
         path=file_path,
-        filename=export_filename,
-        media_type="application/octet-stream",
+        filename=download_filename(folder, suffix),
+        media_type=PARQUET_MEDIA_TYPE,
+        # The file is only a vehicle for the response.
+        background=BackgroundTask(os.remove, file_path),
     )
+
+
+@router.get("/export/folder/{folder_id}.arrow")
+async def stream_folder_arrow_ipc(
+    folder_id: int,
+    curve_index: Optional[int] = None,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Folder (or one curve with ?curve_index=) as an Arrow IPC stream, one record batch per fetch."""
+    _require_arrow()
+    async with get_db() as db:
+        await _owned_folder(db, folder_id, user_id)
+    return StreamingResponse(stream_folder_arrow(folder_id, curve_index), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+
+# ":int" keeps "<id>.parquet" / "<id>.arrow" from matching this route.
+@router.get("/export/folder/{folder_id:int}")
+async def download_folder_hdf5(
+    folder_id: int,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Export all curves in a folder to a single HDF5 file named after the folder.
+
+    Runs through the export job queue and waits for it, so an unchanged folder
+    is answered from the cached file.
+    """
+    async with get_db() as db:
+        folder = await _owned_folder(db, folder_id, user_id)
+        job = await export_jobs.submit(db, folder, user_id)
+    await job.done.wait()
+    return _job_file_response(job)
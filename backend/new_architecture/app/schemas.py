@@ -168,3 +168,26 @@ class GroupedFolderResponse(BaseModel):
     folder_created_at: Optional[datetime] = None
     # Curves inside this folder, ordered by curve_index ascending.
     curves: List[GroupedCurveResponse]
+
+
+class ExportJobResponse(BaseModel):
+    """State of a background folder export job (polled with GET /api/export/jobs/{job_id})."""
+    job_id: str
+    folder_id: int
+    # "queued", "running", "done" or "failed".
+    status: str
+    # Folder content version the file is cached under.
+    version: str
+    # HDF5 dataset layout, e.g. "gzip4-shuffle-f64-c4096".
+    layout: str
+    # Samples written so far, out of the folder's curve_stats total.
+    rows_done: int = 0
+    rows_total: int = 0
+    progress: float = 0.0
+    # True when an unchanged folder was served from the cached file.
+    cached: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    # Set once the job is done.
+    download_url: Optional[str] = None
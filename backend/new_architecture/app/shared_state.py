@@ -20,3 +20,45 @@ folder_curve_index_map: Dict[int, int] = {}
 
 # Optional metadata dict for the active folder/experiment (velocity, conversion factors, tip params).
 current_folder_metadata: Optional[dict] = None
+
+
+def apply_save_flag(flag: bool, folder_id=None, metadata=None):
+    """
+    Update the save state (called by the API, or by the ingest worker in worker mode).
+
+    On a False→True transition the curve_index for the target folder is
+    incremented so every new save session records into a distinct curve slot.
+    folder_id is stored globally so message_processor can stamp rows without
+    the WebSocket context being passed all the way down the call stack.
+    Optional metadata (velocity, conversion factors, tip params) is stored
+    on the folder so all curves in the experiment share the same HDF5 tip attrs.
+    """
+    global save_flag, current_folder_id, current_curve_index, current_folder_metadata
+
+    # Detect the False→True edge that marks the start of a new curve.
+    is_rising_edge = (not save_flag) and flag
+
+    save_flag = flag
+
+    if flag:
+        # Remember which folder this save session targets.
+        current_folder_id = folder_id
+        # Store optional experiment metadata for the active folder save session.
+        current_folder_metadata = metadata if isinstance(metadata, dict) else None
+
+        if is_rising_edge and folder_id is not None:
+            # Increment the curve counter for this folder on each new ON press.
+            previous_index = folder_curve_index_map.get(folder_id, -1)
+            folder_curve_index_map[folder_id] = previous_index + 1
+            current_curve_index = folder_curve_index_map[folder_id]
+            print(f"Save ON — folder {folder_id}, curve_index {current_curve_index}")
+        elif is_rising_edge:
+            # No folder_id provided; reset to index 0 for legacy behaviour.
+            current_curve_index = 0
+            print("Save ON — no folder_id, curve_index 0")
+
+        print("Save data action triggered!")
+    else:
+        print("Save data action disabled.")
+        # Keep current_folder_id and current_curve_index so any in-flight
+        # messages still being flushed to DB pick up the correct values.
@@ -0,0 +1,607 @@
+"""Columnar telemetry batches decoded straight from raw MQTT payloads.
+
+A TelemetryBatch holds one NumPy array per canonical field so the broadcaster
+and the DB saver can consume whole ingest batches without per-point dicts.
+"""
+
+import os
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import orjson
+
+# Device id used when a payload does not carry one (single-device frontends).
+DEFAULT_FRONTEND_DEVICE_ID = os.getenv("DEFAULT_FRONTEND_DEVICE_ID", "frontend1_device")
+
+# Alias keys accepted for each canonical telemetry field, in priority order.
+DEVICE_ID_KEYS = ("device_id", "deviceId", "device", "id")
+TIMESTAMP_KEYS = ("timestamp", "time", "t")
+DISPLACEMENT_KEYS = ("displacement", "displacement_mm", "z", "Z", "z_mm", "Z_mm")
+POSITION_DISPLACEMENT_KEYS = ("z", "Z")
+FORCE_KEYS = ("force", "Force", "force_mN", "force_N", "force_n", "Force_mN", "Force_N")
+PHASE_KEYS = ("phase", "Phase", "segment", "segment_type", "segmentType")
+STATE_PHASE_KEYS = ("phase", "Phase", "segment", "segment_type")
+MOTOR_KEYS = ("motor_working", "motorWorking", "motor", "motor_active", "motorActive")
+STATE_MOTOR_KEYS = ("motor_working", "motorWorking", "motor")
+
+# Keys that carry force already in Newtons rather than millinewtons.
+FORCE_NEWTON_KEYS = {"force_N", "Force_N", "force_n"}
+
+# Sentinel stored in the state column when a payload has no scalar indentation state.
+STATE_ABSENT = -1
+
+
+def _first_defined(source, keys):
+    """Return the first matching key and value pair from a telemetry dict."""
+    for key in keys:
+        value = source.get(key)
+        if value is not None:
+            return key, value
+    return None, None
+
+
+def _to_float(value):
+    """Parse a numeric telemetry value, or None when invalid."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_flag(value):
+    """Normalize a 0/1 flag (phase, motor_working); anything else maps to 0."""
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return parsed if parsed in (0, 1) else 0
+
+
+def _to_state(value):
+    """Keep scalar 0/1 indentation state used by the dashboard status banner."""
+    if isinstance(value, (dict, list)) or value is None or value == "":
+        return STATE_ABSENT
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return STATE_ABSENT
+    return parsed if parsed in (0, 1) else STATE_ABSENT
+
+
+def timestamp_to_epoch(value, default: float) -> float:
+    """Convert an ISO string or numeric (s/ms) timestamp to UTC epoch seconds.
+
+    Naive ISO strings are read as UTC so the stored wall-clock value matches
+    what the publisher sent.
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        number = float(value)
+        # Millisecond epochs are > 1e11 for any date after 1973.
+        return number / 1000.0 if number > 1e11 else number
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        number = _to_float(value)
+        if number is None:
+            return default
+        return number / 1000.0 if number > 1e11 else number
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _iso_column_to_epoch(strings: List[str]) -> Optional[np.ndarray]:
+    """Parse UTC/naive ISO 8601 strings in one NumPy call, or None if any value needs the scalar parser."""
+    if not all(len(value) >= 10 and value[4] == "-" for value in strings):
+        # Numeric strings would be read as years; let timestamp_to_epoch handle them.
+        return None
+    stripped = [value[:-1] if value.endswith(("Z", "z")) else value for value in strings]
+    try:
+        with warnings.catch_warnings():
+            # NumPy only warns on explicit offsets ("+02:00"); those go through the scalar parser.
+            warnings.simplefilter("error")
+            stamps = np.array(stripped, dtype="datetime64[us]")
+    except (ValueError, Warning):
+        return None
+    micros = stamps.astype(np.int64)
+    return np.where(np.isnat(stamps), np.nan, micros / 1e6)
+
+
+def timestamps_to_epoch(values: List, default: float) -> np.ndarray:
+    """Vectorized timestamp_to_epoch for a whole column of raw timestamp values.
+
+    All-numeric columns convert in one NumPy call, and so do columns of UTC
+    ("Z") or naive ISO strings. Anything else (explicit offsets, numeric
+    strings, junk) falls back to the scalar parser value by value.
+    """
+    if not values:
+        return np.empty(0, dtype=np.float64)
+    kinds = set(map(type, values))
+    if kinds <= {int, float, bool}:
+        numbers = np.asarray(values, dtype=np.float64)
+    else:
+        numbers = np.full(len(values), np.nan)
+        if kinds == {str}:
+            strings = values
+            index = np.arange(len(values))
+        else:
+            strings, positions = [], []
+            for i, value in enumerate(values):
+                if isinstance(value, (int, float)):
+                    numbers[i] = value
+                elif value is not None:
+                    strings.append(str(value))
+                    positions.append(i)
+            index = np.asarray(positions, dtype=np.int64)
+        if strings:
+            parsed = _iso_column_to_epoch(strings)
+            if parsed is None:
+                parsed = np.array([timestamp_to_epoch(value, np.nan) for value in strings])
+            numbers[index] = parsed
+    # Millisecond epochs are > 1e11 for any date after 1973.
+    numbers = np.where(numbers > 1e11, numbers / 1000.0, numbers)
+    return np.where(np.isnan(numbers), default, numbers)
+
+
+def epoch_to_datetime(timestamps: np.ndarray) -> list:
+    """Naive UTC datetimes (microsecond precision) for epoch seconds, converted in one call."""
+    return np.round(timestamps * 1e6).astype("datetime64[us]").tolist()
+
+
+def epoch_to_iso(timestamps: np.ndarray) -> np.ndarray:
+    """Format epoch-second timestamps as ISO 8601 UTC strings in one vectorized call."""
+    micros = np.round(timestamps * 1e6).astype("datetime64[us]")
+    return np.datetime_as_string(micros, unit="us", timezone="UTC")
+
+
+class TelemetryBatch:
+    """Columnar block of canonical telemetry points.
+
+    device_codes index into device_ids; timestamp is UTC epoch seconds,
+    displacement is µm, force is µN, phase/motor_working are 0/1 and state is
+    0/1 or STATE_ABSENT.
+    """
+
+    __slots__ = (
+        "device_ids", "device_codes", "timestamp", "displacement", "force",
+        "phase", "motor_working", "state", "device_tokens",
+    )
+
+    def __init__(
+        self,
+        device_ids: List[str],
+        device_codes: np.ndarray,
+        timestamp: np.ndarray,
+        displacement: np.ndarray,
+        force: np.ndarray,
+        phase: np.ndarray,
+        motor_working: np.ndarray,
+        state: np.ndarray,
+        device_tokens: Optional[Dict[str, str]] = None,
+    ):
+        self.device_ids = device_ids
+        self.device_codes = device_codes
+        self.timestamp = timestamp
+        self.displacement = displacement
+        self.force = force
+        self.phase = phase
+        self.motor_working = motor_working
+        self.state = state
+        # First device_token seen per device, used when auto-registering devices.
+        self.device_tokens = device_tokens or {}
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @classmethod
+    def empty(cls, device_ids: Optional[List[str]] = None) -> "TelemetryBatch":
+        return cls(
+            device_ids=list(device_ids or []),
+            device_codes=np.empty(0, dtype=np.int32),
+            timestamp=np.empty(0, dtype=np.float64),
+            displacement=np.empty(0, dtype=np.float64),
+            force=np.empty(0, dtype=np.float64),
+            phase=np.empty(0, dtype=np.int8),
+            motor_working=np.empty(0, dtype=np.int8),
+            state=np.empty(0, dtype=np.int8),
+        )
+
+    @property
+    def device_id(self) -> Optional[str]:
+        """Device id of a single-device batch (as produced by split_by_device)."""
+        return self.device_ids[0] if len(self.device_ids) == 1 else None
+
+    def take(self, index) -> "TelemetryBatch":
+        """Return a new batch holding only the rows selected by index/mask."""
+        return TelemetryBatch(
+            device_ids=self.device_ids,
+            device_codes=self.device_codes[index],
+            timestamp=self.timestamp[index],
+            displacement=self.displacement[index],
+            force=self.force[index],
+            phase=self.phase[index],
+            motor_working=self.motor_working[index],
+            state=self.state[index],
+            device_tokens=self.device_tokens,
+        )
+
+    def in_time_order(self) -> "TelemetryBatch":
+        """This batch, stably sorted by timestamp if it is not already in order."""
+        if len(self) < 2 or not (np.diff(self.timestamp) < 0).any():
+            return self
+        return self.take(np.argsort(self.timestamp, kind="stable"))
+
+    def split_by_device(self) -> Dict[str, "TelemetryBatch"]:
+        """Split into single-device batches, preserving arrival order within each device."""
+        if len(self.device_ids) == 1:
+            return {self.device_ids[0]: self}
+        per_device = {}
+        for code, device_id in enumerate(self.device_ids):
+            mask = self.device_codes == code
+            if not mask.any():
+                continue
+            part = self.take(mask)
+            part.device_ids = [device_id]
+            part.device_codes = np.zeros(len(part), dtype=np.int32)
+            token = self.device_tokens.get(device_id)
+            part.device_tokens = {device_id: token} if token else {}
+            per_device[device_id] = part
+        return per_device
+
+    @classmethod
+    def concat(cls, batches: Iterable["TelemetryBatch"]) -> "TelemetryBatch":
+        """Concatenate batches into one, remapping device codes onto a merged id list."""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        device_ids: List[str] = []
+        code_of: Dict[str, int] = {}
+        codes = []
+        tokens: Dict[str, str] = {}
+        for batch in batches:
+            remap = np.empty(len(batch.device_ids), dtype=np.int32)
+            for code, device_id in enumerate(batch.device_ids):
+                if device_id not in code_of:
+                    code_of[device_id] = len(device_ids)
+                    device_ids.append(device_id)
+                remap[code] = code_of[device_id]
+            codes.append(remap[batch.device_codes])
+            for device_id, token in batch.device_tokens.items():
+                tokens.setdefault(device_id, token)
+        return cls(
+            device_ids=device_ids,
+            device_codes=np.concatenate(codes),
+            timestamp=np.concatenate([b.timestamp for b in batches]),
+            displacement=np.concatenate([b.displacement for b in batches]),
+            force=np.concatenate([b.force for b in batches]),
+            phase=np.concatenate([b.phase for b in batches]),
+            motor_working=np.concatenate([b.motor_working for b in batches]),
+            state=np.concatenate([b.state for b in batches]),
+            device_tokens=tokens,
+        )
+
+    def to_records(self) -> List[dict]:
+        """Expand into per-point dicts for JSON consumers (WebSocket frames)."""
+        if not len(self):
+            return []
+        device_ids = np.asarray(self.device_ids, dtype=object)[self.device_codes].tolist()
+        timestamps = epoch_to_iso(self.timestamp).tolist()
+        displacement = self.displacement.tolist()
+        force = self.force.tolist()
+        phase = self.phase.tolist()
+        motor = self.motor_working.tolist()
+        state = self.state.tolist()
+        records = []
+        for i in range(len(timestamps)):
+            record = {
+                "device_id": device_ids[i],
+                "timestamp": timestamps[i],
+                "displacement": displacement[i],
+                "force": force[i],
+                "phase": phase[i],
+                "motor_working": motor[i],
+            }
+            if state[i] != STATE_ABSENT:
+                record["state"] = state[i]
+            records.append(record)
+        return records
+
+
+# Container slots a schema field can be bound to: the payload, its nested state dict, its position dict.
+_TOP, _STATE, _POSITION = 0, 1, 2
+_EMPTY = {}
+
+# Alias search order per field as (container slot, alias keys).
+_DEVICE_SOURCES = ((_TOP, DEVICE_ID_KEYS), (_STATE, DEVICE_ID_KEYS))
+_TIMESTAMP_SOURCES = ((_TOP, TIMESTAMP_KEYS), (_STATE, TIMESTAMP_KEYS))
+_DISPLACEMENT_SOURCES = (
+    (_TOP, DISPLACEMENT_KEYS), (_STATE, DISPLACEMENT_KEYS), (_POSITION, POSITION_DISPLACEMENT_KEYS),
+)
+_FORCE_SOURCES = ((_TOP, FORCE_KEYS), (_STATE, FORCE_KEYS))
+_PHASE_SOURCES = ((_TOP, PHASE_KEYS), (_STATE, STATE_PHASE_KEYS))
+_MOTOR_SOURCES = ((_TOP, MOTOR_KEYS), (_STATE, STATE_MOTOR_KEYS))
+
+# Returned by TelemetrySchema.extract when a payload does not fit the cached layout.
+_MISFIT = object()
+
+
+def _containers(data_point):
+    """Return (payload, nested state dict, position dict) for a telemetry point."""
+    state = data_point.get("state")
+    position = data_point.get("position")
+    return (
+        data_point,
+        state if isinstance(state, dict) else _EMPTY,
+        position if isinstance(position, dict) else _EMPTY,
+    )
+
+
+def _scan(containers, sources):
+    """Slow path: first non-None alias value across containers, as (key, value)."""
+    for slot, keys in sources:
+        key, value = _first_defined(containers[slot], keys)
+        if value is not None:
+            return key, value
+    return None, None
+
+
+def _bind(containers, sources):
+    """Bind a field to the first alias present in the payload layout, or None when absent."""
+    for slot, keys in sources:
+        container = containers[slot]
+        for key in keys:
+            if key in container:
+                return slot, key
+    return None
+
+
+def _force_scale(force_key) -> float:
+    """µN per unit of the given force key: N for FORCE_NEWTON_KEYS, mN otherwise."""
+    return 1_000_000.0 if force_key in FORCE_NEWTON_KEYS else 1000.0
+
+
+def _convert_point(device_id, timestamp, displacement, displacement_scale, force, force_scale, phase, motor, state):
+    """Apply unit conversion and defaults; returns the canonical field tuple."""
+    # Default missing channel to zero so partial MQTT payloads still persist.
+    displacement_value = _to_float(displacement)
+    force_value = _to_float(force)
+    return (
+        str(device_id or DEFAULT_FRONTEND_DEVICE_ID),
+        timestamp,
+        displacement_value * displacement_scale if displacement_value is not None else 0.0,
+        force_value * force_scale if force_value is not None else 0.0,
+        _to_flag(phase),
+        _to_flag(motor),
+        _to_state(state),
+    )
+
+
+def scan_point(data_point):
+    """Extract canonical fields by scanning every alias; None for non-telemetry payloads.
+
+    Returns (device_id, raw_timestamp, displacement_um, force_uN, phase, motor_working, state).
+    """
+    containers = _containers(data_point)
+    _, displacement = _scan(containers, _DISPLACEMENT_SOURCES)
+    force_key, force = _scan(containers, _FORCE_SOURCES)
+    if displacement is None and force is None:
+        return None
+    return _convert_point(
+        _scan(containers, _DEVICE_SOURCES)[1],
+        _scan(containers, _TIMESTAMP_SOURCES)[1],
+        displacement, 1000.0,
+        force, _force_scale(force_key),
+        _scan(containers, _PHASE_SOURCES)[1],
+        _scan(containers, _MOTOR_SOURCES)[1],
+        data_point.get("state"),
+    )
+
+
+class TelemetrySchema:
+    """Compiled extractor for one payload layout with unit factors bound once."""
+
+    __slots__ = (
+        "device", "timestamp", "displacement", "force", "phase", "motor",
+        "displacement_scale", "force_scale", "is_telemetry",
+    )
+
+    def __init__(self, containers):
+        self.device = _bind(containers, _DEVICE_SOURCES)
+        self.timestamp = _bind(containers, _TIMESTAMP_SOURCES)
+        self.displacement = _bind(containers, _DISPLACEMENT_SOURCES)
+        self.force = _bind(containers, _FORCE_SOURCES)
+        self.phase = _bind(containers, _PHASE_SOURCES)
+        self.motor = _bind(containers, _MOTOR_SOURCES)
+        # mm → µm for every displacement alias; force factor depends on the bound key.
+        self.displacement_scale = 1000.0
+        self.force_scale = _force_scale(self.force[1] if self.force else None)
+        self.is_telemetry = self.displacement is not None or self.force is not None
+
+    def extract(self, data_point, containers):
+        """Read canonical fields through the bound keys; _MISFIT when a bound value is null."""
+        if not self.is_telemetry:
+            return None
+        values = []
+        for binding in (self.device, self.timestamp, self.displacement, self.force, self.phase, self.motor):
+            if binding is None:
+                values.append(None)
+                continue
+            value = containers[binding[0]].get(binding[1])
+            if value is None:
+                # A null in a bound key may hide a lower-priority alias; let the scan decide.
+                return _MISFIT
+            values.append(value)
+        device_id, timestamp, displacement, force, phase, motor = values
+        return _convert_point(
+            device_id, timestamp,
+            displacement, self.displacement_scale,
+            force, self.force_scale,
+            phase, motor,
+            data_point.get("state"),
+        )
+
+
+class SchemaResolver:
+    """Caches a compiled TelemetrySchema per (device, key-set) payload signature.
+
+    The signature is the device_id hint plus the key tuples of the payload and
+    its nested state/position dicts, so a publisher that changes shape gets a
+    freshly learned schema on its next message.
+    """
+
+    def __init__(self, max_schemas: int = 1024):
+        self.max_schemas = max_schemas
+        self._schemas: Dict[tuple, TelemetrySchema] = {}
+        # Hit/learn/fallback counters for monitoring the cache effectiveness.
+        self.hits = 0
+        self.learned = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def signature(data_point, containers) -> tuple:
+        state, position = containers[_STATE], containers[_POSITION]
+        return (
+            data_point.get("device_id"),
+            tuple(data_point),
+            tuple(state) if state else None,
+            tuple(position) if position else None,
+        )
+
+    def extract(self, data_point):
+        """Canonical field tuple for a payload (see scan_point), or None for non-telemetry."""
+        if not isinstance(data_point, dict):
+            return None
+        containers = _containers(data_point)
+        key = self.signature(data_point, containers)
+        schema = self._schemas.get(key)
+        if schema is None:
+            if len(self._schemas) >= self.max_schemas:
+                # Bound memory against publishers with unstable payload shapes.
+                self._schemas.clear()
+            schema = self._schemas[key] = TelemetrySchema(containers)
+            self.learned += 1
+        else:
+            self.hits += 1
+        fields = schema.extract(data_point, containers)
+        if fields is _MISFIT:
+            self.fallbacks += 1
+            return scan_point(data_point)
+        return fields
+
+    def get_stats(self) -> dict:
+        return {
+            "schemas_cached": len(self._schemas),
+            "schema_hits": self.hits,
+            "schemas_learned": self.learned,
+            "schema_fallbacks": self.fallbacks,
+        }
+
+
+# Process-wide resolver shared by the columnar decoder and normalize_data_point.
+schema_resolver = SchemaResolver()
+
+
+class TelemetryDecoder:
+    """Accumulates payloads into column lists and builds one TelemetryBatch."""
+
+    def __init__(self, resolver: Optional[SchemaResolver] = None):
+        self.resolver = resolver or schema_resolver
+        self.device_ids: List[str] = []
+        self._code_of: Dict[str, int] = {}
+        self.device_tokens: Dict[str, str] = {}
+        self.codes: List[int] = []
+        # Raw timestamp values; parsed as one column in build().
+        self.timestamp: List = []
+        self.displacement: List[float] = []
+        self.force: List[float] = []
+        self.phase: List[int] = []
+        self.motor_working: List[int] = []
+        self.state: List[int] = []
+        # Receive time used for points that carry no timestamp of their own.
+        self.now = datetime.now(timezone.utc).timestamp()
+
+    def _device_code(self, device_id: str) -> int:
+        code = self._code_of.get(device_id)
+        if code is None:
+            code = len(self.device_ids)
+            self._code_of[device_id] = code
+            self.device_ids.append(device_id)
+        return code
+
+    def add_point(self, data_point) -> bool:
+        """Append one telemetry dict; returns False for non-telemetry messages."""
+        fields = self.resolver.extract(data_point)
+        if fields is None:
+            return False
+        device_id, timestamp, displacement_um, force_uN, phase, motor, state = fields
+
+        code = self._code_of.get(device_id)
+        if code is None:
+            code = self._device_code(device_id)
+            if data_point.get("device_token"):
+                self.device_tokens[device_id] = str(data_point["device_token"])
+        self.codes.append(code)
+        self.timestamp.append(timestamp)
+        self.displacement.append(displacement_um)
+        self.force.append(force_uN)
+        self.phase.append(phase)
+        self.motor_working.append(motor)
+        self.state.append(state)
+        return True
+
+    def add_message(self, message_content) -> int:
+        """Append a decoded MQTT message (single dict or batched list); returns points added."""
+        data_points = message_content if isinstance(message_content, list) else [message_content]
+        added = 0
+        for data_point in data_points:
+            if self.add_point(data_point):
+                added += 1
+        return added
+
+    def build(self) -> TelemetryBatch:
+        """Materialize the accumulated columns as NumPy arrays."""
+        return TelemetryBatch(
+            device_ids=self.device_ids,
+            device_codes=np.asarray(self.codes, dtype=np.int32),
+            timestamp=timestamps_to_epoch(self.timestamp, self.now),
+            displacement=np.asarray(self.displacement, dtype=np.float64),
+            force=np.asarray(self.force, dtype=np.float64),
+            phase=np.asarray(self.phase, dtype=np.int8),
+            motor_working=np.asarray(self.motor_working, dtype=np.int8),
+            state=np.asarray(self.state, dtype=np.int8),
+            device_tokens=self.device_tokens,
+        )
+
+
+def decode_telemetry_batch(raw_messages: Iterable[bytes]) -> TelemetryBatch:
+    """Decode raw MQTT payloads into a single columnar batch, skipping bad payloads."""
+    decoder = TelemetryDecoder()
+    for raw_payload in raw_messages:
+        try:
+            decoder.add_message(orjson.loads(raw_payload))
+        except orjson.JSONDecodeError:
+            continue
+    return decoder.build()
+
+
+__all__ = [
+    "TelemetryBatch",
+    "TelemetryDecoder",
+    "TelemetrySchema",
+    "SchemaResolver",
+    "schema_resolver",
+    "scan_point",
+    "decode_telemetry_batch",
+    "timestamp_to_epoch",
+    "timestamps_to_epoch",
+    "epoch_to_datetime",
+    "epoch_to_iso",
+    "FORCE_NEWTON_KEYS",
+    "DEFAULT_FRONTEND_DEVICE_ID",
+]
@@ -0,0 +1,168 @@
+"""Versioned binary telemetry frames published alongside JSON on device_data topics.
+
+Frame layout (little-endian), version 1:
+
+    header   24 bytes  magic "BYTF", version u8, flags u8, device_id length u16,
+                       sequence u32, sample count u32, base_time f64 (UTC epoch s)
+    device_id          UTF-8, zero-padded to a multiple of 8 bytes
+    displacement       count x f8 (or f4 with FLAG_FLOAT32), publisher units (mm)
+    force              count x f8 (or f4 with FLAG_FLOAT32), mN (or N with FLAG_FORCE_NEWTON)
+    dt                 count x f4, seconds since base_time
+    bits               count x u1, bit0 phase, bit1 motor_working,
+                       bit2 state present, bit3 state value
+
+Arrays are read in place with np.frombuffer; only the unit scaling allocates.
+"""
+
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.telemetry import TelemetryBatch, STATE_ABSENT
+
+FRAME_MAGIC = b"BYTF"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<4sBBHIId")
+
+# Header flag bits.
+FLAG_FLOAT32 = 0x01
+FLAG_FORCE_NEWTON = 0x02
+
+# Per-sample bitfield layout.
+BIT_PHASE = 0x01
+BIT_MOTOR = 0x02
+BIT_STATE_PRESENT = 0x04
+BIT_STATE_VALUE = 0x08
+
+
+def is_telemetry_frame(payload: bytes) -> bool:
+    """True when a raw MQTT payload is a binary frame rather than JSON."""
+    return payload[:4] == FRAME_MAGIC
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+def encode_frame(
+    device_id: str,
+    sequence: int,
+    base_time: float,
+    dt,
+    displacement,
+    force,
+    phase=None,
+    motor_working=None,
+    state=None,
+    float32: bool = False,
+    force_newton: bool = False,
+) -> bytes:
+    """Pack one frame; state entries < 0 are encoded as absent."""
+    count = len(dt)
+    value_dtype = "<f4" if float32 else "<f8"
+    bits = np.zeros(count, dtype=np.uint8)
+    if phase is not None:
+        bits |= (np.asarray(phase) == 1).astype(np.uint8) * BIT_PHASE
+    if motor_working is not None:
+        bits |= (np.asarray(motor_working) == 1).astype(np.uint8) * BIT_MOTOR
+    if state is not None:
+        state = np.asarray(state)
+        bits |= (state >= 0).astype(np.uint8) * BIT_STATE_PRESENT
+        bits |= (state == 1).astype(np.uint8) * BIT_STATE_VALUE
+
+    device_bytes = device_id.encode("utf-8")
+    flags = (FLAG_FLOAT32 if float32 else 0) | (FLAG_FORCE_NEWTON if force_newton else 0)
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, flags, len(device_bytes),
+        sequence & 0xFFFFFFFF, count, float(base_time),
+    )
+    return b"".join((
+        header,
+        device_bytes.ljust(_padded(len(device_bytes)), b"\0"),
+        np.asarray(displacement, dtype=value_dtype).tobytes(),
+        np.asarray(force, dtype=value_dtype).tobytes(),
+        np.asarray(dt, dtype="<f4").tobytes(),
+        bits.tobytes(),
+    ))
+
+
+def decode_frame_header(payload: bytes) -> dict:
+    """Return header fields of a frame without touching the sample arrays."""
+    magic, version, flags, id_len, sequence, count, base_time = FRAME_HEADER.unpack_from(payload, 0)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Not a telemetry frame")
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported telemetry frame version {version}")
+    offset = FRAME_HEADER.size
+    device_id = bytes(payload[offset:offset + id_len]).decode("utf-8")
+    return {
+        "version": version,
+        "flags": flags,
+        "device_id": device_id,
+        "sequence": sequence,
+        "count": count,
+        "base_time": base_time,
+        "data_offset": offset + _padded(id_len),
+    }
+
+
+def decode_frame(payload: bytes) -> TelemetryBatch:
+    """Decode a frame into a single-device TelemetryBatch in canonical units (µm, µN)."""
+    header = decode_frame_header(payload)
+    count = header["count"]
+    flags = header["flags"]
+    value_dtype = np.dtype("<f4" if flags & FLAG_FLOAT32 else "<f8")
+    offset = header["data_offset"]
+    expected = offset + count * (2 * value_dtype.itemsize + 4 + 1)
+    if len(payload) < expected:
+        raise ValueError(f"Truncated telemetry frame: {len(payload)} < {expected} bytes")
+
+    displacement = np.frombuffer(payload, dtype=value_dtype, count=count, offset=offset)
+    offset += count * value_dtype.itemsize
+    force = np.frombuffer(payload, dtype=value_dtype, count=count, offset=offset)
+    offset += count * value_dtype.itemsize
+    dt = np.frombuffer(payload, dtype="<f4", count=count, offset=offset)
+    offset += count * 4
+    bits = np.frombuffer(payload, dtype=np.uint8, count=count, offset=offset)
+
+    force_scale = 1_000_000.0 if flags & FLAG_FORCE_NEWTON else 1000.0
+    state = np.where(bits & BIT_STATE_PRESENT, (bits & BIT_STATE_VALUE) >> 3, STATE_ABSENT).astype(np.int8)
+    return TelemetryBatch(
+        device_ids=[header["device_id"]],
+        device_codes=np.zeros(count, dtype=np.int32),
+        timestamp=header["base_time"] + dt.astype(np.float64),
+        displacement=displacement * 1000.0,
+        force=force * force_scale,
+        phase=(bits & BIT_PHASE).astype(np.int8),
+        motor_working=((bits & BIT_MOTOR) >> 1).astype(np.int8),
+        state=state,
+    )
+
+
+class FrameSequenceTracker:
+    """Tracks the last sequence number per device to count frames lost in transit."""
+
+    def __init__(self):
+        self._last: Dict[str, int] = {}
+
+    def observe(self, device_id: str, sequence: int) -> int:
+        """Record a frame; returns how many frames were skipped since the previous one."""
+        previous: Optional[int] = self._last.get(device_id)
+        self._last[device_id] = sequence
+        if previous is None:
+            return 0
+        gap = (sequence - previous - 1) & 0xFFFFFFFF
+        # Publisher restarts reset the sequence; treat large jumps as a new stream.
+        return gap if gap < 0x10000 else 0
+
+
+__all__ = [
+    "FRAME_MAGIC",
+    "FRAME_VERSION",
+    "is_telemetry_frame",
+    "encode_frame",
+    "decode_frame",
+    "decode_frame_header",
+    "FrameSequenceTracker",
+]
@@ -0,0 +1,382 @@
+"""Per-user WebSocket fan-out: merge device batches per tick, encode once, share bytes.
+
+Device broadcasters submit their columnar batches to the fan-out of the user
+that owns the device. Each user fan-out wakes on the first submission, waits
+one short tick so other devices of the same user can join, then serializes
+and compresses a single frame and sends the same bytes to every socket in
+websocket_connections[user].
+
+Every socket has its own SocketSender task and bounded outbound queue, so a
+slow browser tab never holds up the fan-out or other sockets of the user.
+When a socket's queue is full its pending frames are coalesced into one frame
+(latest window or decimated window per device) instead of growing a backlog.
+
+Sockets that negotiated a level of detail or wire format in their first /ws
+message are grouped by both; each group's frame is decimated and encoded once.
+"""
+
+import asyncio
+import time
+import zlib
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from app.config import settings
+from app.debug_log import debug_log
+from app.decimation import LevelOfDetail
+from app.ws_frame import encode_ws_frame
+from app.telemetry import TelemetryBatch
+from app.websocket_manager import websocket_connections
+
+# How long a user fan-out waits after the first device batch for others to join
+FANOUT_TICK = 0.02
+COMPRESSION_THRESHOLD = 1000  # Compress if payload > 1000 bytes
+COMPRESSION_LEVEL = 6  # zlib compression level (1-9, 6 is balanced)
+
+# Wire formats a socket can negotiate with {"format": ...}; JSON is the default.
+WIRE_FORMATS = ("json", "binary")
+
+
+def encode_payload(messages: list) -> Tuple[bytes, int]:
+    """Serialize records with orjson and zlib-compress large payloads; returns (wire bytes, raw length)."""
+    message_data = orjson.dumps(messages)
+    if len(message_data) > COMPRESSION_THRESHOLD:
+        return zlib.compress(message_data, level=COMPRESSION_LEVEL), len(message_data)
+    return message_data, len(message_data)
+
+
+def encode_batch(batch: TelemetryBatch, wire_format: str = "json") -> Tuple[bytes, int]:
+    """Encode a batch in a socket's negotiated wire format; returns (wire bytes, raw length)."""
+    if wire_format == "binary":
+        return encode_ws_frame(batch)
+    return encode_payload(batch.to_records())
+
+
+class FanoutCounters:
+    """Totals for encode work done once per frame and the work that sharing avoided."""
+
+    def __init__(self):
+        self.frames = 0
+        self.device_blocks = 0
+        self.rows = 0
+        self.socket_sends = 0
+        self.encode_seconds = 0.0
+        # Estimated encode time a per-socket encode would have spent on top.
+        self.encode_seconds_saved = 0.0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.start_time = time.time()
+
+    def get_stats(self):
+        elapsed = time.time() - self.start_time
+        per_sec = (lambda value: value / elapsed) if elapsed > 0 else (lambda value: 0)
+        return {
+            "fanout_frames": self.frames,
+            # Frames a per-device broadcast would have sent; merging avoided the difference.
+            "fanout_device_blocks": self.device_blocks,
+            "fanout_frames_saved": self.device_blocks - self.frames,
+            "fanout_rows": self.rows,
+            "fanout_socket_sends": self.socket_sends,
+            "fanout_encode_seconds": self.encode_seconds,
+            "fanout_encode_seconds_saved": self.encode_seconds_saved,
+            "fanout_raw_bytes_per_sec": per_sec(self.raw_bytes),
+            "fanout_wire_bytes_per_sec": per_sec(self.wire_bytes),
+            "fanout_compression_bytes_saved_per_sec": per_sec(self.raw_bytes - self.wire_bytes),
+        }
+
+
+fanout_counters = FanoutCounters()
+
+
+class OutboundFrame:
+    """Encoded bytes shared across sockets plus the rows they carry, for coalescing."""
+
+    __slots__ = ("payload", "batch", "queued_at")
+
+    def __init__(self, payload: bytes, batch: TelemetryBatch):
+        self.payload = payload
+        self.batch = batch
+        self.queued_at = time.monotonic()
+
+
+def coalesce_batch(batch: TelemetryBatch, max_rows: int, mode: str) -> TelemetryBatch:
+    """
+    Shrink a backlog to at most max_rows, split evenly across its devices.
+
+    "latest" keeps each device's newest rows; "decimate" keeps evenly spaced
+    rows over the whole window so the chart still spans the lagged period.
+    """
+    if len(batch) <= max_rows:
+        return batch
+    per_device = batch.split_by_device()
+    share = max(1, max_rows // len(per_device))
+    parts = []
+    for rows in per_device.values():
+        if len(rows) <= share:
+            parts.append(rows)
+        elif mode == "decimate":
+            parts.append(rows.take(np.linspace(0, len(rows) - 1, share).astype(np.int64)))
+        else:
+            parts.append(rows.take(slice(len(rows) - share, None)))
+    return TelemetryBatch.concat(parts)
+
+
+class SocketSender:
+    """Owns one WebSocket's outbound queue and the task that drains it."""
+
+    def __init__(
+        self,
+        user_id: str,
+        websocket,
+        max_frames: int,
+        coalesce_mode: str,
+        coalesce_rows: int,
+        lod: Optional[LevelOfDetail] = None,
+        wire_format: str = "json",
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        # None streams every raw point; otherwise frames are decimated to this budget.
+        self.lod = lod
+        self.wire_format = wire_format
+        self.max_frames = max_frames
+        self.coalesce_mode = coalesce_mode
+        self.coalesce_rows = coalesce_rows
+        self._frames: Deque[OutboundFrame] = deque()
+        self._event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        # Monitoring
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_coalesced = 0
+        self.rows_dropped = 0
+        self.send_errors = 0
+        self.max_queue_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def offer(self, frame: OutboundFrame):
+        """Queue a shared frame; coalesce the backlog instead of letting it grow past max_frames."""
+        if self.closed:
+            return
+        if len(self._frames) >= self.max_frames:
+            self._coalesce(frame)
+        else:
+            self._frames.append(frame)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._frames))
+        self._event.set()
+
+    def _coalesce(self, frame: OutboundFrame):
+        pending = [queued.batch for queued in self._frames] + [frame.batch]
+        oldest = self._frames[0].queued_at if self._frames else frame.queued_at
+        self._frames.clear()
+        backlog = TelemetryBatch.concat(pending)
+        kept = coalesce_batch(backlog, self.coalesce_rows, self.coalesce_mode)
+        dropped = len(backlog) - len(kept)
+        # The coalesced frame is specific to this socket, so it is encoded here.
+        payload, _ = encode_batch(kept, self.wire_format)
+        merged = OutboundFrame(payload, kept)
+        merged.queued_at = oldest
+        self._frames.append(merged)
+        self.frames_coalesced += len(pending)
+        self.rows_dropped += dropped
+        if dropped:
+            from app.metrics import record_message_loss
+            record_message_loss("ws_slow_consumer", dropped)
+
+    async def run(self):
+        while not self.closed:
+            if not self._frames:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            frame = self._frames.popleft()
+            self.last_lag = time.monotonic() - frame.queued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+            try:
+                await self.websocket.send_bytes(frame.payload)
+                self.frames_sent += 1
+                self.bytes_sent += len(frame.payload)
+            except Exception as e:
+                self.send_errors += 1
+                print(f"[FANOUT] Send to socket of user {self.user_id} failed, closing sender: {e}")
+                self.close()
+                forget_socket(self.user_id, self.websocket)
+
+    def close(self):
+        self.closed = True
+        self._frames.clear()
+        self._event.set()
+        socket_senders.pop(self.websocket, None)
+
+    def get_stats(self) -> dict:
+        queued_for = time.monotonic() - self._frames[0].queued_at if self._frames else 0.0
+        return {
+            "user_id": self.user_id,
+            "client": str(getattr(self.websocket, "client", "")),
+            "format": self.wire_format,
+            "lod": {"mode": self.lod.mode, "max_points_per_sec": self.lod.max_points_per_sec} if self.lod else None,
+            "queue_depth": len(self._frames),
+            "max_queue_depth": self.max_queue_depth,
+            "lag_seconds": queued_for,
+            "last_send_lag_seconds": self.last_lag,
+            "max_send_lag_seconds": self.max_lag,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_coalesced": self.frames_coalesced,
+            "rows_dropped": self.rows_dropped,
+            "send_errors": self.send_errors,
+        }
+
+
+# One sender per live WebSocket object
+socket_senders: Dict[object, SocketSender] = {}
+
+
+def get_socket_sender(
+    user_id: str,
+    websocket,
+    lod: Optional[LevelOfDetail] = None,
+    wire_format: str = "json",
+) -> SocketSender:
+    """Return the sender for a socket, starting its task on first use."""
+    sender = socket_senders.get(websocket)
+    if sender is None:
+        sender = SocketSender(
+            user_id,
+            websocket,
+            max_frames=settings.WS_SEND_QUEUE_FRAMES,
+            coalesce_mode=settings.WS_COALESCE_MODE,
+            coalesce_rows=settings.WS_COALESCE_MAX_ROWS,
+            lod=lod,
+            wire_format=wire_format if wire_format in WIRE_FORMATS else "json",
+        )
+        socket_senders[websocket] = sender
+        sender.task = asyncio.create_task(sender.run())
+    return sender
+
+
+def forget_socket(user_id: str, websocket):
+    """Remove a socket from websocket_connections so the fan-out stops considering it."""
+    sockets = websocket_connections.get(user_id)
+    if sockets is not None:
+        sockets.discard(websocket)
+        if not sockets:
+            websocket_connections.pop(user_id, None)
+
+
+def close_socket_sender(websocket):
+    """Stop the sender of a disconnected socket and drop its backlog."""
+    sender = socket_senders.get(websocket)
+    if sender is not None:
+        sender.close()
+        if sender.task is not None:
+            sender.task.cancel()
+
+
+def get_socket_sender_stats() -> List[dict]:
+    """Per-socket queue depth, lag and drop counters for /monitoring/stats."""
+    return [sender.get_stats() for sender in list(socket_senders.values())]
+
+
+class UserFanout:
+    """Collects device batches for one user and sends one shared frame per tick."""
+
+    def __init__(self, user_id: str, tick: float = FANOUT_TICK):
+        self.user_id = user_id
+        self.tick = tick
+        self._blocks: List[TelemetryBatch] = []
+        self._event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self._last_flush: Optional[float] = None
+
+    def submit(self, batch: TelemetryBatch):
+        """Queue a device batch for the next frame; never waits on sockets."""
+        self._blocks.append(batch)
+        self._event.set()
+
+    async def run(self):
+        while True:
+            await self._event.wait()
+            # Give the user's other devices one tick to contribute to this frame.
+            await asyncio.sleep(self.tick)
+            self._event.clear()
+            blocks, self._blocks = self._blocks, []
+            if blocks:
+                try:
+                    await self.flush(blocks)
+                except Exception as e:
+                    print(f"[FANOUT] Error sending frame to user {self.user_id}: {e}")
+
+    async def flush(self, blocks: List[TelemetryBatch]):
+        websockets = list(websocket_connections.get(self.user_id, ()))
+        if not websockets:
+            debug_log(f"No active websocket connections found for user {self.user_id}")
+            return
+
+        # Time span this frame covers, used to size decimation budgets.
+        now = time.monotonic()
+        interval = self.tick if self._last_flush is None else min(max(now - self._last_flush, self.tick), 1.0)
+        self._last_flush = now
+
+        merged = TelemetryBatch.concat(blocks)
+        groups: Dict[object, List[SocketSender]] = {}
+        for ws in websockets:
+            # Sockets register their sender on connect; no sender means it failed and was closed.
+            sender = socket_senders.get(ws)
+            if sender is None or sender.closed:
+                forget_socket(self.user_id, ws)
+                continue
+            key = (sender.lod.key if sender.lod else None, sender.wire_format)
+            groups.setdefault(key, []).append(sender)
+
+        from app.metrics import record_fanout_frame
+        fanout_counters.device_blocks += len(blocks)
+        for senders in groups.values():
+            started = time.perf_counter()
+            lod = senders[0].lod
+            rows = lod.apply(merged, interval) if lod else merged
+            payload, raw_len = encode_batch(rows, senders[0].wire_format)
+            encode_time = time.perf_counter() - started
+
+            fanout_counters.frames += 1
+            fanout_counters.rows += len(rows)
+            fanout_counters.socket_sends += len(senders)
+            fanout_counters.encode_seconds += encode_time
+            fanout_counters.encode_seconds_saved += encode_time * (len(senders) - 1)
+            fanout_counters.raw_bytes += raw_len * len(senders)
+            fanout_counters.wire_bytes += len(payload) * len(senders)
+            record_fanout_frame(len(blocks), len(senders), encode_time, raw_len, len(payload))
+
+            debug_log(
+                f"[FANOUT] user {self.user_id}: {len(rows)}/{len(merged)} rows from {len(blocks)} blocks, "
+                f"{raw_len} -> {len(payload)} bytes x {len(senders)} sockets"
+            )
+            # Each socket drains its own queue; a slow one only delays itself.
+            frame = OutboundFrame(payload, rows)
+            for sender in senders:
+                sender.offer(frame)
+
+
+# One fan-out per user id (string, matching websocket_connections keys)
+user_fanouts: Dict[str, UserFanout] = {}
+
+
+def get_user_fanout(user_id: str) -> UserFanout:
+    """Return the fan-out for a user, starting its sender task on first use."""
+    fanout = user_fanouts.get(user_id)
+    if fanout is None:
+        fanout = UserFanout(user_id)
+        user_fanouts[user_id] = fanout
+    if fanout.task is None or fanout.task.done():
+        fanout.task = asyncio.create_task(fanout.run())
+    return fanout
+
+
+def get_fanout_stats():
+    """Get fan-out encode and bandwidth statistics."""
+    return fanout_counters.get_stats()
@@ -0,0 +1,198 @@
+"""Compact binary WebSocket frames for the live telemetry stream.
+
+Negotiated per socket with {"format": "binary"} in the first /ws message;
+JSON stays the default. Frame layout (little-endian), version 1:
+
+    header    12 bytes  magic "BYWS", version u8, flags u8, device count u16,
+                        total rows u32
+    body                zlib-compressed when FLAG_ZLIB is set, then per device:
+
+    section header      device_id length u16, device_id UTF-8, rows u32,
+                        base_time f8 (UTC epoch s), time tick f8 (s),
+                        displacement quantum f8 (µm), force quantum f8 (µN),
+                        byte lengths u32 x 3 of the three varint streams
+    timestamp stream    zigzag varint deltas of round((t - base_time) / tick)
+    displacement stream zigzag varint deltas of round(displacement / quantum)
+    force stream        zigzag varint deltas of round(force / quantum)
+    bit planes          4 x ceil(rows / 8) bytes from np.packbits: phase,
+                        motor_working, state present, state value
+
+The first delta of each stream is relative to zero. Values are quantized, so
+a round trip is exact to half a quantum; NaN is sent as 0.
+"""
+
+import struct
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from app.telemetry import TelemetryBatch, STATE_ABSENT
+
+WS_FRAME_MAGIC = b"BYWS"
+WS_FRAME_VERSION = 1
+WS_FRAME_HEADER = struct.Struct("<4sBBHI")
+WS_SECTION_HEADER = struct.Struct("<Idddd3I")
+
+# Header flag bits.
+FLAG_ZLIB = 0x01
+
+# Default quantization: 1 µs timestamps, 1 nm displacement, 1 nN force.
+TIME_TICK_S = 1e-6
+DISPLACEMENT_QUANTUM_UM = 1e-3
+FORCE_QUANTUM_UN = 1e-3
+
+# Frames smaller than this are sent uncompressed.
+ZLIB_THRESHOLD = 1000
+ZLIB_LEVEL = 6
+
+
+# ── Varint helpers (vectorized) ───────────────────────────────────────────────
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """LEB128-encode unsigned 64-bit values, one pass per output byte position."""
+    values = values.astype(np.uint64)
+    if not len(values):
+        return b""
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    offsets = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(int(sizes.max())):
+        rows = np.flatnonzero(sizes > k)
+        chunk = ((values[rows] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        chunk[sizes[rows] > k + 1] |= 0x80
+        out[offsets[rows] + k] = chunk
+    return out.tobytes()
+
+
+def varint_decode(data: bytes, count: int) -> np.ndarray:
+    """Inverse of varint_encode for exactly `count` values."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf < 0x80)
+    if len(ends) != count:
+        raise ValueError(f"Varint stream holds {len(ends)} values, expected {count}")
+    starts = np.concatenate(([0], ends[:-1] + 1)) if count else ends
+    sizes = ends - starts + 1
+    values = np.zeros(count, dtype=np.uint64)
+    for k in range(int(sizes.max()) if count else 0):
+        rows = np.flatnonzero(sizes > k)
+        values[rows] |= (buf[starts[rows] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+def _delta_stream(quantized: np.ndarray) -> bytes:
+    return varint_encode(zigzag_encode(np.diff(quantized, prepend=0)))
+
+
+def _undelta_stream(data: bytes, count: int) -> np.ndarray:
+    return np.cumsum(zigzag_decode(varint_decode(data, count)))
+
+
+# ── Frame encode / decode ─────────────────────────────────────────────────────
+
+def _encode_section(device_id: str, rows: TelemetryBatch) -> bytes:
+    count = len(rows)
+    base_time = float(rows.timestamp[0]) if count else 0.0
+    ticks = np.rint((rows.timestamp - base_time) / TIME_TICK_S).astype(np.int64)
+    displacement = np.rint(np.nan_to_num(rows.displacement) / DISPLACEMENT_QUANTUM_UM).astype(np.int64)
+    force = np.rint(np.nan_to_num(rows.force) / FORCE_QUANTUM_UN).astype(np.int64)
+    streams = [_delta_stream(ticks), _delta_stream(displacement), _delta_stream(force)]
+    state = rows.state
+    planes = np.concatenate((
+        np.packbits(rows.phase == 1),
+        np.packbits(rows.motor_working == 1),
+        np.packbits(state != STATE_ABSENT),
+        np.packbits(state == 1),
+    ))
+    device_bytes = device_id.encode("utf-8")
+    return b"".join((
+        struct.pack("<H", len(device_bytes)),
+        device_bytes,
+        WS_SECTION_HEADER.pack(
+            count, base_time, TIME_TICK_S, DISPLACEMENT_QUANTUM_UM, FORCE_QUANTUM_UN,
+            *(len(stream) for stream in streams),
+        ),
+        *streams,
+        planes.tobytes(),
+    ))
+
+
+def encode_ws_frame(batch: TelemetryBatch, compress: bool = True) -> Tuple[bytes, int]:
+    """Encode a (multi-device) batch; returns (wire bytes, uncompressed length)."""
+    sections = [
+        _encode_section(device_id, rows)
+        for device_id, rows in batch.split_by_device().items()
+    ] if len(batch) else []
+    body = b"".join(sections)
+    flags = 0
+    raw_len = WS_FRAME_HEADER.size + len(body)
+    if compress and len(body) > ZLIB_THRESHOLD:
+        body = zlib.compress(body, level=ZLIB_LEVEL)
+        flags |= FLAG_ZLIB
+    header = WS_FRAME_HEADER.pack(WS_FRAME_MAGIC, WS_FRAME_VERSION, flags, len(sections), len(batch))
+    return header + body, raw_len
+
+
+def decode_ws_frame(frame: bytes) -> List[dict]:
+    """Reference decoder: returns one dict of NumPy columns per device section."""
+    magic, version, flags, sections, _ = WS_FRAME_HEADER.unpack_from(frame, 0)
+    if magic != WS_FRAME_MAGIC:
+        raise ValueError("Not a WebSocket telemetry frame")
+    if version != WS_FRAME_VERSION:
+        raise ValueError(f"Unsupported WebSocket frame version {version}")
+    body = frame[WS_FRAME_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    devices = []
+    offset = 0
+    for _ in range(sections):
+        (id_len,) = struct.unpack_from("<H", body, offset)
+        offset += 2
+        device_id = body[offset:offset + id_len].decode("utf-8")
+        offset += id_len
+        count, base_time, tick, d_quantum, f_quantum, t_len, d_len, f_len = WS_SECTION_HEADER.unpack_from(body, offset)
+        offset += WS_SECTION_HEADER.size
+        ticks = _undelta_stream(body[offset:offset + t_len], count)
+        offset += t_len
+        displacement = _undelta_stream(body[offset:offset + d_len], count)
+        offset += d_len
+        force = _undelta_stream(body[offset:offset + f_len], count)
+        offset += f_len
+        plane = (count + 7) // 8
+        bits = np.unpackbits(np.frombuffer(body, dtype=np.uint8, count=4 * plane, offset=offset)).reshape(4, -1)[:, :count]
+        offset += 4 * plane
+        devices.append({
+            "device_id": device_id,
+            "timestamp": base_time + ticks * tick,
+            "displacement": displacement * d_quantum,
+            "force": force * f_quantum,
+            "phase": bits[0].astype(np.int8),
+            "motor_working": bits[1].astype(np.int8),
+            "state": np.where(bits[2] == 1, bits[3], STATE_ABSENT).astype(np.int8),
+        })
+    return devices
+
+
+__all__ = [
+    "WS_FRAME_MAGIC",
+    "WS_FRAME_VERSION",
+    "encode_ws_frame",
+    "decode_ws_frame",
+    "varint_encode",
+    "varint_decode",
+    "zigzag_encode",
+    "zigzag_decode",
+]
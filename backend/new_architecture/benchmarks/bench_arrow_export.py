@@ -0,0 +1,89 @@
+"""
+Benchmark: columnar (Parquet, Arrow IPC) vs HDF5 folder export and notebook load time.
+
+Builds a synthetic folder (see bench_folder_export) in a temporary SQLite
+database, then times each export path from the database and loading the
+result the way an analysis notebook would:
+
+  parquet   write_folder_parquet         -> pandas.read_parquet
+  arrow     stream_folder_arrow (bytes)  -> pyarrow.ipc.open_stream().read_all()
+  hdf5      export_folder_to_hdf5        -> h5py, every Force / Z dataset
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_arrow_export [rows]     (default: 1000000)
+"""
+
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROWS = 1_000_000
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+async def timed_async(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+async def run(tmp: str):
+    import h5py
+    import pandas as pd
+    import pyarrow as pa
+
+    from app.arrow_export import stream_folder_arrow, write_folder_parquet
+    from app.db import export_folder_to_hdf5
+
+    async def collect_arrow():
+        return b"".join([part async for part in stream_folder_arrow(1)])
+
+    def read_hdf5(path):
+        with h5py.File(path, "r") as hdf:
+            return sum(len(segment[name][:]) for curve in hdf.values() for segment in curve.values()
+                       if isinstance(segment, h5py.Group) and "Force" in segment for name in ("Force", "Z"))
+
+    parquet_path = os.path.join(tmp, "folder.parquet")
+    hdf5_path = os.path.join(tmp, "folder.hdf5")
+    results = []
+
+    _, export_seconds = await timed_async(write_folder_parquet(parquet_path, 1))
+    frame, load_seconds = timed(pd.read_parquet, parquet_path)
+    results.append(("parquet", export_seconds, os.path.getsize(parquet_path), load_seconds, len(frame)))
+
+    stream, export_seconds = await timed_async(collect_arrow())
+    table, load_seconds = timed(lambda data: pa.ipc.open_stream(io.BytesIO(data)).read_all(), stream)
+    results.append(("arrow", export_seconds, len(stream), load_seconds, table.num_rows))
+
+    _, export_seconds = await timed_async(export_folder_to_hdf5(hdf5_path, 1, 1))
+    values, load_seconds = timed(read_hdf5, hdf5_path)
+    results.append(("hdf5", export_seconds, os.path.getsize(hdf5_path), load_seconds, values // 2))
+
+    print(f"{'format':>8} {'export':>9} {'size':>9} {'load':>9} {'rows':>11}")
+    for name, export_seconds, size, load_seconds, rows in results:
+        print(f"{name:>8} {export_seconds:>8.2f}s {size / 1e6:>7.1f}MB {load_seconds * 1000:>7.0f}ms {rows:>11,}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "export.db")
+        # Settings are read at import, so the database URL must be set first.
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        from benchmarks.bench_folder_export import build_database
+
+        asyncio.run(build_database(db_path, rows))
+        print(f"{rows:,} rows, 20 curves")
+        asyncio.run(run(tmp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: CPU cost of per-device broadcasters, idle and active.
+
+Runs N broadcaster tasks on one event loop with the WebSocket send and the
+owner lookup stubbed out, and reports process CPU time per wall second for
+the ring-buffer broadcaster against the previous wait_for polling loop over
+an asyncio.Queue.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_broadcaster_idle [seconds]
+"""
+
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+import app.message_processor as mp
+from app.telemetry import TelemetryBatch, STATE_ABSENT
+
+WINDOW_SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+ACTIVE_POINTS_PER_SEC = 1000
+ACTIVE_BLOCK_ROWS = 50
+
+
+async def _noop_send(client_id, messages):
+    return None
+
+
+class _NullSocket:
+    async def send_bytes(self, data):
+        return None
+
+
+async def _resolve(device_id):
+    return "bench"
+
+
+# asyncio.Queue per device for the legacy broadcaster only.
+legacy_queues = {}
+
+
+async def legacy_polling_broadcaster(device_id: str):
+    """The previous collection loop: 5 ms wait_for polls plus 0.5 ms sleeps."""
+    queue = legacy_queues[device_id]
+    while True:
+        blocks = []
+        start_time = time.time()
+        while sum(len(b) for b in blocks) < 2000 and (time.time() - start_time) < 0.05:
+            try:
+                blocks.append(await asyncio.wait_for(queue.get(), timeout=0.005))
+            except asyncio.TimeoutError:
+                await asyncio.sleep(0.0005)
+        if blocks:
+            await mp.send_to_connected_clients_optimized("bench", TelemetryBatch.concat(blocks).to_records())
+        else:
+            await asyncio.sleep(0.005)
+
+
+def make_block(device_id, rows):
+    now = time.time()
+    return TelemetryBatch(
+        device_ids=[device_id],
+        device_codes=np.zeros(rows, dtype=np.int32),
+        timestamp=np.full(rows, now),
+        displacement=np.random.rand(rows),
+        force=np.random.rand(rows),
+        phase=np.zeros(rows, dtype=np.int8),
+        motor_working=np.ones(rows, dtype=np.int8),
+        state=np.full(rows, STATE_ABSENT, dtype=np.int8),
+    )
+
+
+async def feed(device_ids, legacy):
+    interval = ACTIVE_BLOCK_ROWS / ACTIVE_POINTS_PER_SEC
+    while True:
+        for device_id in device_ids:
+            block = make_block(device_id, ACTIVE_BLOCK_ROWS)
+            if legacy:
+                legacy_queues[device_id].put_nowait(block)
+            else:
+                await mp.device_rings[device_id].write(block, persist=False)
+        await asyncio.sleep(interval)
+
+
+async def run_case(broadcaster, idle, active):
+    legacy = broadcaster is legacy_polling_broadcaster
+    legacy_queues.clear()
+    mp.device_rings.clear()
+    device_ids = [f"dev{i}" for i in range(idle + active)]
+    for device_id in device_ids:
+        legacy_queues[device_id] = asyncio.Queue()
+        mp.get_device_ring(device_id)
+    tasks = [asyncio.create_task(broadcaster(device_id)) for device_id in device_ids]
+    if active:
+        tasks.append(asyncio.create_task(feed(device_ids[idle:], legacy)))
+    await asyncio.sleep(0.2)  # warm-up
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    await asyncio.sleep(WINDOW_SECONDS)
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return cpu / wall * 100.0
+
+
+async def main():
+    mp.send_to_connected_clients_optimized = _noop_send
+    mp._resolve_user_id_for_device = _resolve
+    mp.websocket_connections["bench"] = {_NullSocket()}
+
+    cases = [(1, 0), (10, 0), (100, 0), (0, 10)]
+    print(f"CPU % of one core over {WINDOW_SECONDS:.0f}s windows")
+    print(f"{'case':<22}{'polling':>10}{'ring buffer':>14}")
+    for idle, active in cases:
+        label = f"{idle} idle" if idle else f"{active} active @{ACTIVE_POINTS_PER_SEC}/s"
+        legacy = await run_case(legacy_polling_broadcaster, idle, active)
+        current = await run_case(mp.broadcast_messages, idle, active)
+        print(f"{label:<22}{legacy:>9.1f}%{current:>13.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark: device_data rows vs curve_chunks blobs, write rate, read rate and file size.
+
+Each layout saves the same curve (ROWS samples, 500-sample batches like the
+saver) into a fresh SQLite file database, then reads it back the way the
+folder export does. Reported: write rows/s, read rows/s and database bytes
+per sample. Samples are a synthetic approach/retract ramp with sensor noise.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_curve_chunks [rows]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.bulk_writer import SQLiteChunkedWriter
+from app.curve_chunks import CurveChunkWriter, decode_chunk, load_curve_chunks
+from app.message_processor import build_device_data_rows
+from app.models import Base, DeviceData, Folder, IoTDevice
+from app.telemetry import TelemetryBatch
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+BATCH_ROWS = 500
+DEVICE_ID = "bench-device"
+
+
+def make_batches():
+    rng = np.random.default_rng(0)
+    half = ROWS // 2
+    displacement = np.concatenate([np.linspace(0, 50, half), np.linspace(50, 0, ROWS - half)])
+    force = displacement * 20 + rng.normal(0, 0.5, ROWS)
+    phase = (np.arange(ROWS) >= half).astype(np.int8)
+    for start in range(0, ROWS, BATCH_ROWS):
+        end = min(start + BATCH_ROWS, ROWS)
+        count = end - start
+        yield TelemetryBatch(
+            device_ids=[DEVICE_ID],
+            device_codes=np.zeros(count, dtype=np.int32),
+            timestamp=1.7e9 + np.arange(start, end) * 1e-4,
+            displacement=displacement[start:end],
+            force=force[start:end],
+            phase=phase[start:end],
+            motor_working=np.ones(count, dtype=np.int8),
+            state=np.full(count, -1, dtype=np.int8),
+        )
+
+
+async def run_layout(label, path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessions() as db:
+        db.add(IoTDevice(id=DEVICE_ID, device_name="bench", device_type="sensor", device_token="bench-token"))
+        folder = Folder(name="bench", user_id=1)
+        db.add(folder)
+        await db.commit()
+        folder_id = folder.id
+
+    rows_writer = SQLiteChunkedWriter()
+    chunk_writer = CurveChunkWriter(4096)
+    started = time.perf_counter()
+    for batch in make_batches():
+        async with sessions() as db:
+            if label == "rows":
+                await rows_writer.write(db, build_device_data_rows(DEVICE_ID, batch, folder_id, 0))
+            else:
+                await chunk_writer.write(db, DEVICE_ID, batch, folder_id, 0)
+            await db.commit()
+    write_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    async with sessions() as db:
+        if label == "rows":
+            result = await db.execute(
+                select(DeviceData).where(DeviceData.folder_id == folder_id)
+                .order_by(DeviceData.curve_index, DeviceData.timestamp)
+            )
+            read = len([(row.force, row.displacement) for row in result.scalars().all()])
+        else:
+            read = sum(len(decode_chunk(chunk)["force"]) for chunk in await load_curve_chunks(db, folder_id=folder_id))
+    read_elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    size = os.path.getsize(path)
+    print(f"{label:>7} | write {ROWS / write_elapsed:>10,.0f} rows/s | read {read / read_elapsed:>12,.0f} rows/s"
+          f" | {size / ROWS:>6.1f} bytes/sample ({size / 1e6:.1f} MB)")
+
+
+async def main():
+    print(f"{ROWS:,} samples, {BATCH_ROWS}-sample batches")
+    with tempfile.TemporaryDirectory() as tmp:
+        await run_layout("rows", os.path.join(tmp, "rows.db"))
+        await run_layout("chunks", os.path.join(tmp, "chunks.db"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Benchmark: per-row against vectorized timestamp conversion and DB row building.
+
+For 500, 5k and 50k row batches of ISO-timestamped telemetry, compares:
+
+  per-row     fromisoformat(ts.replace("Z", "+00:00")) per point, then one
+              datetime.fromtimestamp and one dict per row, inserted with
+              insert(DeviceData).values(records)
+  vectorized  timestamps_to_epoch over the whole column, epoch_to_datetime and
+              build_device_data_records, inserted executemany-style
+
+Timestamp parsing alone and the full conversion to rows are timed on their
+own; the insert is timed against a fresh in-memory SQLite database
+(aiosqlite). values() with 50k rows exceeds SQLite's bind-parameter limit.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_db_records
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.message_processor import build_device_data_records
+from app.models import Base, DeviceData, IoTDevice
+from app.telemetry import TelemetryBatch, timestamps_to_epoch
+
+ROW_COUNTS = [500, 5_000, 50_000]
+REPEATS = 3
+
+
+def make_iso_column(rows):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+    return [
+        datetime.fromtimestamp(start + i * 1e-4, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+        for i in range(rows)
+    ]
+
+
+def make_batch(epochs):
+    rows = len(epochs)
+    return TelemetryBatch(
+        device_ids=["bench-device"],
+        device_codes=np.zeros(rows, dtype=np.int32),
+        timestamp=epochs,
+        displacement=np.linspace(0, 50, rows),
+        force=np.linspace(0, 1000, rows),
+        phase=np.zeros(rows, dtype=np.int8),
+        motor_working=np.ones(rows, dtype=np.int8),
+        state=np.full(rows, -1, dtype=np.int8),
+    )
+
+
+def per_row_timestamps(iso_column):
+    return [datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp() for ts in iso_column]
+
+
+def per_row(iso_column, batch):
+    epochs = per_row_timestamps(iso_column)
+    displacement = batch.displacement.tolist()
+    force = batch.force.tolist()
+    phase = batch.phase.tolist()
+    motor = batch.motor_working.tolist()
+    return [
+        {
+            "device_id": "bench-device",
+            "timestamp": datetime.fromtimestamp(epochs[i], tz=timezone.utc).replace(tzinfo=None),
+            "displacement": displacement[i],
+            "force": force[i],
+            "folder_id": None,
+            "curve_index": 0,
+            "phase": phase[i],
+            "motor_working": motor[i],
+        }
+        for i in range(len(epochs))
+    ]
+
+
+def vectorized(iso_column, batch):
+    batch.timestamp = timestamps_to_epoch(iso_column, 0.0)
+    return build_device_data_records("bench-device", batch, None, 0)
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+async def time_insert(records, executemany):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(IoTDevice).values(
+            id="bench-device", device_name="bench", device_type="sensor", device_token="bench",
+        ))
+    try:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            if executemany:
+                await conn.execute(insert(DeviceData), records)
+            else:
+                await conn.execute(insert(DeviceData).values(records))
+        return time.perf_counter() - started
+    except Exception as e:
+        return f"failed ({type(e).__name__})"
+    finally:
+        await engine.dispose()
+
+
+def fmt(value):
+    return f"{value * 1e3:>9.1f} ms" if isinstance(value, float) else f"{value:>12}"
+
+
+async def main():
+    print(f"{'rows':>7} | {'ts per-row':>12} {'vectorized':>12} | {'rows per-row':>12} {'vectorized':>12} |"
+          f" {'insert values()':>16} {'executemany':>12}")
+    for rows in ROW_COUNTS:
+        iso_column = make_iso_column(rows)
+        batch = make_batch(np.zeros(rows))
+        ts_row_time, _ = best_of(per_row_timestamps, iso_column)
+        ts_vec_time, _ = best_of(timestamps_to_epoch, iso_column, 0.0)
+        row_time, row_records = best_of(per_row, iso_column, batch)
+        vec_time, vec_records = best_of(vectorized, iso_column, batch)
+        assert row_records == vec_records, "conversion paths disagree"
+        values_time = await time_insert(row_records, executemany=False)
+        many_time = await time_insert(vec_records, executemany=True)
+        print(f"{rows:>7} | {fmt(ts_row_time)} {fmt(ts_vec_time)} | {fmt(row_time)} {fmt(vec_time)} |"
+              f" {fmt(values_time):>16} {fmt(many_time):>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
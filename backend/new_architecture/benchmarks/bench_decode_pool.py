@@ -0,0 +1,90 @@
+"""
+Benchmark: inline JSON decode against the process-pool decode stage.
+
+Builds ingest batches of 1000-point array payloads (the shape sent by
+frontend1_high_performance_optimized.py) and decodes each batch both inline
+and through DecodePool. Reports wall time per batch and the longest stall the
+event loop saw while decoding, measured by a 1 ms heartbeat task.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_decode_pool [workers]
+"""
+
+import asyncio
+import sys
+import time
+
+import orjson
+
+from app.decode_pool import DecodePool, decode_json_chunk
+
+POINTS_PER_MESSAGE = 1000
+BATCH_SIZES = [1, 10, 50]  # messages per ingest batch
+ROUNDS = 5
+
+
+def make_payload(device_id, start):
+    return orjson.dumps([
+        {
+            "device_id": device_id,
+            "timestamp": 1.7e9 + (start + i) * 1e-4,
+            "displacement": 0.001 * (start + i),
+            "force": 0.5 * ((start + i) % 200),
+            "phase": "loading",
+            "motor_working": True,
+        }
+        for i in range(POINTS_PER_MESSAGE)
+    ])
+
+
+async def heartbeat(stalls):
+    last = time.perf_counter()
+    while True:
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stalls.append(now - last)
+        last = now
+
+
+async def measure(decode, payloads):
+    stalls = []
+    beat = asyncio.create_task(heartbeat(stalls))
+    await asyncio.sleep(0.01)
+    stalls.clear()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        points = await decode(payloads)
+        await asyncio.sleep(0.002)
+    wall = (time.perf_counter() - started) / ROUNDS - 0.002
+    await asyncio.sleep(0.005)
+    beat.cancel()
+    return wall, max(stalls) if stalls else 0.0, points
+
+
+async def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    pool = DecodePool(workers, min_points=0)
+    pool.start()
+    # Let the spawned workers finish importing before timing.
+    await pool.decode([make_payload("warmup", 0)] * workers)
+
+    async def inline(payloads):
+        return len(decode_json_chunk(payloads)[0])
+
+    async def pooled(payloads):
+        batches, _, _ = await pool.decode(payloads)
+        return sum(len(batch) for batch in batches)
+
+    print(f"{'messages':>8} {'points':>8} | {'inline ms':>10} {'max stall':>10} | {'pool ms':>8} {'max stall':>10}")
+    for messages in BATCH_SIZES:
+        payloads = [make_payload(f"dev-{i % 4}", i * POINTS_PER_MESSAGE) for i in range(messages)]
+        inline_wall, inline_stall, inline_points = await measure(inline, payloads)
+        pool_wall, pool_stall, pool_points = await measure(pooled, payloads)
+        assert inline_points == pool_points == messages * POINTS_PER_MESSAGE
+        print(f"{messages:>8} {inline_points:>8} | {inline_wall * 1e3:>10.1f} {inline_stall * 1e3:>8.1f}ms"
+              f" | {pool_wall * 1e3:>8.1f} {pool_stall * 1e3:>8.1f}ms")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
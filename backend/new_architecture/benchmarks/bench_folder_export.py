@@ -0,0 +1,148 @@
+"""
+Benchmark: folder HDF5 export, peak RSS and wall time vs folder size.
+
+  materialize   the previous exporter: every DeviceData ORM row loaded with
+                scalars().all(), Force / Z collected in Python lists per curve
+                and segment, then written as contiguous datasets
+  stream        export_folder_to_hdf5: server-side cursor partitions of
+                EXPORT_FETCH_ROWS appended to resizable chunked datasets
+
+Each run happens in a fresh subprocess so ru_maxrss is that export's peak;
+"growth" is the peak minus the RSS measured just before the export started.
+The folder is synthetic (CURVES curves, both phases) in a temporary SQLite
+file database. A run that fails (e.g. killed for memory) is reported as such.
+RSS includes SQLite's own memory, which grows with the database up to the
+SQLITE_MMAP_SIZE and SQLITE_CACHE_SIZE caps; set SQLITE_MMAP_SIZE=0 to see
+the exporter alone.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_folder_export [rows ...]     (default: 1000000 10000000)
+"""
+
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CURVES = 20
+VARIANTS = ("materialize", "stream")
+
+
+def fill_sql(rows: int) -> str:
+    rows_per_curve = max(rows // CURVES, 2)
+    return f"""
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {rows - 1})
+INSERT INTO device_data (device_id, timestamp, displacement, force, folder_id, curve_index, phase, motor_working)
+SELECT 'bench-device',
+       strftime('%Y-%m-%d %H:%M:%f', 1700000000 + i / 10000.0, 'unixepoch'),
+       (i % {rows_per_curve}) * 0.01,
+       (i % {rows_per_curve}) * 0.2,
+       1,
+       i / {rows_per_curve},
+       (i % {rows_per_curve}) >= {rows_per_curve // 2},
+       1
+FROM n
+"""
+
+
+async def build_database(path: str, rows: int):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.models import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.exec_driver_sql("INSERT INTO users (id, username, hashed_password) VALUES (1, 'bench', 'x')")
+        await conn.exec_driver_sql(
+            "INSERT INTO iot_devices (id, device_name, device_type, device_token, user_id)"
+            " VALUES ('bench-device', 'bench', 'sensor', 'bench-token', 1)"
+        )
+        await conn.exec_driver_sql("INSERT INTO folders (id, name, user_id) VALUES (1, 'bench', 1)")
+        await conn.exec_driver_sql(fill_sql(rows))
+    await engine.dispose()
+
+
+async def export_materialized(file_path: str):
+    """The exporter before streaming, kept here for comparison."""
+    import h5py
+    import numpy as np
+    from sqlalchemy.future import select
+    from app.db import AsyncSessionLocal
+    from app.models import DeviceData
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DeviceData).where(DeviceData.folder_id == 1).order_by(DeviceData.curve_index, DeviceData.timestamp)
+        )
+        rows = result.scalars().all()
+        curves = {}
+        for row in rows:
+            segments = curves.setdefault(row.curve_index, {"segment0": {"force": [], "z": []}, "segment1": {"force": [], "z": []}})
+            segment = segments["segment1" if row.phase == 1 else "segment0"]
+            segment["force"].append(-float(row.force))
+            segment["z"].append(float(row.displacement))
+        with h5py.File(file_path, "w") as hdf:
+            for curve_index in sorted(curves):
+                curve_group = hdf.create_group(f"curve{curve_index}")
+                for name, values in curves[curve_index].items():
+                    if values["force"]:
+                        group = curve_group.create_group(name)
+                        group.create_dataset("Force", data=np.array(values["force"], dtype=float))
+                        group.create_dataset("Z", data=np.array(values["z"], dtype=float))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def child(variant: str, file_path: str):
+    """Runs in the subprocess (DATABASE_URL points at the benchmark database)."""
+    from app.db import export_folder_to_hdf5
+
+    before = rss_mb()
+    started = time.perf_counter()
+    if variant == "stream":
+        asyncio.run(export_folder_to_hdf5(file_path, 1, 1))
+    else:
+        asyncio.run(export_materialized(file_path))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"RESULT {elapsed:.2f} {peak:.0f} {peak - before:.0f}")
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000]
+    print(f"{'rows':>11} {'variant':>12} {'wall':>9} {'peak RSS':>10} {'growth':>9} {'file':>9}")
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "export.db")
+            asyncio.run(build_database(db_path, rows))
+            for variant in VARIANTS:
+                out_path = os.path.join(tmp, f"{variant}.h5")
+                env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PYTHONPATH=os.getcwd())
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_folder_export", "--child", variant, out_path],
+                    env=env, capture_output=True, text=True,
+                )
+                result = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+                if proc.returncode != 0 or not result:
+                    print(f"{rows:>11,} {variant:>12}   failed (exit {proc.returncode})")
+                    continue
+                elapsed, peak, growth = result[-1].split()[1:]
+                size = os.path.getsize(out_path) / 1e6
+                print(f"{rows:>11,} {variant:>12} {float(elapsed):>8.1f}s {peak:>7} MB {growth:>6} MB {size:>6.0f} MB")
+                os.remove(out_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
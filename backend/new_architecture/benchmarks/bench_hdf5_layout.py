@@ -0,0 +1,126 @@
+"""
+Benchmark: HDF5 dataset layouts for the folder export (size, write, read).
+
+Writes a synthetic folder of CURVES indentation curves through
+CurveFileWriter with each DatasetLayout and reports file size, write time,
+full read time with h5py, and the upload time of the file over a slow link
+(local_agent sends export files as they are). Curves have a noisy approach
+baseline, a Hertz-like contact region and a linear Z ramp, like real data;
+compression ratios on noise-free synthetic data would be far too optimistic.
+
+  contiguous    the exporter before chunked datasets (create_dataset(data=...))
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_hdf5_layout [samples_per_segment ...]   (default: 2000 20000 200000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from app.hdf5_writer import CurveFileWriter, DatasetLayout
+
+CURVES = 10
+# Rows handed to the writer per append, like one export fetch partition
+BLOCK_ROWS = 50000
+# Upload estimate for local_agent over a slow uplink
+LINK_BYTES_PER_SEC = 1_000_000 / 8 * 2  # 2 Mbit/s
+REPEATS = 3
+
+LAYOUTS = {
+    "chunked": DatasetLayout(),
+    "gzip1+shuffle": DatasetLayout(compression="gzip", compression_level=1),
+    "gzip4+shuffle": DatasetLayout(compression="gzip", compression_level=4),
+    "gzip4": DatasetLayout(compression="gzip", compression_level=4, shuffle=False),
+    "lzf+shuffle": DatasetLayout(compression="lzf"),
+    "f32": DatasetLayout(float32=True),
+    "f32+gzip4+shuffle": DatasetLayout(compression="gzip", compression_level=4, float32=True),
+    "f32+lzf+shuffle": DatasetLayout(compression="lzf", float32=True),
+}
+
+
+def make_segment(samples: int, rng, retract: bool = False):
+    """(force µN, Z µm) of one segment: flat noisy baseline, then Hertz contact."""
+    z = np.linspace(0.0, 10.0, samples)
+    contact = 6.0
+    indentation = np.clip(z - contact, 0.0, None)
+    force = 0.8 * indentation ** 1.5 + rng.normal(0.0, 0.01, samples)
+    z = z + rng.normal(0.0, 0.0005, samples)
+    if retract:
+        return force[::-1].copy(), z[::-1].copy()
+    return force, z
+
+
+def make_folder(samples: int):
+    rng = np.random.default_rng(0)
+    return [
+        (curve, phase, *make_segment(samples, rng, retract=phase == 1))
+        for curve in range(CURVES)
+        for phase in (0, 1)
+    ]
+
+
+def write_contiguous(path: str, segments):
+    with h5py.File(path, "w") as hdf:
+        for curve, phase, force, z in segments:
+            group = hdf.require_group(f"curve{curve}").create_group(f"segment{phase}")
+            group.create_dataset("Force", data=force)
+            group.create_dataset("Z", data=z)
+
+
+def write_layout(path: str, segments, layout: DatasetLayout):
+    with h5py.File(path, "w") as hdf:
+        writer = CurveFileWriter(hdf, layout=layout)
+        for curve, phase, force, z in segments:
+            for start in range(0, len(force), BLOCK_ROWS):
+                writer.append(curve, phase, force[start:start + BLOCK_ROWS], z[start:start + BLOCK_ROWS])
+
+
+def read_all(path: str) -> int:
+    total = 0
+    with h5py.File(path, "r") as hdf:
+        for curve in hdf.values():
+            for segment in curve.values():
+                total += len(segment["Force"][:]) + len(segment["Z"][:])
+    return total
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2000, 20000, 200000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for samples in sizes:
+            segments = make_folder(samples)
+            print(f"\n{CURVES} curves x 2 segments x {samples:,} samples")
+            print(f"{'layout':>18} {'size':>9} {'ratio':>6} {'write':>9} {'read':>9} {'upload@2Mbit':>13}")
+            variants = [("contiguous", write_contiguous, ())]
+            variants += [(name, write_layout, (layout,)) for name, layout in LAYOUTS.items()]
+            baseline = None
+            for name, writer, extra in variants:
+                path = os.path.join(tmp, f"{name}.h5")
+                write_seconds = best_of(writer, path, segments, *extra)
+                read_seconds = best_of(read_all, path)
+                size = os.path.getsize(path)
+                baseline = baseline or size
+                print(
+                    f"{name:>18} {size / 1e6:>7.2f}MB {baseline / size:>5.1f}x "
+                    f"{write_seconds * 1000:>7.1f}ms {read_seconds * 1000:>7.1f}ms "
+                    f"{size / LINK_BYTES_PER_SEC:>11.1f}s"
+                )
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: incremental (master file + manifest) vs full folder HDF5 export.
+
+Builds a synthetic folder (see bench_folder_export) in a temporary SQLite
+database with curve_stats, creates the folder's master file once, then
+records more data and times both exporters for each step:
+
+  new curve      one curve of the usual size recorded after the last export
+  grown curve    samples appended to the newest curve
+  unchanged      nothing recorded since the last export
+
+  full           export_folder_to_hdf5 (every curve read and written)
+  incremental    export_folder_to_hdf5_incremental on the master file
+
+After each step the master's Force / Z datasets are compared with the full
+export, which must hold the same samples.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_incremental_export [rows]     (default: 1000000)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+
+ROWS = 1_000_000
+
+
+def add_curve_sql(curve_index: int, rows: int, start: int) -> str:
+    """Samples of one curve (both phases) with timestamps after the existing ones."""
+    return f"""
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {rows - 1})
+INSERT INTO device_data (device_id, timestamp, displacement, force, folder_id, curve_index, phase, motor_working)
+SELECT 'bench-device',
+       strftime('%Y-%m-%d %H:%M:%f', 1800000000 + ({start} + i) / 10000.0, 'unixepoch'),
+       i * 0.01,
+       i * 0.2,
+       1,
+       {curve_index},
+       i >= {rows // 2},
+       1
+FROM n
+"""
+
+
+async def record(sql: Optional[str]):
+    """Run sql (if any), then rebuild the folder's curve_stats as saving would have kept them."""
+    from app.curve_stats import rebuild_curve_stats
+    from app.db import AsyncSessionLocal, async_engine
+
+    if sql is not None:
+        async with async_engine.begin() as conn:
+            await conn.exec_driver_sql(sql)
+    async with AsyncSessionLocal() as db:
+        await rebuild_curve_stats(db, [1])
+        await db.commit()
+
+
+def same_samples(path_a: str, path_b: str) -> bool:
+    import h5py
+
+    with h5py.File(path_a, "r") as a, h5py.File(path_b, "r") as b:
+        if sorted(a.keys()) != sorted(b.keys()):
+            return False
+        for curve in a.keys():
+            for segment in ("segment0", "segment1"):
+                if (segment in a[curve]) != (segment in b[curve]):
+                    return False
+                if segment in a[curve]:
+                    for name in ("Force", "Z"):
+                        if not np.array_equal(a[curve][segment][name][:], b[curve][segment][name][:]):
+                            return False
+    return True
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+async def run(tmp: str, rows: int):
+    from app.db import export_folder_to_hdf5, export_folder_to_hdf5_incremental
+    from benchmarks.bench_folder_export import CURVES
+
+    full_path = os.path.join(tmp, "full.hdf5")
+    master = os.path.join(tmp, "folder1.master")
+    rows_per_curve = max(rows // CURVES, 2)
+
+    await record(None)
+    _, seconds = await timed(export_folder_to_hdf5_incremental(master, 1, 1))
+    print(f"{'initial master':>14} {'':>9} {seconds:>11.2f}s")
+    print(f"{'step':>14} {'full':>9} {'incremental':>12} {'speedup':>8} {'master':>9} {'same':>5}")
+
+    steps = [
+        ("new curve", add_curve_sql(CURVES, rows_per_curve, 0)),
+        ("grown curve", add_curve_sql(CURVES, rows_per_curve // 10, rows_per_curve)),
+        ("unchanged", None),
+    ]
+    for name, sql in steps:
+        if sql is not None:
+            await record(sql)
+        _, full_seconds = await timed(export_folder_to_hdf5(full_path, 1, 1))
+        _, incremental_seconds = await timed(export_folder_to_hdf5_incremental(master, 1, 1))
+        print(
+            f"{name:>14} {full_seconds:>8.2f}s {incremental_seconds:>11.2f}s "
+            f"{full_seconds / incremental_seconds:>7.0f}x {os.path.getsize(master) / 1e6:>7.1f}MB "
+            f"{str(same_samples(full_path, master)):>5}"
+        )
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "export.db")
+        # Settings are read at import, so the database URL must be set first.
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        from benchmarks.bench_folder_export import build_database
+
+        asyncio.run(build_database(db_path, rows))
+        print(f"{rows:,} rows, 20 curves")
+        asyncio.run(run(tmp, rows))
+
+
+if __name__ == "__main__":
+    main()
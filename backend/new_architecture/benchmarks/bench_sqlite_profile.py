@@ -0,0 +1,119 @@
+"""
+Benchmark: SQLite read/write concurrency with and without the pragma profile.
+
+A writer task saves device_data batches (500 rows by default, the saver's
+batch_size; SQLiteChunkedWriter + commit) while a reader task repeatedly runs the folder
+listing's per-folder COUNT query on a separate connection. Each profile runs
+for DURATION seconds against a fresh file database pre-filled with
+PREFILL_ROWS rows, and reports write rows/s, reader queries/s and reader
+latency (p50 / max). "default" is SQLite's rollback journal with
+synchronous=FULL; "profile" is sqlite_pragmas() from app/db.py.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_sqlite_profile [batch_rows]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.bulk_writer import SQLiteChunkedWriter
+from app.db import apply_sqlite_pragmas, sqlite_pragmas
+from app.message_processor import build_device_data_rows
+from app.models import Base, DeviceData, Folder, IoTDevice
+from app.telemetry import TelemetryBatch
+
+DURATION = 5.0
+BATCH_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+PREFILL_ROWS = 200_000
+DEVICE_ID = "bench-device"
+
+
+def make_rows(count, folder_id):
+    batch = TelemetryBatch(
+        device_ids=[DEVICE_ID],
+        device_codes=np.zeros(count, dtype=np.int32),
+        timestamp=1.7e9 + np.arange(count) * 1e-4,
+        displacement=np.linspace(0, 50, count),
+        force=np.linspace(0, 1000, count),
+        phase=(np.arange(count) % 2).astype(np.int8),
+        motor_working=np.ones(count, dtype=np.int8),
+        state=np.full(count, -1, dtype=np.int8),
+    )
+    return build_device_data_rows(DEVICE_ID, batch, folder_id, 0)
+
+
+async def run_profile(label, path, pragmas):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    if pragmas:
+        apply_sqlite_pragmas(engine, pragmas)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    writer = SQLiteChunkedWriter()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessions() as db:
+        db.add(IoTDevice(id=DEVICE_ID, device_name="bench", device_type="sensor", device_token="bench-token"))
+        folder = Folder(name="bench", user_id=1)
+        db.add(folder)
+        await db.commit()
+        folder_id = folder.id
+        await writer.write(db, make_rows(PREFILL_ROWS, folder_id))
+        await db.commit()
+
+    rows = make_rows(BATCH_ROWS, folder_id)
+    written = 0
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def write_loop():
+        nonlocal written, errors
+        while time.perf_counter() < deadline:
+            async with sessions() as db:
+                try:
+                    await writer.write(db, rows)
+                    await db.commit()
+                    written += len(rows)
+                except Exception:
+                    errors += 1
+                    await db.rollback()
+            await asyncio.sleep(0)
+
+    async def read_loop():
+        nonlocal errors
+        query = select(DeviceData.folder_id, func.count()).group_by(DeviceData.folder_id)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            async with sessions() as db:
+                try:
+                    (await db.execute(query)).all()
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(write_loop(), read_loop())
+    await engine.dispose()
+    p50 = statistics.median(latencies) * 1e3 if latencies else float("nan")
+    worst = max(latencies) * 1e3 if latencies else float("nan")
+    print(f"{label:>8} | {written / DURATION:>12,.0f} rows/s | {len(latencies) / DURATION:>7.1f} reads/s"
+          f" | p50 {p50:>7.1f} ms  max {worst:>7.1f} ms | errors {errors}")
+
+
+async def main():
+    print("pragmas:", "; ".join(sqlite_pragmas()))
+    with tempfile.TemporaryDirectory() as tmp:
+        await run_profile("default", os.path.join(tmp, "default.db"), [])
+        await run_profile("profile", os.path.join(tmp, "profile.db"), sqlite_pragmas())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
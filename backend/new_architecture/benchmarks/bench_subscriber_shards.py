@@ -0,0 +1,130 @@
+"""
+Benchmark: backend ingest throughput with 1, 2 and 4 subscriber shards, no broker.
+
+Stands in for the paho network threads: one thread per shard calls the real
+on_message callback with the messages of the devices the "hash" plan gives
+that shard, while process_raw_messages runs one decoder task per shard on the
+event loop. Decoded device batches are counted instead of entering the ring
+and save pipeline.
+
+This measures what one backend process takes in once messages have arrived.
+Broker and socket costs are covered by
+root_py_md_files/stress_test_sharded_subscribers.py, which needs a running
+broker.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_subscriber_shards [json|binary]     (default: json)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import orjson
+
+import app.message_processor
+from app import mqtt_client
+from app.mqtt_client import SubscriberShard, create_ingress_queue, on_message, process_raw_messages, shard_for_device
+from app.telemetry_frame import encode_frame
+
+SHARD_COUNTS = [1, 2, 4]
+DEVICE_IDS = [f"device_{i:03d}" for i in range(1, 9)]
+MESSAGES_PER_DEVICE = 1000
+POINTS_PER_MESSAGE = 100
+
+
+class Message:
+    """The part of paho's MQTTMessage that on_message reads."""
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def make_payload(device_id, sequence, wire_format):
+    start = sequence * POINTS_PER_MESSAGE
+    timestamps = 1.7e9 + (start + np.arange(POINTS_PER_MESSAGE)) * 1e-4
+    displacement = 0.001 * (start + np.arange(POINTS_PER_MESSAGE))
+    force = 0.5 * ((start + np.arange(POINTS_PER_MESSAGE)) % 200)
+    if wire_format == "binary":
+        return encode_frame(
+            device_id, sequence, float(timestamps[0]), timestamps - timestamps[0],
+            displacement, force, phase=np.zeros(POINTS_PER_MESSAGE), motor_working=np.ones(POINTS_PER_MESSAGE),
+        )
+    return orjson.dumps([
+        {"device_id": device_id, "timestamp": t, "displacement": d, "force": f, "phase": 0, "motor_working": 1}
+        for t, d, f in zip(timestamps.tolist(), displacement.tolist(), force.tolist())
+    ])
+
+
+def deliver(shard, messages):
+    for message in messages:
+        on_message(None, shard, message)
+
+
+async def run_round(shards, payloads, spill_root):
+    # Device topics per shard as the "hash" plan assigns them
+    topics = [[] for _ in range(shards)]
+    for device_id in DEVICE_IDS:
+        topics[shard_for_device(device_id, shards)].append(f"device_data/{device_id}")
+    subscribers = [
+        SubscriberShard(index, create_ingress_queue(os.path.join(spill_root, f"n{shards}-shard-{index}")), shard_topics)
+        for index, shard_topics in enumerate(topics)
+    ]
+    expected = len(DEVICE_IDS) * MESSAGES_PER_DEVICE * POINTS_PER_MESSAGE
+    received = 0
+    finished = asyncio.Event()
+
+    async def count(device_id, batch):
+        nonlocal received
+        received += len(batch)
+        if received >= expected:
+            finished.set()
+
+    app.message_processor.enqueue_device_batch = count
+    decoders = [asyncio.create_task(process_raw_messages(shard)) for shard in subscribers]
+    threads = [
+        threading.Thread(target=deliver, args=(shard, [
+            Message(topic, payload) for topic in shard.topics for payload in payloads[topic]
+        ]))
+        for shard in subscribers
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    await finished.wait()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+    for task in decoders:
+        task.cancel()
+    await asyncio.gather(*decoders, return_exceptions=True)
+    return elapsed, [shard.received for shard in subscribers]
+
+
+async def main():
+    wire_format = sys.argv[1] if len(sys.argv) > 1 else "json"
+    payloads = {
+        f"device_data/{device_id}": [make_payload(device_id, seq, wire_format) for seq in range(MESSAGES_PER_DEVICE)]
+        for device_id in DEVICE_IDS
+    }
+    total_points = len(DEVICE_IDS) * MESSAGES_PER_DEVICE * POINTS_PER_MESSAGE
+    print(f"{len(DEVICE_IDS)} devices x {MESSAGES_PER_DEVICE} {wire_format} messages x {POINTS_PER_MESSAGE} points, "
+          f"CPU cores: {os.cpu_count()}")
+    print(f"{'shards':>6} {'seconds':>8} {'points/s':>12} {'scaling':>8}  messages per shard")
+    base = None
+    with tempfile.TemporaryDirectory() as spill_root:
+        for shards in SHARD_COUNTS:
+            elapsed, per_shard = await run_round(shards, payloads, spill_root)
+            rate = total_points / elapsed
+            base = base or rate
+            print(f"{shards:>6} {elapsed:>8.2f} {rate:>12,.0f} {rate / base:>7.2f}x  {per_shard}")
+    mqtt_client.decode_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Benchmark: JSON vs binary telemetry frames on the MQTT ingest path.
+
+Compares bytes on the wire per sample and backend decode time per sample for
+the DAQ publisher's per-sample JSON objects against batched binary frames.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_wire_format
+"""
+
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+
+from app.telemetry import decode_telemetry_batch
+from app.telemetry_frame import encode_frame, decode_frame
+
+SAMPLES = 100_000
+FRAME_SIZES = [10, 50, 200, 1000]
+
+
+def make_json_payloads(n):
+    now = time.time()
+    return [
+        orjson.dumps({
+            "timestamp": datetime.fromtimestamp(now + i * 1e-3, timezone.utc).isoformat(),
+            "displacement": 0.001 * i,
+            "force": 0.5 + 1e-4 * i,
+            "device_id": "HqSTf2PYpg6t",
+            "device_token": "av40HTAb0O5VGQ0D",
+            "t_disp": now + i * 1e-3,
+            "t_force": now + i * 1e-3,
+        })
+        for i in range(n)
+    ]
+
+
+def make_frames(n, frame_size, float32=False):
+    base = time.time()
+    frames = []
+    for seq, start in enumerate(range(0, n, frame_size)):
+        count = min(frame_size, n - start)
+        idx = np.arange(start, start + count)
+        frames.append(encode_frame(
+            "HqSTf2PYpg6t", seq, base + start * 1e-3,
+            (idx - start) * 1e-3, 0.001 * idx, 0.5 + 1e-4 * idx,
+            float32=float32,
+        ))
+    return frames
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    print(f"{'format':<24}{'bytes/sample':>14}{'decode us/sample':>18}")
+    json_payloads = make_json_payloads(SAMPLES)
+    batch, elapsed = timed(decode_telemetry_batch, json_payloads)
+    assert len(batch) == SAMPLES
+    json_bytes = sum(len(p) for p in json_payloads) / SAMPLES
+    json_us = elapsed / SAMPLES * 1e6
+    print(f"{'json (1/msg)':<24}{json_bytes:>14.1f}{json_us:>18.3f}")
+
+    for float32 in (False, True):
+        for frame_size in FRAME_SIZES:
+            frames = make_frames(SAMPLES, frame_size, float32=float32)
+            decoded, elapsed = timed(lambda fs: [decode_frame(f) for f in fs], frames)
+            assert sum(len(b) for b in decoded) == SAMPLES
+            frame_bytes = sum(len(f) for f in frames) / SAMPLES
+            label = f"binary f{'4' if float32 else '8'} x{frame_size}"
+            print(
+                f"{label:<24}{frame_bytes:>14.1f}{elapsed / SAMPLES * 1e6:>18.3f}"
+                f"   ({json_bytes / frame_bytes:.1f}x smaller, {json_us / (elapsed / SAMPLES * 1e6):.1f}x faster)"
+            )
+
+
+if __name__ == "__main__":
+    main()
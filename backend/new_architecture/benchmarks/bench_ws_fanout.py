@@ -0,0 +1,90 @@
+"""
+Benchmark: per-device, per-socket encoding against the per-user fan-out.
+
+One user owns D devices and has S open sockets. Every tick each device
+produces a block of rows. The legacy path ran orjson.dumps + zlib.compress
+once per device batch per socket-set call; the fan-out merges all device
+blocks of the tick into one frame and encodes it once for all sockets.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_ws_fanout
+"""
+
+import time
+import zlib
+
+import numpy as np
+import orjson
+
+from app.telemetry import TelemetryBatch, STATE_ABSENT
+from app.ws_fanout import encode_payload, COMPRESSION_LEVEL, COMPRESSION_THRESHOLD
+
+TICKS = 200
+ROWS_PER_DEVICE_TICK = 50  # 1000 points/s per device at a 50 ms tick
+
+
+def make_block(device_id, rows, t0):
+    return TelemetryBatch(
+        device_ids=[device_id],
+        device_codes=np.zeros(rows, dtype=np.int32),
+        timestamp=t0 + np.arange(rows) * 0.001,
+        displacement=np.cumsum(np.random.rand(rows)),
+        force=np.random.rand(rows) * 1000,
+        phase=np.zeros(rows, dtype=np.int8),
+        motor_working=np.ones(rows, dtype=np.int8),
+        state=np.full(rows, STATE_ABSENT, dtype=np.int8),
+    )
+
+
+def legacy(ticks, sockets):
+    """Previous behaviour: each device batch encoded per send call, one frame per device."""
+    encode = 0.0
+    wire = 0
+    frames = 0
+    for blocks in ticks:
+        for block in blocks:
+            started = time.perf_counter()
+            records = block.to_records()
+            encode += time.perf_counter() - started
+            for _ in range(sockets):
+                started = time.perf_counter()
+                data = orjson.dumps(records)
+                if len(data) > COMPRESSION_THRESHOLD:
+                    data = zlib.compress(data, level=COMPRESSION_LEVEL)
+                encode += time.perf_counter() - started
+                wire += len(data)
+                frames += 1
+    return encode, wire, frames
+
+
+def fanout(ticks, sockets):
+    encode = 0.0
+    wire = 0
+    frames = 0
+    for blocks in ticks:
+        started = time.perf_counter()
+        payload, _ = encode_payload(TelemetryBatch.concat(blocks).to_records())
+        encode += time.perf_counter() - started
+        wire += len(payload) * sockets
+        frames += sockets
+    return encode, wire, frames
+
+
+def main():
+    print(f"{TICKS} ticks x {ROWS_PER_DEVICE_TICK} rows/device/tick")
+    print(f"{'devices':>8}{'sockets':>8}{'legacy ms':>11}{'fanout ms':>11}{'frames':>14}{'wire KB':>16}")
+    for devices, sockets in [(1, 1), (1, 4), (4, 1), (4, 4), (10, 2)]:
+        ticks = [
+            [make_block(f"dev{d}", ROWS_PER_DEVICE_TICK, t * 0.05) for d in range(devices)]
+            for t in range(TICKS)
+        ]
+        l_enc, l_wire, l_frames = legacy(ticks, sockets)
+        f_enc, f_wire, f_frames = fanout(ticks, sockets)
+        print(
+            f"{devices:>8}{sockets:>8}{l_enc * 1000:>11.1f}{f_enc * 1000:>11.1f}"
+            f"{l_frames:>7}->{f_frames:<6}{l_wire / 1024:>8.0f}->{f_wire / 1024:<7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
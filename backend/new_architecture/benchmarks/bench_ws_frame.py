@@ -0,0 +1,78 @@
+"""
+Benchmark: JSON (orjson + zlib) against the binary delta/varint WebSocket frame.
+
+Simulates one second of a single device's live stream at 1k, 10k and 100k
+points/s, sent as 20 frames (the 50 ms broadcaster tick), and reports wire
+bytes per second and encode time per second of data for both formats. Every
+binary frame is round-tripped through the reference decoder.
+
+Run from backend/new_architecture:
+    python -m benchmarks.bench_ws_frame
+"""
+
+import time
+
+import numpy as np
+
+from app.telemetry import TelemetryBatch
+from app.ws_fanout import encode_payload
+from app.ws_frame import encode_ws_frame, decode_ws_frame
+
+FRAMES_PER_SEC = 20
+
+
+def make_frame(rng, rows, t0):
+    # Indentation-like signal: smooth displacement ramp, force with sensor noise.
+    t = t0 + np.arange(rows) / (rows * FRAMES_PER_SEC)
+    displacement = 50.0 * np.sin(t) + rng.normal(0, 0.01, rows)
+    force = 1000.0 * np.maximum(np.sin(t), 0) + rng.normal(0, 0.5, rows)
+    return TelemetryBatch(
+        device_ids=["bench-device"],
+        device_codes=np.zeros(rows, dtype=np.int32),
+        timestamp=1.7e9 + t,
+        displacement=np.round(displacement, 3),
+        force=np.round(force, 3),
+        phase=(t % 2 > 1).astype(np.int8),
+        motor_working=np.ones(rows, dtype=np.int8),
+        state=np.full(rows, -1, dtype=np.int8),
+    )
+
+
+def check_round_trip(batch, payload):
+    (section,) = decode_ws_frame(payload)
+    assert np.abs(section["timestamp"] - batch.timestamp).max() <= 1e-6
+    assert np.abs(section["displacement"] - batch.displacement).max() <= 5e-4 + 1e-9
+    assert np.abs(section["force"] - batch.force).max() <= 5e-4 + 1e-9
+    assert (section["phase"] == batch.phase).all()
+    assert (section["motor_working"] == batch.motor_working).all()
+
+
+def main():
+    rng = np.random.default_rng(7)
+    print(f"{'points/s':>9}{'json KB/s':>11}{'binary KB/s':>13}{'ratio':>7}{'json ms/s':>11}{'binary ms/s':>13}")
+    for rate in (1_000, 10_000, 100_000):
+        rows = rate // FRAMES_PER_SEC
+        frames = [make_frame(rng, rows, i / FRAMES_PER_SEC) for i in range(FRAMES_PER_SEC)]
+
+        json_bytes = binary_bytes = 0
+        json_time = binary_time = 0.0
+        for batch in frames:
+            started = time.perf_counter()
+            payload, _ = encode_payload(batch.to_records())
+            json_time += time.perf_counter() - started
+            json_bytes += len(payload)
+
+            started = time.perf_counter()
+            payload, _ = encode_ws_frame(batch)
+            binary_time += time.perf_counter() - started
+            binary_bytes += len(payload)
+            check_round_trip(batch, payload)
+
+        print(
+            f"{rate:>9}{json_bytes / 1024:>11.1f}{binary_bytes / 1024:>13.1f}"
+            f"{json_bytes / binary_bytes:>6.1f}x{json_time * 1000:>11.1f}{binary_time * 1000:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,15 +11,21 @@ Advanced optimizations for maximum throughput:
 
 import paho.mqtt.client as mqtt
 import orjson
+import os
+import sys
 import time
 import random
 import threading
 from datetime import datetime
 
+# Binary frames reuse the DAQ publisher encoder (set WIRE_FORMAT=binary).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DAQ"))
+
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 BASE_TOPIC = "device_data"
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").strip().lower()
 
 class UltraHighPerformancePublisher:
     def __init__(self):
@@ -119,6 +125,11 @@ class UltraHighPerformancePublisher:
             
         return batch_data
         
+    def encode_binary_batch(self, batch_data, sequence):
+        """Pack a generated batch as one binary telemetry frame (per-point dt, phase and motor bits)."""
+        from telemetry_frame import encode_points
+        return encode_points(self.device_id, sequence, batch_data)
+
     def publish_data(self):
         """Publish data with ultra-high performance optimizations"""
         self.start_time = time.time()
@@ -153,8 +164,11 @@ class UltraHighPerformancePublisher:
             # Generate and publish batch
             batch_data = self.generate_data_batch(batch_start, batch_end)
             if batch_data:
-                # Serialize entire batch with orjson (fastest)
-                payload = orjson.dumps(batch_data)
+                if WIRE_FORMAT == "binary":
+                    payload = self.encode_binary_batch(batch_data, batch_count)
+                else:
+                    # Serialize entire batch with orjson (fastest)
+                    payload = orjson.dumps(batch_data)
                 
                 # Publish with QoS 0 for maximum throughput
                 self.client.publish(self.topic, payload, qos=0, retain=False)
@@ -184,6 +198,7 @@ class UltraHighPerformancePublisher:
         print(f"   - Efficiency: {self.message_count/self.mqtt_messages:.1f} points per MQTT message")
         print(f"   - Topic Used: {self.topic}")
         print(f"   - QoS Level: 0 (maximum throughput)")
+        print(f"   - Wire Format: {WIRE_FORMAT}")
         
         # Disconnect
         self.client.disconnect()
@@ -6,6 +6,8 @@ A high-performance MQTT publisher that sends 10,000 points with device-specific
 
 import paho.mqtt.client as mqtt
 import json
+import os
+import sys
 import time
 import random
 import threading
@@ -13,10 +15,14 @@ from datetime import datetime
 import asyncio
 import concurrent.futures
 
+# Binary frames reuse the DAQ publisher encoder (set WIRE_FORMAT=binary).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DAQ"))
+
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 BASE_TOPIC = "device_data"
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").strip().lower()
 
 class HighPerformancePublisher:
     def __init__(self):
@@ -39,6 +45,8 @@ class HighPerformancePublisher:
         self.total_messages = 100000  # 100,000 total messages
         self.batch_size = 100  # Smaller batches for better control
         self.connection_established = False
+        # In binary mode each MQTT message is one frame holding a whole batch
+        self.points_per_message = self.batch_size if WIRE_FORMAT == "binary" else 1
         
         # Device-specific topic for optimization
         self.topic = f"{BASE_TOPIC}/{self.device_id}"
@@ -62,7 +70,7 @@ class HighPerformancePublisher:
             print(f"❌ Connection failed with code {rc}")
             
     def on_publish(self, client, userdata, mid):
-        self.messages_published += 1
+        self.messages_published = min(self.messages_published + self.points_per_message, self.total_messages)
         
         # Performance reporting
         current_time = time.time()
@@ -168,6 +176,9 @@ class HighPerformancePublisher:
             print("❌ Not connected to broker")
             return 0
             
+        if WIRE_FORMAT == "binary":
+            return self.publish_frame_and_count(start_id, count)
+            
         published_count = 0
         for i in range(count):
             if not self.is_running:
@@ -189,6 +200,24 @@ class HighPerformancePublisher:
                 
         return published_count
         
+    def publish_frame_and_count(self, start_id, count):
+        """Publish a batch as one binary telemetry frame (per-point dt, phase and motor bits)"""
+        from telemetry_frame import encode_points
+        
+        if not self.is_running:
+            return 0
+        points = [self.generate_data_point(start_id + i) for i in range(count)]
+        try:
+            payload = encode_points(self.device_id, start_id // self.batch_size, points)
+            result = self.client.publish(self.topic, payload, qos=0, retain=False)
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.message_count += count
+                return count
+            print(f"❌ Publish failed for frame at message {start_id}: {result.rc}")
+        except Exception as e:
+            print(f"❌ Exception publishing frame at message {start_id}: {e}")
+        return 0
+        
     def start(self):
         """Start the high-performance publisher"""
         try:
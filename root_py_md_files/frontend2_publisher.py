@@ -6,15 +6,21 @@ A simple MQTT publisher that sends data specifically for testing frontend-2 with
 
 import paho.mqtt.client as mqtt
 import json
+import os
+import sys
 import time
 import random
 import threading
 from datetime import datetime
 
+# Binary frames reuse the DAQ publisher encoder (set WIRE_FORMAT=binary).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DAQ"))
+
 # MQTT Configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 BASE_TOPIC = "device_data"
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").strip().lower()
 
 class Frontend2Publisher:
     def __init__(self):
@@ -87,8 +93,12 @@ class Frontend2Publisher:
             # Generate data point
             data = self.generate_data_point()
             
-            # Convert to JSON
-            payload = json.dumps(data)
+            # Convert to JSON, or a one-sample binary frame
+            if WIRE_FORMAT == "binary":
+                from telemetry_frame import encode_points
+                payload = encode_points(self.device_id, self.message_count, [data])
+            else:
+                payload = json.dumps(data)
             
             # Publish to MQTT with device-specific topic
             result = self.client.publish(self.topic, payload, qos=1, retain=False)
@@ -0,0 +1,156 @@
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+import orjson
+import paho.mqtt.client as mqtt
+
+from stress_test_multi_producer import generate_displacement, generate_force
+
+# Test Configuration
+BROKER_HOST = "127.0.0.1"
+BROKER_PORT = 1883
+DEVICE_IDS = [f"device_{i:03d}" for i in range(1, 9)]
+MSGS_PER_DEVICE = 20000
+SAMPLES_PER_MSG = 20  # points per payload, like a DAQ batch
+SHARD_COUNTS = [1, 2, 4]
+STRATEGY = sys.argv[1] if len(sys.argv) > 1 else "hash"  # "hash" or "shared" (MQTT v5 broker)
+
+
+def shard_for_device(device_id, shards):
+    # Same mapping as app.mqtt_client.shard_for_device
+    return zlib.crc32(device_id.encode("utf-8")) % shards
+
+
+def shard_topics(index, shards):
+    if STRATEGY == "shared":
+        return ["$share/stress/device_data/#"]
+    return [f"device_data/{d}" for d in DEVICE_IDS if shard_for_device(d, shards) == index]
+
+
+# ---- Subscriber shard (one process = one paho client + one decoder) ----
+def run_shard(index, shards, ready, done, counts):
+    raw_q = queue.SimpleQueue()
+    topics = shard_topics(index, shards)
+
+    def on_connect(client, userdata, flags, rc, properties=None):
+        for topic in topics:
+            client.subscribe(topic, qos=1)
+        ready.release()
+
+    def on_message(client, userdata, msg):
+        raw_q.put(msg.payload)  # raw bytes only, decoding happens in this shard's decoder
+
+    kwargs = {"protocol": mqtt.MQTTv5} if STRATEGY == "shared" else {"clean_session": True}
+    c = mqtt.Client(client_id=f"stress_shard_{shards}_{index}", **kwargs)
+    c.on_connect = on_connect
+    c.on_message = on_message
+    c.max_inflight_messages_set(10000)
+    c.max_queued_messages_set(100000)
+    c.connect(BROKER_HOST, BROKER_PORT, keepalive=60)
+    c.loop_start()
+
+    decoded = 0
+    points = 0
+    while not done.is_set() or not raw_q.empty():
+        try:
+            payload = raw_q.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        msg = orjson.loads(payload)
+        # Column extraction similar to TelemetryDecoder's JSON path
+        points += len([s["force"] for s in msg["samples"]])
+        decoded += 1
+        if decoded % 1000 == 0:
+            counts[index] = decoded
+    counts[index] = decoded
+    c.loop_stop()
+    c.disconnect()
+
+
+# ---- Publishers (one per device) ----
+def publisher(device_id, total_messages):
+    pub = mqtt.Client(client_id=f"stress_pub_{device_id}")
+    pub.max_inflight_messages_set(10000)
+    pub.connect(BROKER_HOST, BROKER_PORT, keepalive=60)
+    pub.loop_start()
+    topic = f"device_data/{device_id}"
+    for i in range(total_messages):
+        base = i * SAMPLES_PER_MSG
+        msg = {
+            "device_id": device_id,
+            "device_token": f"token_{device_id}",
+            "ts_ms": int(time.time() * 1000),
+            "samples": [
+                {"displacement": generate_displacement(base + k), "force": generate_force(base + k)}
+                for k in range(SAMPLES_PER_MSG)
+            ],
+        }
+        info = pub.publish(topic, orjson.dumps(msg), qos=1)
+        if i % 1000 == 0:
+            info.wait_for_publish()
+    pub.loop_stop()
+    pub.disconnect()
+
+
+def run_round(shards):
+    total_expected = len(DEVICE_IDS) * MSGS_PER_DEVICE
+    ready = mp.Semaphore(0)
+    done = mp.Event()
+    counts = mp.Array("q", shards)
+    procs = [mp.Process(target=run_shard, args=(i, shards, ready, done, counts)) for i in range(shards)]
+    for p in procs:
+        p.start()
+    for _ in range(shards):
+        ready.acquire()
+    time.sleep(0.5)  # let SUBACKs land before publishing
+
+    start = time.time()
+    pubs = [threading.Thread(target=publisher, args=(d, MSGS_PER_DEVICE), daemon=True) for d in DEVICE_IDS]
+    for t in pubs:
+        t.start()
+    last = 0
+    stall_since = time.time()
+    while True:
+        total = sum(counts[:])
+        if total >= total_expected:
+            break
+        if total != last:
+            last, stall_since = total, time.time()
+        elif time.time() - stall_since > 10:
+            print(f"  stalled at {total}/{total_expected}")
+            break
+        time.sleep(0.05)
+    duration = time.time() - start
+    done.set()
+    for p in procs:
+        p.join()
+    for t in pubs:
+        t.join()
+    per_shard = list(counts[:])
+    return duration, sum(per_shard), per_shard
+
+
+def main():
+    total_expected = len(DEVICE_IDS) * MSGS_PER_DEVICE
+    print(f"=== SHARDED SUBSCRIBER STRESS TEST ({STRATEGY}) ===")
+    print(f"{len(DEVICE_IDS)} devices x {MSGS_PER_DEVICE} msgs x {SAMPLES_PER_MSG} samples, CPU cores: {os.cpu_count()}")
+    print("=" * 60)
+    results = []
+    for shards in SHARD_COUNTS:
+        duration, received, per_shard = run_round(shards)
+        throughput = received / duration if duration > 0 else 0
+        results.append((shards, throughput))
+        print(f"N={shards}: {received}/{total_expected} msgs in {duration:.2f}s "
+              f"-> {throughput:,.0f} msgs/s ({throughput * SAMPLES_PER_MSG:,.0f} points/s), per shard {per_shard}")
+    base = results[0][1]
+    print("\n=== SCALING ===")
+    for shards, throughput in results:
+        print(f"  N={shards}: {throughput / base if base else 0:.2f}x")
+
+
+if __name__ == "__main__":
+    main()